@@ -0,0 +1,106 @@
+"""Authenticated-request and login throughput with and without the user cache and bcrypt pool.
+
+Usage: python benchmarks/bench_auth.py [requests] [logins] [threads]
+
+'before' loads the session user from the database on every request and runs
+bcrypt on the request threads; 'after' uses the user cache and the bcrypt pool.
+Logins come from several threads at once while one more thread keeps calling
+/api/profile, so its latency shows what a login burst does to everyone else.
+BCRYPT_ROUNDS and PASSWORD_HASH_WORKERS apply as they do in the app; requests are
+marked multithreaded, as gthread workers mark them, so the pool is used.
+"""
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DIRECTORY = tempfile.mkdtemp(prefix='bench_auth_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(DIRECTORY, 'bench.db')}"
+
+from src import passwords  # noqa: E402 (after DATABASE_URL is set)
+from src.main import create_app  # noqa: E402
+from src.user_cache import user_cache  # noqa: E402
+
+PASSWORD = 'correct horse battery staple'
+
+app = create_app()
+# Requests arrive on several threads at once, as under gunicorn's gthread workers
+THREADED = {'wsgi.multithread': True}
+
+
+def logged_in_client():
+    client = app.test_client()
+    response = client.post('/api/login', json={'username': 'bench', 'password': PASSWORD}, environ_overrides=THREADED)
+    assert response.status_code == 200, response.get_json()
+    return client
+
+
+def profile_throughput(count: int) -> float:
+    client = logged_in_client()
+    start = time.perf_counter()
+    for _ in range(count):
+        client.get('/api/profile', environ_overrides=THREADED)
+    return count / (time.perf_counter() - start)
+
+
+def login_burst(logins: int, threads: int):
+    """Logins per second, and /api/profile latencies (ms) measured while they ran"""
+    probe = logged_in_client()
+    latencies, done = [], threading.Event()
+
+    def probe_profile():
+        while not done.is_set():
+            start = time.perf_counter()
+            probe.get('/api/profile', environ_overrides=THREADED)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    def log_in(count):
+        client = app.test_client()
+        for _ in range(count):
+            client.post('/api/login', json={'username': 'bench', 'password': PASSWORD}, environ_overrides=THREADED)
+
+    prober = threading.Thread(target=probe_profile)
+    workers = [threading.Thread(target=log_in, args=(logins // threads,)) for _ in range(threads)]
+    prober.start()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - start
+    done.set()
+    prober.join()
+    return (logins // threads) * threads / seconds, latencies
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    logins = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    workers, ttl = passwords.PASSWORD_HASH_WORKERS, user_cache.ttl
+    app.test_client().post('/api/register', json={'username': 'bench', 'password': PASSWORD}, environ_overrides=THREADED)
+
+    print(f"bcrypt cost {passwords.BCRYPT_ROUNDS}, {threads} login threads, {workers} hash workers")
+    for mode in ('before', 'after'):
+        passwords.PASSWORD_HASH_WORKERS = workers if mode == 'after' else 0
+        user_cache.ttl = ttl if mode == 'after' else 0
+        user_cache.clear()
+        per_second = profile_throughput(requests)
+        login_rate, latencies = login_burst(logins, threads)
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+        print(f"{mode:>6}: /api/profile {per_second:7.0f} req/s | logins {login_rate:5.2f}/s | "
+              f"/api/profile during logins: {len(latencies)} requests, "
+              f"p50 {statistics.median(latencies) if latencies else 0:.1f}ms p95 {p95:.1f}ms")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        shutil.rmtree(DIRECTORY, ignore_errors=True)
@@ -0,0 +1,70 @@
+"""Month-end batch throughput: many groups reconciled with increasing numbers of workers.
+
+Usage: python benchmarks/bench_batch.py [groups] [members_per_group] [workers,...]
+
+Workers default to 1, 2, 4 ... up to the core count. Throughput only scales
+with workers while there are idle cores for them.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep benchmark runs out of the app database
+_scratch = tempfile.mkdtemp(prefix='bench_batch_')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_scratch, 'bench.db')}")
+os.environ.setdefault('JOB_UPLOAD_FOLDER', os.path.join(_scratch, 'uploads'))
+# Every worker count reruns the same groups, so their files must stay where they are
+os.environ.setdefault('SOURCE_RETENTION_DAYS', '0')
+
+from benchmarks.generator import DatasetOptions, write_dataset
+from src import batch
+from src.batch import BatchGroup, iter_batch
+from src.main import create_app
+
+
+def default_workers():
+    workers, cores = [1], os.cpu_count() or 1
+    while workers[-1] * 2 <= cores:
+        workers.append(workers[-1] * 2)
+    if workers[-1] != cores:
+        workers.append(cores)
+    return workers
+
+
+def main():
+    group_count = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    members = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    worker_counts = [int(w) for w in sys.argv[3].split(',')] if len(sys.argv) > 3 else default_workers()
+    # One shared pool, sized for the largest count; each run limits how many groups it has in flight
+    batch.BATCH_WORKERS = max(worker_counts)
+
+    groups = []
+    for position in range(group_count):
+        directory = os.path.join(_scratch, 'groups', str(position))
+        os.makedirs(directory)
+        paths = write_dataset(directory, members, DatasetOptions(seed=position))
+        group = BatchGroup(f"Group {position}", '2025-07')
+        group.paths = paths
+        groups.append(group)
+    print(f"{group_count} groups x {members:,} members, {os.cpu_count()} cores")
+
+    with create_app().app_context():
+        baseline = None
+        for workers in worker_counts:
+            list(iter_batch(groups[:workers], max_workers=workers))  # start the pool's processes
+            start = time.perf_counter()
+            summaries = list(iter_batch(groups, max_workers=workers))
+            seconds = time.perf_counter() - start
+            completed = sum(1 for summary in summaries if summary.get('status') == 'completed')
+            # Time inside the workers; the rest is storing results and pool overhead
+            busy = sum(summary.get('seconds', 0) for summary in summaries if 'group_name' in summary)
+            baseline = baseline or seconds
+            print(f"{workers:>3} workers: {seconds:7.2f}s  {completed / seconds:6.2f} groups/s  "
+                  f"speedup {baseline / seconds:4.2f}x  (worker time {busy:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
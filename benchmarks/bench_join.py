@@ -0,0 +1,69 @@
+"""Benchmark the hash-join comparison against the legacy quadratic lookup.
+
+Usage: python benchmarks/bench_join.py [rows ...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import dataset_rows
+from src.file_processor import FileProcessor
+
+# The legacy path scans the employee list once per ID, so large sizes are
+# timed on a sample of IDs and extrapolated linearly
+LEGACY_SAMPLE_IDS = 2000
+
+
+def legacy_compare(processor: FileProcessor, employees, max_ids=None):
+    """The pre-join implementation: dict lookups keyed on the first column plus a linear employee scan"""
+    payroll_lookup, carrier_lookup = {}, {}
+    for idx, row in enumerate(processor.payroll_data):
+        keys = list(row.keys())
+        payroll_lookup[row[keys[0]] if keys and row[keys[0]] else f"EMP{1000+idx:04d}"] = row
+    for idx, row in enumerate(processor.carrier_data):
+        keys = list(row.keys())
+        carrier_lookup[row[keys[0]] if keys and row[keys[0]] else f"EMP{1000+idx:04d}"] = row
+
+    all_emp_ids = list(set(payroll_lookup.keys()) | set(carrier_lookup.keys()))
+    if max_ids is not None:
+        all_emp_ids = all_emp_ids[:max_ids]
+    for emp_id in all_emp_ids:
+        employee = next((emp for emp in employees if emp.employee_id == emp_id), None)
+        if not employee:
+            continue
+        payroll_row = payroll_lookup.get(emp_id)
+        carrier_row = carrier_lookup.get(emp_id)
+        if payroll_row is not None and carrier_row is not None:
+            processor.extract_deduction_amount(payroll_row)
+            processor.extract_premium_amount(carrier_row)
+    return len(payroll_lookup.keys() | carrier_lookup.keys())
+
+
+def run(count: int):
+    processor = FileProcessor()
+    rows = dataset_rows(count)
+    processor.payroll_data, processor.carrier_data = rows['payroll'], rows['carrier']
+    employees = processor.extract_employee_data()
+
+    start = time.perf_counter()
+    errors = processor.compare_payroll_carrier_data(employees)
+    join_seconds = time.perf_counter() - start
+
+    sample = None if count <= LEGACY_SAMPLE_IDS else LEGACY_SAMPLE_IDS
+    start = time.perf_counter()
+    total_ids = legacy_compare(processor, employees, sample)
+    legacy_seconds = time.perf_counter() - start
+    if sample is not None:
+        legacy_seconds *= total_ids / sample
+
+    note = ' (extrapolated)' if sample is not None else ''
+    print(f"{count:>8} rows  join: {join_seconds:8.3f}s  legacy: {legacy_seconds:10.3f}s{note}  "
+          f"speedup: {legacy_seconds / join_seconds:,.0f}x  errors: {len(errors)}")
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 50000, 500000]
+    for size in sizes:
+        run(size)
@@ -0,0 +1,56 @@
+"""Streaming vs memory-mapped ingest: wall time, peak RSS and results of process_files.
+
+Usage: python benchmarks/bench_mapped.py [members]
+
+Each mode runs in its own Python process, so one's peak RSS doesn't hide the
+other's. Both read the same generated files and must report the same errors.
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.generator import write_dataset  # noqa: E402
+
+
+def run_mode(paths, mapped: bool):
+    from werkzeug.datastructures import FileStorage
+    from src.file_processor import FileProcessor
+
+    files = {field: FileStorage(open(path, 'rb'), filename=os.path.basename(path)) for field, path in paths.items()}
+    start = time.perf_counter()
+    result = FileProcessor(seed=1).process_files(files, streaming=True, mapped=mapped)
+    seconds = time.perf_counter() - start
+    errors = sorted((e.employee_id, e.error_type, e.description) for e in result['errors'])
+    print(json.dumps({'seconds': seconds, 'peak_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                      'errors': len(errors), 'digest': hash(tuple(errors))}))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 400000
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_dataset(directory, count)
+        size = sum(os.path.getsize(path) for path in paths.values())
+        print(f"{count:,} members, {size / 2 ** 20:.0f}MB of CSV")
+        digests = set()
+        for mode in ('streaming', 'mapped'):
+            output = subprocess.run([sys.executable, __file__, '--mode', mode, json.dumps(paths)], cwd=ROOT,
+                                    env=dict(os.environ, PYTHONHASHSEED='0'), check=True,
+                                    capture_output=True, text=True).stdout
+            stats = json.loads(output.splitlines()[-1])
+            digests.add(stats['digest'])
+            print(f"{mode:>9}: {stats['seconds']:6.1f}s  peak RSS {stats['peak_mb']:6.0f}MB  {stats['errors']:,} errors")
+        print('results identical' if len(digests) == 1 else 'RESULTS DIFFER')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 3 and sys.argv[1] == '--mode':
+        run_mode(json.loads(sys.argv[3]), sys.argv[2] == 'mapped')
+    else:
+        main()
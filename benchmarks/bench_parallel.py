@@ -0,0 +1,55 @@
+"""Time process_files sequentially and with thread / process parsing pools.
+
+Usage: python benchmarks/bench_parallel.py [rows]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.datastructures import FileStorage
+
+from benchmarks.generator import write_dataset
+from src.file_processor import FileProcessor
+
+
+def timed_run(paths, parallel):
+    handles = {field: open(path, 'rb') for field, path in paths.items()}
+    try:
+        files = {field: FileStorage(stream=handle, filename=os.path.basename(paths[field]))
+                 for field, handle in handles.items()}
+        start = time.perf_counter()
+        FileProcessor().process_files(files, streaming=True, parallel=parallel)
+        return time.perf_counter() - start
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_dataset(directory, count)
+
+        # Single-file cost, for comparison with the parallel wall-clock time
+        for field, path in paths.items():
+            start = time.perf_counter()
+            with open(path, 'rb') as handle:
+                processor = FileProcessor()
+                file_type = field.replace('_file', '')
+                rows = processor.stream_csv_file(handle, file_type)
+                setattr(processor, f"{file_type}_data", rows)
+                getattr(processor, f"extract_from_{file_type}")()
+                processor.build_tables()
+            print(f"{file_type:>9} alone:   {time.perf_counter() - start:6.2f}s")
+
+        for parallel in (None, 'thread', 'process'):
+            timed_run(paths, parallel)  # warm up pools and imports
+            seconds = min(timed_run(paths, parallel) for _ in range(3))
+            print(f"{parallel or 'sequential':>9} total:  {seconds:6.2f}s")
+
+
+if __name__ == '__main__':
+    main()
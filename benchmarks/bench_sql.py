@@ -0,0 +1,49 @@
+"""Time bulk-loading uploads and reconciling them with SQL against the in-memory FileProcessor.
+
+Usage: python benchmarks/bench_sql.py [members] [database_url]
+
+The database defaults to a scratch SQLite file; pass a PostgreSQL URL to time
+the COPY load path. The SQL stages run first so the in-memory run's peak
+doesn't hide theirs.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import write_dataset
+from benchmarks.run_suite import StageTimer
+from src.jobs import get_engine, open_spooled, run_reconciliation
+from src.models import reconciliation, snapshot  # noqa: F401 (tables for create_all)
+from src.models.user import db
+from src.sql_reconciliation import reconcile_load
+from src.upload_store import load_uploads
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    stages = {}
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_dataset(directory, count)
+        database_url = sys.argv[2] if len(sys.argv) > 2 else f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        engine = get_engine(database_url)
+        db.metadata.create_all(engine)
+
+        with StageTimer(stages, 'SQL load'):
+            with open_spooled(paths) as files, engine.begin() as connection:
+                load_id = load_uploads(connection, 'Benchmark Group', '2025-07', files)
+        with StageTimer(stages, 'SQL compare'):
+            with engine.connect() as connection:
+                sql_errors = reconcile_load(connection, load_id)['errors_found']
+
+        with StageTimer(stages, 'in memory'):
+            memory_errors = run_reconciliation(paths, seed=1, parallel=None)['errors_found']
+
+    print(f"{count:,} members on {engine.dialect.name}: {sql_errors:,} errors in SQL, {memory_errors:,} in memory")
+    for name, stage in stages.items():
+        print(f"{name:>12}: {stage['seconds']:7.2f}s  peak {stage['peak_rss_mb']:6.0f}MB  growth {stage['rss_growth_mb']:6.0f}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Cold-start time: building the app in a fresh interpreter, and gunicorn's time to first response.
+
+Usage: python benchmarks/bench_startup.py [runs] [workers]
+
+'create_app' imports src.main and builds the app in a new Python process, as a
+worker without preloading does. 'gunicorn' starts the server from gunicorn.conf.py
+with and without GUNICORN_PRELOAD and times how long until it has answered as
+many database-backed requests (/api/reconciliation/<id>) as it has workers.
+"""
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CREATE_APP = (
+    "import time; start = time.perf_counter(); "
+    "from src.main import create_app; create_app(); "
+    "print(time.perf_counter() - start)"
+)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def create_app_seconds(env) -> float:
+    output = subprocess.run([sys.executable, '-c', CREATE_APP], cwd=ROOT, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return float(output.split()[-1])
+
+
+def get(url: str) -> bool:
+    try:
+        urllib.request.urlopen(url, timeout=1).read()
+    except urllib.error.HTTPError:
+        pass  # a 404 is still an answer
+    except OSError:
+        return False
+    return True
+
+
+def gunicorn_seconds(env, preload: bool, workers: int) -> float:
+    """Seconds from launching gunicorn until `workers` requests have been answered"""
+    port = free_port()
+    env = dict(env, PORT=str(port), WEB_CONCURRENCY=str(workers), GUNICORN_PRELOAD='1' if preload else '0')
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py'],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        answered = 0
+        while answered < workers:
+            if get(f'http://127.0.0.1:{port}/api/reconciliation/bench'):
+                answered += 1
+            else:
+                time.sleep(0.01)
+        return time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    directory = tempfile.mkdtemp(prefix='bench_startup_')
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(directory, 'bench.db')}")
+    try:
+        create_app_seconds(env)  # creates the schema and warms the bytecode cache
+        env['INIT_DB_ON_CREATE'] = '0'
+        seconds = [create_app_seconds(env) for _ in range(runs)]
+        print(f"create_app in a fresh interpreter: median {statistics.median(seconds):.3f}s "
+              f"(min {min(seconds):.3f}s)")
+        for preload in (False, True):
+            seconds = [gunicorn_seconds(env, preload, workers) for _ in range(runs)]
+            print(f"gunicorn, {workers} workers, preload {'on ' if preload else 'off'}: "
+                  f"median {statistics.median(seconds):.3f}s (min {min(seconds):.3f}s)")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
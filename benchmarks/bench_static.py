@@ -0,0 +1,71 @@
+"""Frontend page loads: bytes sent and requests per second, send_from_directory vs the static manifest.
+
+Usage: python benchmarks/bench_static.py [requests]
+
+'before' serves src/static as the catch-all route used to (an os.path.exists per
+request, then send_from_directory). 'after' is the app from create_app(). Each
+file is fetched the way a browser fetches it the first time (Accept-Encoding
+gzip, br) and then revalidated with the ETag that came back.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DIRECTORY = tempfile.mkdtemp(prefix='bench_static_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(DIRECTORY, 'bench.db')}"
+
+from flask import Flask, send_from_directory  # noqa: E402
+from src.main import create_app  # noqa: E402
+
+FILES = ('', 'production.html', 'index_new_functions.js', 'favicon.ico')
+ACCEPT = {'Accept-Encoding': 'gzip, deflate, br'}
+
+
+def send_from_directory_app(static_folder: str) -> Flask:
+    app = Flask(__name__)
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        if path != "" and os.path.exists(os.path.join(static_folder, path)):
+            return send_from_directory(static_folder, path)
+        return send_from_directory(static_folder, 'index.html')
+    return app
+
+
+def fetch(client, path: str, count: int, headers) -> tuple:
+    """(requests per second, body bytes of one response, status)"""
+    start = time.perf_counter()
+    for _ in range(count):
+        response = client.get('/' + path, headers=headers)
+        size = len(response.get_data())
+    return count / (time.perf_counter() - start), size, response.status_code
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    after = create_app()
+    before = send_from_directory_app(after.static_folder)
+    for mode, app in (('before', before), ('after', after)):
+        client = app.test_client()
+        print(mode)
+        for path in FILES:
+            first = client.get('/' + path, headers=ACCEPT)
+            rate, size, _ = fetch(client, path, count, ACCEPT)
+            etag = first.headers.get('ETag')
+            revalidate = dict(ACCEPT, **({'If-None-Match': etag} if etag else {}))
+            again_rate, again_size, status = fetch(client, path, count, revalidate)
+            print(f"  {path or 'index.html':<24} {size:>7,} bytes {rate:7.0f} req/s | "
+                  f"revalidate: {status} {again_size:>7,} bytes {again_rate:7.0f} req/s | "
+                  f"{first.headers.get('Cache-Control')}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        shutil.rmtree(DIRECTORY, ignore_errors=True)
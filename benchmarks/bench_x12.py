@@ -0,0 +1,61 @@
+"""Time reading an X12 834 directly against converting it to CSV and uploading that.
+
+Usage: python benchmarks/bench_x12.py [target_mb]
+"""
+import csv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import write_834
+from benchmarks.run_suite import StageTimer
+from src.file_processor import FileProcessor
+from src.x12 import iter_834_rows
+
+# Roughly what one generated subscriber and their dependents take in an 834
+BYTES_PER_SUBSCRIBER = 490
+
+
+def main():
+    target_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 100
+    count = int(target_mb * 2 ** 20 / BYTES_PER_SUBSCRIBER)
+    stages = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'carrier.834')
+        subscribers = write_834(path, count)
+        print(f"{os.path.getsize(path) / 2 ** 20:.0f}MB 834, {subscribers:,} subscribers")
+
+        # Parser alone: memory should stay flat however big the file is
+        with StageTimer(stages, 'parse only'):
+            with open(path, encoding='latin-1', newline='') as handle:
+                parsed = sum(1 for _ in iter_834_rows(handle))
+
+        with StageTimer(stages, '834 upload'):
+            with open(path, 'rb') as handle:
+                rows = FileProcessor().stream_csv_file(handle, 'carrier')
+        del rows
+
+        # The old workflow: export the 834 to CSV, then upload the CSV
+        csv_path = os.path.join(directory, 'carrier.csv')
+        with StageTimer(stages, 'convert to CSV'):
+            with open(path, encoding='latin-1', newline='') as source, open(csv_path, 'w', newline='') as target:
+                writer = None
+                for row in iter_834_rows(source):
+                    if writer is None:
+                        writer = csv.DictWriter(target, fieldnames=list(row))
+                        writer.writeheader()
+                    writer.writerow(row)
+        with StageTimer(stages, 'CSV upload'):
+            with open(csv_path, 'rb') as handle:
+                rows = FileProcessor().stream_csv_file(handle, 'carrier')
+
+    print(f"{parsed:,} rows parsed")
+    for name, stage in stages.items():
+        print(f"{name:>15}: {stage['seconds']:7.2f}s  peak {stage['peak_rss_mb']:6.0f}MB  growth {stage['rss_growth_mb']:6.0f}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Compare two run_suite.py result files stage by stage.
+
+Usage: python benchmarks/compare_results.py baseline.json candidate.json [--threshold 0.10]
+
+Exits with status 1 when any stage (slower than --min-seconds) regressed past the threshold.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed slowdown as a fraction')
+    parser.add_argument('--min-seconds', type=float, default=0.05, help='ignore stages faster than this (timer noise)')
+    args = parser.parse_args()
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    print(f"baseline  {baseline['commit'][:12]}  {baseline['timestamp']}")
+    print(f"candidate {candidate['commit'][:12]}  {candidate['timestamp']}")
+    if baseline['options'] != candidate['options']:
+        print('warning: the two runs used different dataset options', file=sys.stderr)
+
+    before = {result['employees']: result for result in baseline['results']}
+    regressions = 0
+    for result in candidate['results']:
+        old = before.get(result['employees'])
+        if old is None:
+            continue
+        print(f"\n{result['employees']:,} employees")
+        for name, stage in result['stages'].items():
+            old_stage = old['stages'].get(name)
+            if old_stage is None:
+                continue
+            ratio = stage['seconds'] / old_stage['seconds'] if old_stage['seconds'] else 1.0
+            flag = ''
+            if ratio > 1 + args.threshold and stage['seconds'] >= args.min_seconds:
+                flag = '  REGRESSION'
+                regressions += 1
+            print(f"  {name:<30} {old_stage['seconds']:8.3f}s -> {stage['seconds']:8.3f}s  ({ratio:5.2f}x)  "
+                  f"{old_stage['peak_rss_mb']:7.1f}MB -> {stage['peak_rss_mb']:7.1f}MB{flag}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+"""Seeded generator of payroll / carrier / benadmin datasets for the benchmarks.
+
+The same seed and options always produce byte-identical files. Carrier and
+benadmin data can also be written as an X12 834 enrollment file.
+"""
+import csv
+import os
+import random
+from typing import Dict, Iterator, List, Optional, Tuple
+
+FILE_TYPES = ['payroll', 'carrier', 'benadmin']
+
+# Header layouts seen in real uploads, as (header, field) pairs
+HEADER_VARIANTS = {
+    'payroll': [
+        [('Employee SSN', 'ssn'), ('First Name', 'first'), ('Last Name', 'last'), ('Gross Pay', 'salary'),
+         ('Medical Deduction', 'medical'), ('Dental Deduction', 'dental'), ('Dept', 'department')],
+        [('SSN', 'ssn'), ('Employee Name', 'full_name'), ('Annual Salary', 'salary'),
+         ('Medical Premium Deduction', 'medical'), ('Dental Benefit Deduction', 'dental'), ('Department', 'department')],
+        [('Social Security Number', 'ssn'), ('Last Name', 'last'), ('First Name', 'first'), ('Wages', 'salary'),
+         ('Medical', 'medical'), ('Dental Deduction', 'dental'), ('Location Code', 'location')]
+    ],
+    'carrier': [
+        [('Member SSN', 'ssn'), ('First Name', 'first'), ('Last Name', 'last'), ('Plan Code', 'plan'),
+         ('Coverage Tier', 'tier'), ('Premium', 'premium'), ('Group', 'group')],
+        [('Subscriber SSN', 'ssn'), ('Member Name', 'full_name'), ('Plan', 'plan'), ('Tier', 'tier'),
+         ('Monthly Premium', 'premium'), ('Group Number', 'group')],
+        [('SSN', 'ssn'), ('Last Name', 'last'), ('First Name', 'first'), ('Coverage', 'tier'),
+         ('Total Premium', 'premium'), ('Policy', 'plan')]
+    ],
+    'benadmin': [
+        [('SSN', 'ssn'), ('First Name', 'first'), ('Last Name', 'last'), ('Plan', 'plan'),
+         ('Effective Date', 'effective'), ('Hire Date', 'hire'), ('Location', 'location')],
+        [('Employee SSN', 'ssn'), ('Full Name', 'full_name'), ('Benefit Plan', 'plan'),
+         ('Coverage Start', 'effective'), ('Date of Hire', 'hire'), ('Site', 'location')],
+        [('Social Security', 'ssn'), ('First', 'first'), ('Last', 'last'), ('Plan Name', 'plan'),
+         ('Eff Date', 'effective'), ('Hire', 'hire'), ('Division', 'location')]
+    ]
+}
+
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+               'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Carlos', 'Maria']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+              'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin']
+PLANS = [('MED-PPO', 0.9), ('MED-HMO', 0.75), ('MED-HDHP', 0.55)]
+TIERS = [('EE', 1.0), ('ES', 2.0), ('EC', 1.8), ('FAM', 2.9)]
+DEPARTMENTS = ['OPS', 'SALES', 'ADMIN', 'IT', 'MGMT', 'HR']
+LOCATIONS = ['HQ', 'EAST', 'WEST', 'REMOTE']
+BASE_MEDICAL = 260.0
+DENTAL_BY_TIER = {'EE': 18.5, 'ES': 36.0, 'EC': 34.0, 'FAM': 52.5}
+
+# Odd and not a multiple of 5, so stepping by it never repeats an SSN below 10^9 members
+SSN_STRIDE = 7654321
+
+# 834 coverage level and dependent count per tier
+X12_LEVELS = {'EE': 'EMP', 'ES': 'ESP', 'EC': 'ECH', 'FAM': 'FAM'}
+X12_DEPENDENTS = {'EE': (0, 0), 'ES': (1, 1), 'EC': (1, 3), 'FAM': (2, 4)}
+X12_RELATIONSHIPS = ['01', '19']  # spouse, child
+
+
+class DatasetOptions:
+    """Knobs for one generated dataset"""
+
+    def __init__(self, seed: int = 0, mismatch_rate: float = 0.05, missing_rate: float = 0.02,
+                 dirty_rate: float = 0.01, header_variant: Optional[int] = 0, missing_id_rate: float = 0.0):
+        self.seed = seed
+        self.mismatch_rate = mismatch_rate  # carrier premium differs from payroll deductions
+        self.missing_rate = missing_rate    # member dropped from carrier, and separately from payroll
+        self.dirty_rate = dirty_rate        # formatting noise on SSNs, names and amounts
+        self.header_variant = header_variant  # index into HEADER_VARIANTS, or None for a seeded mix
+        self.missing_id_rate = missing_id_rate  # SSN left blank in one file, so only the name can match
+
+    def to_dict(self) -> Dict[str, object]:
+        return dict(vars(self))
+
+
+def headers_for(options: DatasetOptions) -> Dict[str, List[Tuple[str, str]]]:
+    """Header layout per file type"""
+    rng = random.Random(f"headers-{options.seed}")
+    layouts = {}
+    for file_type in FILE_TYPES:
+        variants = HEADER_VARIANTS[file_type]
+        index = rng.randrange(len(variants)) if options.header_variant is None else options.header_variant % len(variants)
+        layouts[file_type] = variants[index]
+        if options.missing_id_rate:
+            layouts[file_type] = layouts[file_type] + [('Date of Birth', 'dob')]
+    return layouts
+
+
+def dirty_ssn(ssn: str, rng: random.Random) -> str:
+    choice = rng.randrange(4)
+    if choice == 0:
+        return f"{ssn[:3]}-{ssn[3:5]}-{ssn[5:]}"
+    if choice == 1:
+        return f" {ssn} "
+    if choice == 2:
+        return ssn.lstrip('0') or ssn  # spreadsheet dropped the leading zeros
+    return f"{ssn[:3]} {ssn[3:5]} {ssn[5:]}"
+
+
+def dirty_amount(amount: float, rng: random.Random) -> str:
+    choice = rng.randrange(3)
+    if choice == 0:
+        return f"${amount:,.2f}"
+    if choice == 1:
+        return ''
+    return f"{amount:.4f}"
+
+
+def iter_members(count: int, options: DatasetOptions) -> Iterator[Dict[str, Optional[Dict[str, str]]]]:
+    """One dict per member: file type -> field values, or None when the member is absent from that file"""
+    rng = random.Random(options.seed)
+    identity_rng = random.Random(f"identity-{options.seed}")
+    ssn_base = rng.randrange(10 ** 9)
+    for i in range(count):
+        ssn = f"{(ssn_base + i * SSN_STRIDE) % 10 ** 9:09d}"
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        plan, plan_factor = rng.choice(PLANS)
+        tier, tier_factor = rng.choice(TIERS)
+        medical = round(BASE_MEDICAL * plan_factor * tier_factor, 2)
+        dental = DENTAL_BY_TIER[tier]
+        premium = medical + dental
+        if rng.random() < options.mismatch_rate:
+            premium += rng.choice([-1, 1]) * rng.uniform(10, 150)
+        salary = round(max(24000.0, rng.gauss(62000, 21000)), 2)
+
+        shared = {
+            'ssn': ssn, 'first': first, 'last': last, 'full_name': f"{first} {last}", 'plan': plan,
+            'tier': tier, 'group': 'G1001', 'department': rng.choice(DEPARTMENTS), 'location': rng.choice(LOCATIONS),
+            'hire': f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/{rng.randint(1995, 2024)}",
+            'effective': '01/01/2025'
+        }
+        payroll = dict(shared, salary=f"{salary:.2f}", medical=f"{medical:.2f}", dental=f"{dental:.2f}")
+        carrier = dict(shared, premium=f"{premium:.2f}")
+        benadmin = dict(shared)
+
+        # Each file gets its own noise, as it would from separate systems
+        for values in (payroll, carrier, benadmin):
+            if rng.random() < options.dirty_rate:
+                values['ssn'] = dirty_ssn(ssn, rng)
+            if rng.random() < options.dirty_rate:
+                values['first'], values['last'] = f" {first.upper()}", f"{last.lower()} "
+                values['full_name'] = f"{last.upper()}, {first.upper()}"
+        if options.missing_id_rate:
+            # Names alone can't tell members apart, so files with blank SSNs also carry a DOB.
+            # Separate stream, so existing seeds keep producing the same files.
+            birth = f"{identity_rng.randint(1, 12):02d}/{identity_rng.randint(1, 28):02d}/{identity_rng.randint(1955, 2003)}"
+            for values in (payroll, carrier, benadmin):
+                values['dob'] = birth
+                if identity_rng.random() < options.missing_id_rate:
+                    values['ssn'] = ''
+        if rng.random() < options.dirty_rate:
+            payroll['medical'] = dirty_amount(medical, rng)
+        if rng.random() < options.dirty_rate:
+            carrier['premium'] = dirty_amount(premium, rng)
+
+        yield {
+            'payroll': None if rng.random() < options.missing_rate else payroll,
+            'carrier': None if rng.random() < options.missing_rate else carrier,
+            'benadmin': benadmin
+        }
+
+
+def write_dataset(directory: str, count: int, options: Optional[DatasetOptions] = None) -> Dict[str, str]:
+    """Write the three CSVs and return their paths keyed by upload field"""
+    options = options or DatasetOptions()
+    layouts = headers_for(options)
+    paths, handles, writers = {}, {}, {}
+    try:
+        for file_type in FILE_TYPES:
+            path = os.path.join(directory, f"{file_type}.csv")
+            handles[file_type] = open(path, 'w', newline='')
+            writers[file_type] = csv.writer(handles[file_type])
+            writers[file_type].writerow([header for header, _ in layouts[file_type]])
+            paths[f"{file_type}_file"] = path
+
+        for member in iter_members(count, options):
+            for file_type in FILE_TYPES:
+                values = member[file_type]
+                if values is not None:
+                    writers[file_type].writerow([values[field] for _, field in layouts[file_type]])
+    finally:
+        for handle in handles.values():
+            handle.close()
+    return paths
+
+
+def dataset_rows(count: int, options: Optional[DatasetOptions] = None) -> Dict[str, List[Dict[str, str]]]:
+    """The same dataset as parsed rows (lowercased headers, stripped values), without touching disk"""
+    options = options or DatasetOptions()
+    layouts = headers_for(options)
+    rows = {file_type: [] for file_type in FILE_TYPES}
+    for member in iter_members(count, options):
+        for file_type in FILE_TYPES:
+            values = member[file_type]
+            if values is not None:
+                rows[file_type].append({header.lower(): values[field].strip() for header, field in layouts[file_type]})
+    return rows
+
+
+def _x12_date(value: str) -> str:
+    month, day, year = value.split('/')
+    return f"{year}{month}{day}"
+
+
+def _x12_member(values: Dict[str, str], subscriber: bool, relationship: str, birth: str) -> List[str]:
+    segments = [
+        f"INS*{'Y' if subscriber else 'N'}*{relationship}*030*XN*A***FT",
+        f"REF*0F*{values['ssn']}",
+        f"REF*1L*{values['group']}",
+        f"NM1*IL*1*{values['last'].strip()}*{values['first'].strip()}****34*{values['ssn'].strip()}",
+        f"DMG*D8*{birth}*{'F' if len(values['first']) % 2 else 'M'}",
+    ]
+    if subscriber:
+        segments.append(f"DTP*336*D8*{_x12_date(values['hire'])}")
+    return segments
+
+
+def write_834(path: str, count: int, options: Optional[DatasetOptions] = None, file_type: str = 'carrier') -> int:
+    """Write the carrier (or benadmin) side of a dataset as one 834 interchange; returns subscribers written"""
+    options = options or DatasetOptions()
+    # Separate stream, so the CSV files for the same seed don't change
+    rng = random.Random(f"834-{options.seed}")
+    written = 0
+    with open(path, 'w', newline='') as handle:
+        handle.write("ISA*00*          *00*          *ZZ*CARRIER        *ZZ*SPONSOR        "
+                     "*250101*1200*^*00501*000000001*0*P*:~\n")
+        handle.write("GS*BE*CARRIER*SPONSOR*20250101*1200*1*X*005010X220A1~\n")
+        handle.write("ST*834*0001*005010X220A1~\nBGN*00*1*20250101*1200****2~\n")
+        segment_count = 2
+        for member in iter_members(count, options):
+            values = member[file_type]
+            if values is None:
+                continue
+            effective = _x12_date(values['effective'])
+            birth = f"{rng.randint(1955, 2003)}{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}"
+            segments = _x12_member(values, True, '18', birth)
+            segments.append(f"DTP*356*D8*{effective}")
+            dental = DENTAL_BY_TIER[values['tier']]
+            premium = values.get('premium', '')
+            medical = premium.replace('$', '').replace(',', '')
+            segments.append(f"HD*030**HLT*{values['plan']}*{X12_LEVELS[values['tier']]}")
+            segments.append(f"DTP*348*D8*{effective}")
+            if medical:
+                segments.append(f"AMT*P3*{float(medical) - dental:.2f}")
+            segments.append(f"HD*030**DEN*DEN-BASIC*{X12_LEVELS[values['tier']]}")
+            segments.append(f"DTP*348*D8*{effective}")
+            if medical:
+                segments.append(f"AMT*P3*{dental:.2f}")
+
+            low, high = X12_DEPENDENTS[values['tier']]
+            for position in range(rng.randint(low, high)):
+                relationship = X12_RELATIONSHIPS[0 if position == 0 and values['tier'] != 'EC' else 1]
+                dependent = dict(values, first=rng.choice(FIRST_NAMES))
+                dependent_birth = f"{rng.randint(1960, 2024)}{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}"
+                segments.extend(_x12_member(dependent, False, relationship, dependent_birth))
+                segments.append(f"HD*030**HLT*{values['plan']}*{X12_LEVELS[values['tier']]}")
+
+            handle.write('~\n'.join(segments) + '~\n')
+            segment_count += len(segments)
+            written += 1
+        handle.write(f"SE*{segment_count + 1}*0001~\nGE*1*1~\nIEA*1*000000001~\n")
+    return written
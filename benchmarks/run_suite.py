@@ -0,0 +1,221 @@
+"""Time each FileProcessor stage on generated datasets and write the results as JSON.
+
+Usage: python benchmarks/run_suite.py [--sizes 1k,10k,100k,1m] [--output results.json]
+       [--seed N] [--mismatch-rate R] [--missing-rate R] [--dirty-rate R] [--missing-id-rate R]
+       [--headers 0|1|2|mixed] [--streaming]
+
+Each dataset is generated once, then the staged run and the end-to-end
+process_files run each get a fresh interpreter so peak memory isn't inherited. Compare two result files with benchmarks/compare_results.py.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import FILE_TYPES, DatasetOptions, write_dataset
+
+SIZE_SUFFIXES = {'k': 1000, 'm': 1000000}
+DEFAULT_SIZES = '1k,10k,100k,1m'
+SAMPLE_INTERVAL = 0.005
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    if text[-1:] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+def current_rss() -> int:
+    """Resident set size in bytes (Linux /proc, else the process high-water mark)"""
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class StageTimer:
+    """Wall time and peak RSS of one stage, sampled on a background thread"""
+
+    def __init__(self, results: dict, name: str):
+        self.results = results
+        self.name = name
+
+    def _sample(self):
+        while not self._done.wait(SAMPLE_INTERVAL):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        self.start_rss = self.peak = current_rss()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        self._done.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+        self.results[self.name] = {
+            'seconds': round(seconds, 4),
+            'peak_rss_mb': round(self.peak / 2 ** 20, 1),
+            'rss_growth_mb': round((self.peak - self.start_rss) / 2 ** 20, 1)
+        }
+
+
+def dataset_paths(directory: str) -> dict:
+    return {f"{file_type}_file": os.path.join(directory, f"{file_type}.csv") for file_type in FILE_TYPES}
+
+
+def run_stages(directory: str, seed: int, streaming: bool) -> dict:
+    """Time the FileProcessor stages one at a time (runs inside a child interpreter)"""
+    from src.file_processor import FileProcessor
+
+    paths = dataset_paths(directory)
+    stages = {}
+    processor = FileProcessor(seed=seed)
+    read = processor.stream_csv_file if streaming else processor.read_csv_file
+    with StageTimer(stages, 'read_csv_file'):
+        for file_type in FILE_TYPES:
+            with open(paths[f"{file_type}_file"], 'rb') as handle:
+                setattr(processor, f"{file_type}_data", read(handle, file_type))
+    rows = {file_type: len(getattr(processor, f"{file_type}_data")) for file_type in FILE_TYPES}
+
+    with StageTimer(stages, 'extract_employee_data'):
+        employees = processor.extract_employee_data()
+
+    # Builds the columnar tables and the join on first use
+    with StageTimer(stages, 'compare_payroll_carrier_data'):
+        compared = processor.compare_payroll_carrier_data(employees)
+
+    # Error generation reuses the memoised join, so this is the cost on top of the comparison
+    processor.errors_by_key.clear()
+    with StageTimer(stages, 'generate_realistic_errors'):
+        errors = processor.generate_realistic_errors(employees)
+
+    return {'rows': rows, 'errors_found': len(errors), 'compared_errors': len(compared), 'stages': stages,
+            'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+
+def run_process_files(directory: str, seed: int, streaming: bool) -> dict:
+    """Time the whole request path as the route runs it (runs inside a child interpreter)"""
+    from werkzeug.datastructures import FileStorage
+
+    from src.file_processor import FileProcessor
+
+    paths = dataset_paths(directory)
+    stages = {}
+    handles = {field: open(path, 'rb') for field, path in paths.items()}
+    try:
+        files = {field: FileStorage(stream=handle, filename=os.path.basename(paths[field]))
+                 for field, handle in handles.items()}
+        with StageTimer(stages, 'process_files'):
+            FileProcessor(seed=seed).process_files(files, streaming=streaming)
+    finally:
+        for handle in handles.values():
+            handle.close()
+    return {'stages': stages, 'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+
+PARTS = {'stages': run_stages, 'process_files': run_process_files}
+
+
+def run_size(count: int, args) -> dict:
+    """Generate one dataset, then time each part of it in a fresh interpreter"""
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        paths = write_dataset(directory, count, options_from_args(args))
+        result = {
+            'employees': count,
+            'generate_seconds': round(time.perf_counter() - start, 3),
+            'file_bytes': {field: os.path.getsize(path) for field, path in paths.items()},
+            'stages': {},
+            'max_rss_mb': {}
+        }
+        for part in PARTS:
+            child_args = [sys.executable, os.path.abspath(__file__), '--part', part, '--directory', directory,
+                          '--seed', str(args.seed)]
+            if args.streaming:
+                child_args.append('--streaming')
+            output = subprocess.run(child_args, check=True, stdout=subprocess.PIPE).stdout
+            measured = json.loads(output.splitlines()[-1])  # FileProcessor may print warnings first
+            result['stages'].update(measured.pop('stages'))
+            result['max_rss_mb'][part] = measured.pop('max_rss_mb')
+            result.update(measured)
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def options_from_args(args) -> DatasetOptions:
+    return DatasetOptions(seed=args.seed, mismatch_rate=args.mismatch_rate, missing_rate=args.missing_rate,
+                          dirty_rate=args.dirty_rate, missing_id_rate=args.missing_id_rate,
+                          header_variant=None if args.headers == 'mixed' else int(args.headers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=DEFAULT_SIZES)
+    parser.add_argument('--output', default=None, help='write JSON here (default: print)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mismatch-rate', type=float, default=0.05)
+    parser.add_argument('--missing-rate', type=float, default=0.02)
+    parser.add_argument('--dirty-rate', type=float, default=0.01)
+    parser.add_argument('--missing-id-rate', type=float, default=0.0)
+    parser.add_argument('--headers', default='0', help="header variant index, or 'mixed'")
+    parser.add_argument('--streaming', action='store_true', help='read with stream_csv_file')
+    parser.add_argument('--part', choices=list(PARTS), help=argparse.SUPPRESS)
+    parser.add_argument('--directory', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.part:
+        measured = PARTS[args.part](args.directory, args.seed, args.streaming)
+        print()
+        json.dump(measured, sys.stdout)
+        return
+
+    results = []
+    for count in (parse_size(size) for size in args.sizes.split(',')):
+        result = run_size(count, args)
+        results.append(result)
+        stages = '  '.join(f"{name} {stage['seconds']:.2f}s/{stage['peak_rss_mb']:.0f}MB"
+                           for name, stage in result['stages'].items())
+        print(f"{count:>9,} employees  {stages}", file=sys.stderr)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'options': dict(options_from_args(args).to_dict(), streaming=args.streaming),
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+"""gunicorn settings for Railway, Render and Heroku: gunicorn --config gunicorn.conf.py
+
+Workers come from WEB_CONCURRENCY (gunicorn's own default). The master builds
+the app once and forks its workers from it (GUNICORN_PRELOAD=0 turns that off),
+so they share the imported code copy-on-write and start without importing anything.
+"""
+import os
+
+wsgi_app = 'src.main:create_app()'
+bind = f"0.0.0.0:{os.environ.get('PORT', '3000')}"
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+# Workers skip the schema step; on_starting runs it once, before any worker exists
+os.environ['INIT_DB_ON_CREATE'] = '0'
+
+
+def on_starting(server):
+    from src.main import create_app, init_database, preload_modules
+
+    init_database(create_app())
+    if server.cfg.preload_app:
+        preload_modules()
@@ -0,0 +1,284 @@
+import csv
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.jobs import UPLOAD_ROOT, record_completed_run, run_reconciliation
+from src.metrics import registry
+from src.models.reconciliation import ReconciliationJob
+from src.models.user import db
+from src.snapshots import find_previous_snapshot, load_snapshot
+from src.source_rows import retain_files, spooled_name
+
+# Groups reconciled at once; month-end throughput scales with this up to the core count
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', os.cpu_count() or 1))
+MAX_BATCH_GROUPS = int(os.environ.get('MAX_BATCH_GROUPS', 1000))
+# Refuse archives that would unpack to more than this
+MAX_BATCH_UNPACKED_MB = int(os.environ.get('MAX_BATCH_UNPACKED_MB', 10240))
+
+MANIFEST_NAME = 'manifest.csv'
+# Manifest column -> upload field; either spelling is accepted
+MANIFEST_COLUMNS = {'payroll': 'payroll_file', 'carrier': 'carrier_file', 'benadmin': 'benadmin_file'}
+# Without a manifest, a file's name says what it is (checked in order)
+FILENAME_HINTS = [
+    ('payroll_file', ['payroll', 'deduction']),
+    ('benadmin_file', ['benadmin', 'ben_admin', 'ben-admin', 'enrollment', 'eligibility']),
+    ('carrier_file', ['carrier', 'premium', 'invoice', '834'])
+]
+# Fields of a run's result that go into its batch summary line
+SUMMARY_FIELDS = ['total_employees', 'errors_found', 'error_rate', 'files_processed', 'error_counts', 'delta']
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class BatchGroup:
+    """One client group's files, spooled to disk for a worker process"""
+
+    def __init__(self, name: str, period: str):
+        self.name = name
+        self.period = period
+        self.paths: Dict[str, str] = {}  # upload field -> spooled file
+        self.error: Optional[str] = None  # why the group can't be reconciled
+
+
+def get_batch_executor() -> ProcessPoolExecutor:
+    """Process pool of BATCH_WORKERS shared by every batch request in this web worker"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn avoids forking a threaded gunicorn worker
+            _executor = ProcessPoolExecutor(max_workers=BATCH_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def new_batch_directory() -> str:
+    directory = os.path.join(UPLOAD_ROOT, f"batch-{uuid.uuid4().hex}")
+    os.makedirs(directory)
+    return directory
+
+
+def field_for(filename: str) -> Optional[str]:
+    """Upload field a file belongs in, judging by its name"""
+    name = os.path.basename(filename).lower()
+    for field, hints in FILENAME_HINTS:
+        if any(hint in name for hint in hints):
+            return field
+    return None
+
+
+def read_manifest(stream: IO[bytes], default_period: str) -> List[Dict[str, str]]:
+    """Manifest rows as {'group_name', 'period', '<type>_file': file name}"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        rows = []
+        for row in csv.DictReader(text):
+            row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+            entry = {'group_name': row.get('group_name') or row.get('group') or '',
+                     'period': row.get('period') or default_period}
+            for column, field in MANIFEST_COLUMNS.items():
+                name = row.get(field) or row.get(column)
+                if name:
+                    entry[field] = name
+            if entry['group_name']:
+                rows.append(entry)
+        return rows
+    finally:
+        text.detach()
+
+
+def spool_groups(entries: List[Dict[str, str]], save_file: Callable[[str, str], bool],
+                 directory: str) -> List[BatchGroup]:
+    """Copy each group's files into its own folder under the batch directory
+
+    save_file(name, path) copies the named file to path, returning False when
+    there is no such file.
+    """
+    if len(entries) > MAX_BATCH_GROUPS:
+        raise ValueError(f'A batch can hold at most {MAX_BATCH_GROUPS} groups')
+    groups = []
+    for position, entry in enumerate(entries):
+        group = BatchGroup(entry['group_name'], entry['period'])
+        groups.append(group)
+        group_directory = os.path.join(directory, str(position))
+        os.makedirs(group_directory)
+        for field in MANIFEST_COLUMNS.values():
+            name = entry.get(field)
+            if not name:
+                continue
+            # Spooled under our own name, never the one from the archive
+            path = os.path.join(group_directory, spooled_name(field, name))
+            if not save_file(name, path):
+                group.error = f'File not found: {name}'
+                break
+            group.paths[field] = path
+        if group.error is None and len(group.paths) < 2:
+            group.error = 'Please upload at least 2 files for reconciliation'
+    return groups
+
+
+def spool_archive(archive: IO[bytes], directory: str, period: str, default_group: str) -> List[BatchGroup]:
+    """Groups from a zip: one folder per group, or a manifest.csv naming each group's files"""
+    with zipfile.ZipFile(archive) as bundle:
+        members = [info for info in bundle.infolist() if not info.is_dir()
+                   and not info.filename.startswith('__MACOSX/')
+                   and not os.path.basename(info.filename).startswith('.')]
+        if sum(info.file_size for info in members) > MAX_BATCH_UNPACKED_MB * 1024 * 1024:
+            raise ValueError(f'The archive unpacks to more than {MAX_BATCH_UNPACKED_MB}MB')
+        by_name = {info.filename: info for info in members}
+
+        manifest = next((info for info in members if os.path.basename(info.filename).lower() == MANIFEST_NAME), None)
+        base = os.path.dirname(manifest.filename) if manifest is not None else ''
+        if manifest is not None:
+            with bundle.open(manifest) as stream:
+                entries = read_manifest(stream, period)
+        else:
+            folders: Dict[str, Dict[str, str]] = defaultdict(dict)
+            for info in members:
+                field = field_for(info.filename)
+                if field is None:
+                    continue
+                parts = info.filename.split('/')
+                folder = parts[-2] if len(parts) > 1 else default_group
+                folders[folder].setdefault(field, info.filename)
+            entries = [dict(files, group_name=name, period=period) for name, files in sorted(folders.items())]
+
+        def save_member(name: str, path: str) -> bool:
+            # Manifest paths are relative to the manifest's own folder
+            info = by_name.get(f"{base}/{name}" if base else name) or by_name.get(name)
+            if info is None:
+                return False
+            with bundle.open(info) as source, open(path, 'wb') as target:
+                shutil.copyfileobj(source, target)
+            return True
+
+        return spool_groups(entries, save_member, directory)
+
+
+def spool_manifest(manifest: IO[bytes], uploads: List[Any], directory: str, period: str) -> List[BatchGroup]:
+    """Groups from an uploaded manifest.csv plus the files it names, uploaded alongside it"""
+    by_name = {os.path.basename(upload.filename): upload for upload in uploads if upload.filename}
+    entries = read_manifest(manifest, period)
+
+    def save_upload(name: str, path: str) -> bool:
+        upload = by_name.get(os.path.basename(name))
+        if upload is None:
+            return False
+        upload.stream.seek(0)  # several groups may share a file
+        upload.save(path)
+        return True
+
+    return spool_groups(entries, save_upload, directory)
+
+
+def run_group(paths: Dict[str, str], previous_snapshot=None) -> Tuple[Dict[str, Any], float]:
+    """Worker process entry point: one group's reconciliation and how long it took"""
+    start = time.perf_counter()
+    # Groups already run side by side, so each one parses its own files serially
+    result = run_reconciliation(paths, previous_snapshot=previous_snapshot, parallel=None)
+    return result, time.perf_counter() - start
+
+
+def _summary(group: BatchGroup, status: str, **fields) -> Dict[str, Any]:
+    registry.inc('benefitspecs_batch_groups_total', status=status)
+    return dict({'group_name': group.name, 'period': group.period, 'status': status}, **fields)
+
+
+def _failed(group: BatchGroup, error: str, job_id: Optional[str] = None) -> Dict[str, Any]:
+    """Record the group's job (the one already stored, if any) as failed and summarize it"""
+    job = ReconciliationJob.query.get(job_id) if job_id else None
+    if job is None:
+        job = ReconciliationJob(group_name=group.name, period=group.period)
+        db.session.add(job)
+    job.status = 'failed'
+    job.error = error
+    db.session.commit()
+    return _summary(group, 'failed', job_id=job.id, error=job.error)
+
+
+def _store(group: BatchGroup, future) -> Dict[str, Any]:
+    """Save a finished group as a reconciliation job and summarize it"""
+    try:
+        result, seconds = future.result()
+    except Exception as e:
+        return _failed(group, f'Error processing files: {str(e)}')
+
+    result['group_name'] = group.name
+    result['period'] = group.period
+    job_id = None
+    try:
+        job = record_completed_run(group.name, group.period, result)
+        job_id = job.id
+        retain_files(job_id, group.paths)
+    except Exception as e:
+        # One group's failed insert or file move must not end the batch, and it
+        # leaves the session unusable until it is rolled back
+        db.session.rollback()
+        return _failed(group, f'Error storing results: {str(e)}', job_id)
+    stored = json.loads(job.result_json)
+    fields = {field: stored[field] for field in SUMMARY_FIELDS if field in stored}
+    return _summary(group, 'completed', job_id=job_id, seconds=round(seconds, 3), **fields)
+
+
+def iter_batch(groups: List[BatchGroup], delta: bool = False, max_workers: int = BATCH_WORKERS) -> Iterator[Dict[str, Any]]:
+    """Reconcile every group on the batch pool, yielding each summary as its group finishes
+
+    At most max_workers groups (1 to BATCH_WORKERS) are in flight at once, so a
+    large batch never queues more work (or loads more snapshots) than it may run.
+    The pool itself is shared, so the host never runs more than BATCH_WORKERS.
+    """
+    max_workers = max(1, min(max_workers, BATCH_WORKERS))
+    executor = get_batch_executor()
+    start = time.perf_counter()
+    waiting = iter(groups)
+    running = {}
+    counts = defaultdict(int)
+    totals = {'total_employees': 0, 'errors_found': 0}
+    try:
+        while True:
+            for group in waiting:
+                if group.error:
+                    counts['skipped'] += 1
+                    yield _summary(group, 'skipped', error=group.error)
+                    continue
+                previous = find_previous_snapshot(group.name, group.period) if delta else None
+                snapshot = load_snapshot(previous) if previous else None
+                running[executor.submit(run_group, group.paths, snapshot)] = group
+                if len(running) >= max_workers:
+                    break
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                summary = _store(running.pop(future), future)
+                counts[summary['status']] += 1
+                for field in totals:
+                    totals[field] += summary.get(field, 0)
+                yield summary
+    finally:
+        # The client went away: don't start groups nobody will hear about
+        for future in running:
+            future.cancel()
+
+    yield {'batch': dict(totals, groups=len(groups), workers=max_workers,
+                         seconds=round(time.perf_counter() - start, 3), **counts)}
+
+
+def stream_batch(groups: List[BatchGroup], directory: str, delta: bool = False,
+                 max_workers: int = BATCH_WORKERS) -> Iterator[str]:
+    """NDJSON lines for iter_batch, removing the spooled files once the batch is over"""
+    try:
+        for summary in iter_batch(groups, delta, max_workers):
+            yield json.dumps(summary) + '\n'
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
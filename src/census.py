@@ -0,0 +1,320 @@
+import hashlib
+import math
+from collections import Counter
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.file_processor import FileProcessor
+from src.join_engine import normalize_key
+from src.metrics import timed
+from src.schema_resolver import DATE_FORMATS, ColumnSchema, resolve_schema
+
+PERCENTILES = [10, 25, 50, 75, 90]
+DAYS_PER_YEAR = 365.25
+
+# Distribution bins as (label, upper bound); the last bin is open-ended
+AGE_BINS = [('Under 30', 30), ('30-39', 40), ('40-49', 50), ('50-59', 60), ('60+', None)]
+SALARY_BINS = [('Under $30K', 30000), ('$30K-$45K', 45000), ('$45K-$60K', 60000), ('$60K-$75K', 75000),
+               ('$75K-$90K', 90000), ('$90K+', None)]
+TENURE_BINS = [('Under 1 year', 1), ('1-3 years', 3), ('3-5 years', 5), ('5-10 years', 10), ('10+ years', None)]
+DEPENDENT_BINS = [('0', 1), ('1', 2), ('2', 3), ('3+', None)]
+
+# Rows buffered before the sketches are updated; bounds memory regardless of file size
+CHUNK_ROWS = 16384
+# Distinct tier labels tracked before the rest are folded into 'Other'
+MAX_TIERS = 50
+SKETCH_ACCURACY = 0.01
+HLL_PRECISION = 14
+
+
+class RunningStats:
+    """Count, mean and variance in one pass (Welford's update, merged per chunk)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values: np.ndarray):
+        count = len(values)
+        if not count:
+            return
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+
+        # Chan et al.'s pairwise combination of two partial results
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+class QuantileSketch:
+    """Log-bucketed quantile sketch: every estimate is within `accuracy` relative error"""
+
+    def __init__(self, accuracy: float = SKETCH_ACCURACY):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets: Counter = Counter()
+        self.zeros = 0  # ages, salaries and tenure below zero are data errors
+        self.count = 0
+
+    def add(self, values: np.ndarray):
+        self.count += len(values)
+        positive = values[values > 0]
+        self.zeros += len(values) - len(positive)
+        indexes, counts = np.unique(np.ceil(np.log(positive) / self.log_gamma).astype(np.int64), return_counts=True)
+        self.buckets.update(dict(zip(indexes.tolist(), counts.tolist())))
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # Midpoint of the bucket (gamma^(i-1), gamma^i] in relative terms
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return None
+
+
+class DistinctCounter:
+    """HyperLogLog estimate of distinct members in fixed memory"""
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = np.zeros(self.size, dtype=np.uint8)
+
+    def add(self, values: List[str]):
+        if not values:
+            return
+        # hash() is salted per process, so it would give each worker (and each run) a
+        # different estimate for the same members
+        digests = b''.join(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest() for value in values)
+        hashed = np.frombuffer(digests, dtype='<u8').astype(np.uint64)
+        index = (hashed & np.uint64(self.size - 1)).astype(np.intp)
+        rest = hashed >> np.uint64(self.precision)
+        # frexp's exponent is the exact bit length of the remaining hash bits
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = ((64 - self.precision) - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def estimate(self) -> Optional[int]:
+        empty = int((self.registers == 0).sum())
+        if empty == self.size:
+            return None
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size * self.size / float(np.ldexp(1.0, -self.registers.astype(np.int64)).sum())
+        if estimate <= 2.5 * self.size and empty:
+            estimate = self.size * math.log(self.size / empty)  # linear counting for small sets
+        return int(round(estimate))
+
+
+class Histogram:
+    """Counts per fixed bin"""
+
+    def __init__(self, bins: List[Tuple[str, Optional[float]]]):
+        self.bins = bins
+        self.edges = np.array([upper for _, upper in bins if upper is not None], dtype=np.float64)
+        self.counts = np.zeros(len(bins), dtype=np.int64)
+
+    def add(self, values: np.ndarray):
+        self.counts += np.bincount(np.searchsorted(self.edges, values, side='right'), minlength=len(self.bins))
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        total = int(self.counts.sum())
+        return [{'label': label, 'count': count, 'percent': round(count / total * 100, 1) if total else 0.0}
+                for (label, _), count in zip(self.bins, self.counts.tolist())]
+
+
+class Metric:
+    """Running stats, quantile sketch and histogram for one numeric column"""
+
+    def __init__(self, bins: List[Tuple[str, Optional[float]]]):
+        self.stats = RunningStats()
+        self.sketch = QuantileSketch()
+        self.histogram = Histogram(bins)
+
+    def add(self, values: np.ndarray):
+        values = values[~np.isnan(values)]
+        self.stats.add(values)
+        self.sketch.add(values)
+        self.histogram.add(values)
+
+    def to_dict(self, digits: int = 1) -> Dict[str, Any]:
+        stats = self.stats
+        if not stats.count:
+            return {'count': 0}
+        return {
+            'count': stats.count,
+            'mean': round(stats.mean, digits),
+            'std': round(stats.std, digits),
+            'min': round(stats.min, digits),
+            'max': round(stats.max, digits),
+            'percentiles': {f"p{p}": round(self.sketch.quantile(p / 100), digits) for p in PERCENTILES}
+        }
+
+
+@lru_cache(maxsize=65536)
+def date_ordinal(value: str) -> float:
+    """Proleptic ordinal of a date cell in any format seen in uploads, NaN if unreadable"""
+    for fmt in DATE_FORMATS:
+        try:
+            return float(datetime.strptime(value, fmt).toordinal())
+        except ValueError:
+            continue
+    return math.nan
+
+
+def parse_number(value: Optional[str]) -> float:
+    """Parse a numeric cell, ignoring currency symbols and thousands separators; NaN if unreadable"""
+    if not value:
+        return math.nan
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return float(value.replace('$', '').replace(',', ''))
+        except ValueError:
+            return math.nan
+
+
+def as_of_date(period: Optional[str]) -> date:
+    """First day of a 'YYYY-MM' period, or today when the period can't be read"""
+    try:
+        return datetime.strptime(period or '', '%Y-%m').date()
+    except ValueError:
+        return date.today()
+
+
+def column_numbers(rows: List[Dict], column: Optional[str]) -> np.ndarray:
+    """One numeric column as float64, NaN where missing"""
+    if not column:
+        return np.full(len(rows), np.nan)
+    return np.fromiter((parse_number(row[column]) for row in rows), dtype=np.float64, count=len(rows))
+
+
+def column_years_since(rows: List[Dict], column: Optional[str], as_of: date) -> np.ndarray:
+    """Years from each date in a column to `as_of`, NaN where missing or in the future"""
+    if not column:
+        return np.full(len(rows), np.nan)
+    ordinals = np.fromiter((date_ordinal(row[column]) if row[column] else math.nan for row in rows),
+                           dtype=np.float64, count=len(rows))
+    years = (as_of.toordinal() - ordinals) / DAYS_PER_YEAR
+    years[years < 0] = np.nan  # dates after the period are typos, not negative ages
+    return years
+
+
+def census_ages(rows: List[Dict], schema: ColumnSchema, as_of: date) -> np.ndarray:
+    """Stated ages, falling back to birth dates"""
+    ages = column_numbers(rows, schema.age)
+    missing = np.isnan(ages)
+    if missing.any():
+        ages[missing] = column_years_since(rows, schema.dates.get('birth_date'), as_of)[missing]
+    return ages
+
+
+def census_tenure(rows: List[Dict], schema: ColumnSchema, as_of: date) -> np.ndarray:
+    """Stated tenure, falling back to hire dates"""
+    tenure = column_numbers(rows, schema.tenure)
+    missing = np.isnan(tenure)
+    if missing.any():
+        tenure[missing] = column_years_since(rows, schema.dates.get('hire_date'), as_of)[missing]
+    return tenure
+
+
+class CensusAnalyzer:
+    """Single-pass census statistics with memory bounded independently of the row count"""
+
+    def __init__(self, as_of: Optional[date] = None):
+        self.as_of = as_of or date.today()
+        self.rows = 0
+        self.age = Metric(AGE_BINS)
+        self.salary = Metric(SALARY_BINS)
+        self.tenure = Metric(TENURE_BINS)
+        self.dependents = Metric(DEPENDENT_BINS)
+        self.tiers: Counter = Counter()
+        self.members = DistinctCounter()
+
+    def add_rows(self, rows: Iterable[Dict], schema: Optional[ColumnSchema] = None):
+        chunk = []
+        for row in rows:
+            if schema is None:
+                schema = resolve_schema(list(row.keys()), 'census')
+            chunk.append(row)
+            if len(chunk) == CHUNK_ROWS:
+                self.add_chunk(chunk, schema)
+                chunk = []
+        if chunk:
+            self.add_chunk(chunk, schema)
+
+    def add_chunk(self, chunk: List[Dict], schema: ColumnSchema):
+        self.rows += len(chunk)
+
+        if schema.id_column:
+            self.members.add([normalize_key(row[schema.id_column]) for row in chunk if row[schema.id_column]])
+
+        self.age.add(census_ages(chunk, schema, self.as_of))
+        self.tenure.add(census_tenure(chunk, schema, self.as_of))
+        self.salary.add(column_numbers(chunk, schema.salary))
+        if schema.dependents:
+            self.dependents.add(column_numbers(chunk, schema.dependents))
+
+        if schema.tier:
+            for tier, count in Counter(row[schema.tier].upper() or 'UNKNOWN' for row in chunk).items():
+                if tier in self.tiers or len(self.tiers) < MAX_TIERS:
+                    self.tiers[tier] += count
+                else:
+                    self.tiers['OTHER'] += count
+
+    def results(self) -> Dict[str, Any]:
+        tier_total = sum(self.tiers.values())
+        dependents = self.dependents.stats
+        return {
+            'summary': {
+                'total_employees': self.rows,
+                'unique_members': self.members.estimate(),
+                'average_age': round(self.age.stats.mean, 1) if self.age.stats.count else None,
+                'average_salary': round(self.salary.stats.mean) if self.salary.stats.count else None,
+                'average_tenure': round(self.tenure.stats.mean, 1) if self.tenure.stats.count else None
+            },
+            'age': self.age.to_dict(),
+            'salary': self.salary.to_dict(digits=0),
+            'tenure': self.tenure.to_dict(),
+            'distributions': {
+                'age': self.age.histogram.to_list(),
+                'salary': self.salary.histogram.to_list(),
+                'tenure': self.tenure.histogram.to_list()
+            },
+            'tier_mix': [{'tier': tier, 'count': count, 'percent': round(count / tier_total * 100, 1)}
+                         for tier, count in self.tiers.most_common()],
+            'dependents': {
+                'total': int(round(dependents.mean * dependents.count)),
+                'average': round(dependents.mean, 2) if dependents.count else None,
+                'distribution': self.dependents.histogram.to_list()
+            }
+        }
+
+
+@timed('analyze_census')
+def analyze_census(file_obj, period: Optional[str] = None) -> Dict[str, Any]:
+    """Stream a census CSV through the shared reader and summarize it in one pass"""
+    analyzer = CensusAnalyzer(as_of_date(period))
+    analyzer.add_rows(FileProcessor().iter_csv_rows(file_obj, 'census'))
+    return analyzer.results()
@@ -0,0 +1,179 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.identity import member_id_key, normalize_dob
+from src.schema_resolver import LINE_NAMES, ColumnSchema, coverage_line, resolve_schema
+
+# Amounts used when a row has no usable deduction/premium value
+FALLBACK_AMOUNT_RANGE = (150.0, 300.0)
+
+
+def parse_amount(value: Optional[str]) -> Optional[float]:
+    """Parse an amount cell, returning None when it is blank or not numeric"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+class LineItems:
+    """Long format of a file's amounts: one entry per (row, line of coverage)"""
+
+    def __init__(self, rows: List[int], lines: List[int], plans: List[int], amounts: List[float],
+                 from_plan: List[bool], plan_names: List[str]):
+        self.rows = np.array(rows, dtype=np.int64)
+        self.lines = np.array(lines, dtype=np.int64)   # index into LINE_NAMES, 0 when not stated
+        self.plans = np.array(plans, dtype=np.int64)   # index into plan_names
+        self.amounts = np.array(amounts, dtype=np.float64)
+        self.from_plan = np.array(from_plan, dtype=bool)  # line taken from the plan code, not a line column
+        self.plan_names = plan_names                   # '' when the file names no plan for the line
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def by_row(self, row_count: int) -> List[str]:
+        """Each row's entries as text, for change detection"""
+        texts = [''] * row_count
+        for row, line, plan, amount in zip(self.rows.tolist(), self.lines.tolist(), self.plans.tolist(),
+                                           self.amounts.tolist()):
+            texts[row] += f"{LINE_NAMES[line]}:{self.plan_names[plan]}:{amount!r};"
+        return texts
+
+
+def _line_plan(row: Dict, plan_column: Optional[str], line: str) -> str:
+    """The row's plan code when it is for the given line, otherwise ''"""
+    if plan_column and line and coverage_line(row[plan_column]) == line:
+        return row[plan_column]
+    return ''
+
+
+def _item_columns(schema: ColumnSchema, columns: List[str]) -> List[Tuple[str, int, Optional[str], str]]:
+    """(amount column, line code, the line's own plan column, line) for the amount columns of a file"""
+    line_codes = {line: code for code, line in enumerate(LINE_NAMES)}
+    item_columns = []
+    for column in columns:
+        line = schema.line_columns.get(column, '')
+        item_columns.append((column, line_codes[line], schema.line_plans.get(line), line))
+    return item_columns
+
+
+class SourceTable:
+    """Columnar form of one parsed file: string columns for identity, float64 arrays for amounts"""
+
+    def __init__(self, file_type: str, keys: List[str], ids: List[str], names: List[str],
+                 amounts: np.ndarray, has_amount: np.ndarray, birth_dates: Optional[List[str]] = None,
+                 line_items: Optional[LineItems] = None):
+        self.file_type = file_type
+        self.keys = keys                            # normalized SSN / member IDs, '' when a row has none
+        self.ids = np.array(ids, dtype=object)      # employee IDs as they appear in the file
+        self.names = np.array(names, dtype=object)  # '' when a row has no name
+        self.amounts = amounts                      # deduction total (payroll) or premium (carrier)
+        self.has_amount = has_amount
+        self.birth_dates = birth_dates or [''] * len(keys)  # YYYYMMDD, for matching rows without IDs
+        self.line_items = line_items or LineItems([], [], [], [], [], [])
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict], file_type: str, fallback_base: int,
+                  schema: Optional[ColumnSchema] = None) -> 'SourceTable':
+        """Build the table in one pass over the parsed rows"""
+        keys, ids, names, amounts, birth_dates = [], [], [], [], []
+        item_rows, item_lines, item_plans, item_amounts, item_from_plan = [], [], [], [], []
+        plan_codes: Dict[str, int] = {}
+        plan_lines: Dict[str, int] = {}  # carrier plan code -> line code
+        item_columns = None
+        for idx, row in enumerate(rows):
+            if schema is None:
+                schema = resolve_schema(list(row.keys()), file_type)
+            if item_columns is None:
+                item_columns = _item_columns(schema, schema.premium_columns if file_type == 'carrier'
+                                             else schema.deduction_columns)
+            id_column = schema.id_column
+            raw_id = row[id_column] if id_column else ''
+            ids.append(raw_id or f"EMP{fallback_base+idx:04d}")
+            keys.append(member_id_key(raw_id))
+            names.append(schema.name_for(row))
+            birth_column = schema.dates.get('birth_date')
+            birth_dates.append(normalize_dob(row[birth_column]) if birth_column else '')
+
+            if file_type == 'payroll':
+                # Payroll deductions are summed across every deduction-like column
+                total = 0.0
+                # and each non-zero one is also an item for its line of coverage
+                for key, line_code, plan_column, line in item_columns:
+                    amount = parse_amount(row[key])
+                    if amount is not None:
+                        total += amount
+                        if amount:
+                            plan = row[plan_column] if plan_column else _line_plan(row, schema.plan, line)
+                            item_rows.append(idx)
+                            item_lines.append(line_code)
+                            item_plans.append(plan_codes.setdefault(plan, len(plan_codes)))
+                            item_amounts.append(amount)
+                            item_from_plan.append(False)
+                amounts.append(total if total > 0 else np.nan)
+            elif file_type == 'carrier':
+                # Carrier premium is the first numeric premium-like column
+                premium = None
+                for key in schema.premium_columns:
+                    amount = parse_amount(row[key])
+                    if amount is not None:
+                        premium = amount
+                        break
+                amounts.append(np.nan if premium is None else premium)
+
+                # Itemized by line when the file has per-line premium columns, otherwise the
+                # premium belongs to whatever line the row's plan code names
+                itemized = False
+                for key, line_code, plan_column, line in item_columns:
+                    if not line_code:
+                        continue
+                    amount = parse_amount(row[key])
+                    if amount:
+                        plan = row[plan_column] if plan_column else _line_plan(row, schema.plan, line)
+                        item_rows.append(idx)
+                        item_lines.append(line_code)
+                        item_plans.append(plan_codes.setdefault(plan, len(plan_codes)))
+                        item_amounts.append(amount)
+                        item_from_plan.append(False)
+                        itemized = True
+                if not itemized and premium:
+                    plan = row[schema.plan] if schema.plan else ''
+                    line_code = plan_lines.get(plan)
+                    if line_code is None:
+                        line = coverage_line(plan)
+                        if line in schema.line_columns.values():
+                            line = ''  # that line's own column was blank, so this amount is a total
+                        line_code = plan_lines[plan] = LINE_NAMES.index(line)
+                    item_rows.append(idx)
+                    item_lines.append(line_code)
+                    item_plans.append(plan_codes.setdefault(plan, len(plan_codes)))
+                    item_amounts.append(premium)
+                    item_from_plan.append(True)
+            else:
+                amounts.append(np.nan)
+
+        amount_array = np.array(amounts, dtype=np.float64)
+        line_items = LineItems(item_rows, item_lines, item_plans, item_amounts, item_from_plan, list(plan_codes))
+        return cls(file_type, keys, ids, names, np.nan_to_num(amount_array), ~np.isnan(amount_array), birth_dates,
+                   line_items)
+
+    def row_signatures(self) -> List[str]:
+        """Per-row text of the identity and amount columns, for change detection"""
+        return [f"{emp_id}|{name}|{amount!r}|{has}|{items}" for emp_id, name, amount, has, items
+                in zip(self.ids.tolist(), self.names.tolist(), self.amounts.tolist(), self.has_amount.tolist(),
+                       self.line_items.by_row(len(self)))]
+
+    def amounts_for(self, positions: List[int], rng: np.random.Generator) -> np.ndarray:
+        """Amounts at the given rows, with missing values filled from the fallback range"""
+        positions = np.asarray(positions, dtype=np.intp)
+        values = self.amounts[positions]
+        missing = ~self.has_amount[positions]
+        if missing.any():
+            values[missing] = rng.uniform(*FALLBACK_AMOUNT_RANGE, int(missing.sum()))
+        return values
@@ -0,0 +1,46 @@
+import csv
+import io
+import json
+from typing import Any, Iterable, Iterator
+
+from src.models.reconciliation import ReconciliationError
+
+# Column headings used by the CSV export (matching the browser export)
+CSV_HEADERS = ['Employee ID', 'Employee Name', 'Error Type', 'Description', 'Amount', 'Priority', 'Status']
+ROWS_PER_CHUNK = 500
+
+# Exports take plain column rows (see ReconciliationError.FIELDS), not ORM objects
+
+
+def iter_csv(errors: Iterable[Any]) -> Iterator[str]:
+    """Yield CSV text in chunks as error rows are read"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADERS)
+    for count, error in enumerate(errors, 1):
+        writer.writerow([
+            error.employee_id,
+            error.employee_name,
+            error.error_type,
+            error.description,
+            f"${error.amount or 0:.2f}",
+            error.priority,
+            error.status
+        ])
+        if count % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson(errors: Iterable[Any]) -> Iterator[str]:
+    """Yield one JSON document per line, in chunks"""
+    lines = []
+    for error in errors:
+        lines.append(json.dumps({field: getattr(error, field) for field in ReconciliationError.FIELDS}))
+        if len(lines) == ROWS_PER_CHUNK:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
@@ -1,64 +1,276 @@
 import csv
+import hashlib
 import io
+import multiprocessing
+import os
 import random
-from typing import List, Dict, Any, Tuple
+import shutil
+import tempfile
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, Optional, Iterator
+
+import numpy as np
+
+from src.columnar import SourceTable
+from src.identity import IdentityIndex
+from src.join_engine import three_way_join, JoinResult
+from src.line_reconciliation import (LineComparison, line_discrepancy, missing_coverage, missing_deduction,
+                                     plan_discrepancy, row_members, total_discrepancy)
+from src.mapped_csv import MAPPED_INGEST_MB, MappedCSV, upload_size
+from src.metrics import registry, timed
+from src.records import Discrepancy, Employee
+from src.schema_resolver import LINE_NAMES, ColumnSchema, resolve_schema
+from src.x12 import X12_SNIFF_BYTES, iter_834_rows, looks_like_x12
+
+# Upload field -> file type, in processing order
+SOURCE_FIELDS = [('benadmin_file', 'benadmin'), ('carrier_file', 'carrier'), ('payroll_file', 'payroll')]
+# Base number for generated IDs when a row has no identifier
+FALLBACK_ID_BASES = {'payroll': 1000, 'benadmin': 2000, 'carrier': 3000}
+
+_parse_pools: Dict[Tuple[str, int], Executor] = {}
+_parse_pools_lock = threading.Lock()
+
+
+def get_parse_pool(kind: str, max_workers: int) -> Executor:
+    """Shared thread or process pool used to parse uploads concurrently"""
+    with _parse_pools_lock:
+        pool = _parse_pools.get((kind, max_workers))
+        if pool is None:
+            if kind == 'process':
+                pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+            elif kind == 'thread':
+                pool = ThreadPoolExecutor(max_workers=max_workers)
+            else:
+                raise ValueError(f"Unknown parse pool '{kind}', expected 'thread' or 'process'")
+            _parse_pools[(kind, max_workers)] = pool
+        return pool
+
+
+def parse_source(source, file_type: str, streaming: bool = False,
+                 mapped: Optional[bool] = None) -> Tuple[List[Dict], List[Employee], SourceTable]:
+    """Read, extract and tabulate one file (a file object or a path for process pools)"""
+    processor = FileProcessor()
+    read = processor.reader_for(source, streaming, mapped)
+    if isinstance(source, str) and read != processor.read_mapped_file:
+        with open(source, 'rb') as handle:
+            rows = read(handle, file_type)
+    else:
+        # A mapped path travels back to the pool's caller as the path and its row index
+        rows = read(source, file_type)
+    
+    setattr(processor, f"{file_type}_data", rows)
+    employees = getattr(processor, f"extract_from_{file_type}")()
+    table = SourceTable.from_rows(rows, file_type, FALLBACK_ID_BASES[file_type])
+    registry.flush()  # pool workers publish their own stage timings
+    return rows, employees, table
+
+
+def read_failure(file_type: str, error: Exception) -> ValueError:
+    """The error an unreadable upload fails its run with (pool workers' output is lost, so no print)"""
+    registry.inc('benefitspecs_parse_failures_total', file_type=file_type)
+    return ValueError(f"Could not read the {file_type} file: {str(error)}")
+
+
+def rows_at(data, positions: Optional[List[int]] = None) -> Iterator[Tuple[int, Dict]]:
+    """(position, row) at each of the ascending positions (every row when None) of a parsed file"""
+    if positions is None:
+        positions = range(len(data))
+    if isinstance(data, MappedCSV):
+        # Decoding row by row re-creates a CSV reader per row; blocks are several times faster
+        return zip(positions, data.rows_at(positions))
+    return ((idx, data[idx]) for idx in positions)
+
+
+def spool_to_path(file_obj) -> Tuple[str, bool]:
+    """Path a worker process can open for an upload, and whether it is a temp copy"""
+    stream = getattr(file_obj, 'stream', file_obj)
+    name = getattr(stream, 'name', None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return name, False
+    
+    file_obj.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.csv') as spooled:
+        shutil.copyfileobj(stream, spooled)
+    return spooled.name, True
 
 class FileProcessor:
     """Process uploaded files and generate reconciliation errors based on actual data"""
     
-    def __init__(self):
+    def __init__(self, seed: Optional[int] = None):
         self.benadmin_data = None
         self.carrier_data = None
         self.payroll_data = None
+        self.tables = {}
+        self.extracted = {}
+        self.errors_by_key = defaultdict(list)
+        self.member_hashes = None
+        self.delta = None
+        self.identity = None
+        self.join = None
+        # A seed makes the random fallbacks and sample errors reproducible
+        self.rng = random.Random(seed) if seed is not None else random
+        
+    def iter_csv_rows(self, file_obj, file_type: str) -> Iterator[Dict]:
+        """Yield cleaned rows from a CSV (or X12 834) upload, decoding the stream incrementally"""
+        # Reset file pointer to beginning
+        file_obj.seek(0)
+        
+        # Werkzeug's FileStorage wraps the spooled upload in .stream
+        stream = getattr(file_obj, 'stream', file_obj)
+        head = stream.read(X12_SNIFF_BYTES)
+        stream.seek(0)
+        is_x12 = looks_like_x12(head.encode('latin-1', 'replace') if isinstance(head, str) else head)
+        wrapper = None
+        if isinstance(stream, io.TextIOBase):
+            text = stream
+        else:
+            # 834s are ASCII; latin-1 never fails on stray high bytes in names
+            wrapper = text = io.TextIOWrapper(stream, encoding='latin-1' if is_x12 else 'utf-8-sig', newline='')
         
-    def read_csv_file(self, file_obj, file_type: str) -> List[Dict]:
-        """Read CSV file and return list of dictionaries"""
+        row_count = 0
         try:
-            # Reset file pointer to beginning
-            file_obj.seek(0)
-            
-            # Read file content
-            content = file_obj.read()
-            
-            # Decode if bytes
-            if isinstance(content, bytes):
-                content = content.decode('utf-8')
+            if is_x12:
+                for row in iter_834_rows(text):
+                    row_count += 1
+                    yield row
+                return
             
-            # Parse CSV
-            csv_reader = csv.DictReader(io.StringIO(content))
-            data = []
-            for row in csv_reader:
-                # Clean up keys and values
-                clean_row = {}
-                for key, value in row.items():
-                    clean_key = key.strip().lower() if key else ''
-                    clean_value = value.strip() if value else ''
-                    clean_row[clean_key] = clean_value
-                data.append(clean_row)
-            
-            return data
+            csv_reader = csv.reader(text)
+            header = next(csv_reader, None)
+            if header is None:
+                return
             
+            # Clean up keys once, then values per row
+            keys = [key.strip().lower() if key else '' for key in header]
+            width = len(keys)
+            for values in csv_reader:
+                if not values:
+                    continue
+                if len(values) < width:
+                    values = values + [''] * (width - len(values))
+                row_count += 1
+                yield {key: value.strip() for key, value in zip(keys, values)}
+        finally:
+            registry.inc('benefitspecs_rows_processed_total', row_count, file_type=file_type)
+            try:
+                registry.inc('benefitspecs_bytes_ingested_total', stream.tell(), file_type=file_type)
+            except (OSError, ValueError, AttributeError):
+                pass  # unseekable stream
+            # Don't let the wrapper close the caller's upload stream
+            if wrapper is not None:
+                wrapper.detach()
+    
+    @timed('read_csv_file')
+    def read_csv_file(self, file_obj, file_type: str) -> List[Dict]:
+        """Read CSV file and return list of dictionaries"""
+        try:
+            return list(self.iter_csv_rows(file_obj, file_type))
         except Exception as e:
-            print(f"Error reading {file_type} file: {str(e)}")
-            return []
+            raise read_failure(file_type, e) from e
     
-    def process_files(self, files: Dict) -> Dict[str, Any]:
-        """Process uploaded files and generate reconciliation analysis"""
+    @timed('stream_csv_file')
+    def stream_csv_file(self, file_obj, file_type: str) -> List[Dict]:
+        """Stream a CSV file, keeping only the columns the reconciliation uses"""
+        rows = []
+        try:
+            columns = None
+            for row in self.iter_csv_rows(file_obj, file_type):
+                if columns is None:
+                    columns = resolve_schema(list(row.keys()), file_type).columns
+                rows.append({key: row[key] for key in columns})
+            return rows
+        except Exception as e:
+            raise read_failure(file_type, e) from e
+    
+    @timed('read_mapped_file')
+    def read_mapped_file(self, file_obj, file_type: str):
+        """Memory-map a CSV upload (or path) and index its rows, parsing none of them yet
         
-        # Read uploaded files
-        if 'benadmin_file' in files and files['benadmin_file'].filename:
-            self.benadmin_data = self.read_csv_file(files['benadmin_file'], 'benadmin')
-            
-        if 'carrier_file' in files and files['carrier_file'].filename:
-            self.carrier_data = self.read_csv_file(files['carrier_file'], 'carrier')
-            
-        if 'payroll_file' in files and files['payroll_file'].filename:
-            self.payroll_data = self.read_csv_file(files['payroll_file'], 'payroll')
+        X12 and empty uploads have no rows to index and are streamed instead.
+        """
+        try:
+            mapped = MappedCSV.open(file_obj, file_type)
+        except Exception as e:
+            raise read_failure(file_type, e) from e
+        if mapped is None:
+            if isinstance(file_obj, str):
+                with open(file_obj, 'rb') as handle:
+                    return self.stream_csv_file(handle, file_type)
+            return self.stream_csv_file(file_obj, file_type)
+        registry.inc('benefitspecs_rows_processed_total', len(mapped), file_type=file_type)
+        registry.inc('benefitspecs_bytes_ingested_total', mapped.size, file_type=file_type)
+        return mapped
+    
+    def reader_for(self, file_obj, streaming: bool = False, mapped: Optional[bool] = None):
+        """The read method for an upload: mapped=None maps uploads of MAPPED_INGEST_MB or more, if set"""
+        if mapped or (mapped is None and MAPPED_INGEST_MB
+                      and upload_size(file_obj) >= MAPPED_INGEST_MB * 2 ** 20):
+            return self.read_mapped_file
+        return self.stream_csv_file if streaming else self.read_csv_file
+    
+    @timed('process_files')
+    def process_files(self, files: Dict, streaming: bool = False, parallel: Optional[str] = None,
+                      max_workers: int = 3, previous_snapshot: Optional[Dict] = None,
+                      snapshot: bool = False, mapped: Optional[bool] = None) -> Dict[str, Any]:
+        """Process uploaded files and generate reconciliation analysis
+        
+        parallel='thread' or 'process' parses and extracts the files concurrently.
+        previous_snapshot (member key -> (row hash, errors)) switches to delta mode;
+        snapshot=True adds this run's member snapshot to the result.
+        mapped=True memory-maps every CSV upload instead of holding its rows, False
+        never does, and None (the default) maps those of MAPPED_INGEST_MB or more,
+        when that is set.
+        """
+        self.tables = {}
+        self.extracted = {}
+        self.errors_by_key = defaultdict(list)
+        self.member_hashes = None
+        self.delta = None
+        self.identity = None
+        self.join = None
+        sources = [(files[field], file_type) for field, file_type in SOURCE_FIELDS
+                   if field in files and files[field].filename]
+        
+        if parallel:
+            self.parse_parallel(sources, streaming, parallel, max_workers, mapped)
+        else:
+            # Read uploaded files
+            for file_obj, file_type in sources:
+                read = self.reader_for(file_obj, streaming, mapped)
+                setattr(self, f"{file_type}_data", read(file_obj, file_type))
         
         # Generate analysis based on actual file data
-        return self.generate_reconciliation_analysis()
+        return self.generate_reconciliation_analysis(previous_snapshot, snapshot)
     
-    def generate_reconciliation_analysis(self) -> Dict[str, Any]:
+    def parse_parallel(self, sources: List[Tuple[Any, str]], streaming: bool, parallel: str, max_workers: int,
+                       mapped: Optional[bool] = None):
+        """Parse, extract and tabulate each file on its own pool worker"""
+        pool = get_parse_pool(parallel, max_workers)
+        temp_paths = []
+        try:
+            futures = []
+            for file_obj, file_type in sources:
+                source = file_obj
+                if parallel == 'process':
+                    # Worker processes can't share the upload stream, so hand them a path
+                    source, is_temp = spool_to_path(file_obj)
+                    if is_temp:
+                        temp_paths.append(source)
+                futures.append((file_type, pool.submit(parse_source, source, file_type, streaming, mapped)))
+            
+            for file_type, future in futures:
+                rows, employees, table = future.result()
+                setattr(self, f"{file_type}_data", rows)
+                self.extracted[file_type] = employees
+                self.tables[file_type] = table
+        finally:
+            for path in temp_paths:
+                os.remove(path)
+    
+    def generate_reconciliation_analysis(self, previous_snapshot: Optional[Dict] = None,
+                                         snapshot: bool = False) -> Dict[str, Any]:
         """Generate reconciliation analysis based on actual file data"""
         
         # Get employee data from available files
@@ -71,13 +283,13 @@ class FileProcessor:
             employees = self.generate_sample_employees(15)
         
         # Generate realistic errors based on actual data
-        errors = self.generate_realistic_errors(employees)
+        errors = self.generate_realistic_errors(employees, previous_snapshot)
         
         # Calculate metrics
         errors_found = len(errors)
         error_rate = round((errors_found / total_employees) * 100) if total_employees > 0 else 0
         
-        return {
+        analysis = {
             'total_employees': total_employees,
             'errors_found': errors_found,
             'error_rate': error_rate,
@@ -85,203 +297,150 @@ class FileProcessor:
             'files_processed': self.count_files_processed(),
             'errors': errors
         }
+        for error_type, count in Counter(error.error_type for error in errors).items():
+            registry.inc('benefitspecs_reconciliation_errors_total', count, error_type=error_type)
+        if self.delta is not None:
+            analysis['delta'] = self.delta
+        if snapshot and self.payroll_data and self.carrier_data:
+            analysis['snapshot'] = self.build_snapshot()
+        return analysis
     
-    def extract_employee_data(self) -> List[Dict]:
-        """Extract employee information from uploaded files"""
+    @timed('extract_employee_data')
+    def extract_employee_data(self) -> List[Employee]:
+        """Extract one employee per resolved member from the uploaded files"""
+        identity = self.resolve_identities()
         employees = []
+        seen = set()
         
-        # Try to extract from payroll file first (most likely to have employee list)
-        if self.payroll_data and len(self.payroll_data) > 0:
-            employees.extend(self.extract_from_payroll())
-        
-        # Supplement with benadmin data if available
-        if self.benadmin_data and len(self.benadmin_data) > 0:
-            employees.extend(self.extract_from_benadmin())
-        
-        # Supplement with carrier data if available
-        if self.carrier_data and len(self.carrier_data) > 0:
-            employees.extend(self.extract_from_carrier())
-        
-        # Remove duplicates based on employee ID or name
-        unique_employees = []
-        seen_ids = set()
-        seen_names = set()
-        
-        for emp in employees:
-            emp_id = emp.get('employee_id', '')
-            emp_name = emp.get('name', '')
+        # Payroll first (most likely to have the employee list), then benadmin and carrier
+        # supplement it with members payroll doesn't list
+        for file_type in ('payroll', 'benadmin', 'carrier'):
+            data = getattr(self, f"{file_type}_data")
+            if not data:
+                continue
+            
+            # Only each member's first row is extracted, so duplicates never become records
+            member_keys = identity.member_keys[file_type]
+            positions = []
+            for position, key in enumerate(member_keys):
+                if key not in seen:
+                    seen.add(key)
+                    positions.append(position)
             
-            if emp_id and emp_id not in seen_ids:
-                unique_employees.append(emp)
-                seen_ids.add(emp_id)
-            elif emp_name and emp_name not in seen_names and not emp_id:
-                unique_employees.append(emp)
-                seen_names.add(emp_name)
-        
-        return unique_employees  # Return all unique employees, no artificial limit
+            # (parallel parsing has already extracted every row of each file)
+            extracted = self.extracted.get(file_type)
+            if extracted is not None:
+                selected = [extracted[position] for position in positions]
+            else:
+                selected = getattr(self, f"extract_from_{file_type}")(positions)
+            for employee, position in zip(selected, positions):
+                employee.member_key = member_keys[position]
+            employees.extend(selected)
+        
+        return employees  # Return all unique employees, no artificial limit
     
-    def extract_from_payroll(self) -> List[Dict]:
-        """Extract employee data from payroll file"""
+    def schema_for(self, data: Optional[List[Dict]], file_type: str) -> Optional[ColumnSchema]:
+        """Resolve column roles for a parsed file from its header"""
+        if not data:
+            return None
+        return resolve_schema(list(data[0].keys()), file_type)
+    
+    def extract_from_payroll(self, positions: Optional[List[int]] = None) -> List[Employee]:
+        """Extract employee data from payroll file (only the rows at positions, when given)"""
         employees = []
         
         if not self.payroll_data:
             return employees
-            
-        # Common payroll column patterns
-        for idx, row in enumerate(self.payroll_data):
-            emp = {}
-            
-            # Extract employee ID - prioritize SSN columns
-            id_keys = [k for k in row.keys() if any(x in k for x in ['ssn', 'social', 'security', 'id', 'emp', 'employee', 'number'])]
-            if id_keys:
-                # Prioritize SSN-related columns first
-                ssn_keys = [k for k in id_keys if any(x in k for x in ['ssn', 'social', 'security'])]
-                if ssn_keys:
-                    emp['employee_id'] = row[ssn_keys[0]] or f"EMP{1000+idx:04d}"
-                else:
-                    emp['employee_id'] = row[id_keys[0]] or f"EMP{1000+idx:04d}"
-            else:
-                emp['employee_id'] = f"EMP{1000+idx:04d}"
-            
-            # Extract name
-            name_keys = [k for k in row.keys() if any(x in k for x in ['name', 'first', 'last', 'full'])]
-            if len(name_keys) >= 2:  # First and last name columns
-                first = row[name_keys[0]] or ""
-                last = row[name_keys[1]] or ""
-                emp['name'] = f"{first} {last}".strip()
-            elif name_keys:  # Single name column
-                emp['name'] = row[name_keys[0]] or f"Employee {idx+1}"
-            else:
-                emp['name'] = f"Employee {idx+1}"
-            
+        
+        # Column roles are resolved once per file, not per row
+        schema = self.schema_for(self.payroll_data, 'payroll')
+        id_column = schema.id_column
+        salary_column = schema.salary
+        detail_columns = schema.deduction_detail_columns
+        
+        for idx, row in rows_at(self.payroll_data, positions):
             # Extract salary/wage info
-            salary_keys = [k for k in row.keys() if any(x in k for x in ['salary', 'wage', 'pay', 'gross', 'amount'])]
-            if salary_keys:
+            salary = None
+            if salary_column:
                 try:
-                    emp['salary'] = float(row[salary_keys[0]] or 0)
+                    salary = float(row[salary_column] or 0)
                 except (ValueError, TypeError):
-                    emp['salary'] = 0
+                    salary = 0
             
             # Extract deduction info
-            deduction_keys = [k for k in row.keys() if any(x in k for x in ['deduction', 'benefit', 'insurance', 'premium'])]
-            emp['deductions'] = []
-            for key in deduction_keys:
+            deductions = []
+            for key in detail_columns:
                 try:
                     amount = float(row[key] or 0)
                     if amount > 0:
-                        emp['deductions'].append({
-                            'type': key,
-                            'amount': amount
-                        })
+                        deductions.append((key, amount))
                 except (ValueError, TypeError):
                     continue
             
-            employees.append(emp)
+            employees.append(Employee(
+                (row[id_column] if id_column else '') or f"EMP{1000+idx:04d}",
+                schema.name_for(row) or f"Employee {idx+1}",
+                salary,
+                tuple(deductions)
+            ))
         
         return employees
     
-    def extract_from_benadmin(self) -> List[Dict]:
-        """Extract employee data from benadmin file"""
+    def extract_from_source(self, data: Optional[List[Dict]], file_type: str, fallback_base: int,
+                            positions: Optional[List[int]] = None) -> List[Employee]:
+        """Extract employee ID and name from a benadmin or carrier file (only the rows at positions, when given)"""
         employees = []
         
-        if not self.benadmin_data:
+        if not data:
             return employees
-            
-        for idx, row in enumerate(self.benadmin_data):
-            keys = list(row.keys())
-            emp = {}
-            
-            # Extract employee ID - prioritize SSN columns
-            id_keys = [k for k in keys if any(x in k for x in ['ssn', 'social', 'security', 'id', 'emp', 'employee', 'number'])]
-            if id_keys:
-                # Prioritize SSN-related columns first
-                ssn_keys = [k for k in id_keys if any(x in k for x in ['ssn', 'social', 'security'])]
-                if ssn_keys:
-                    emp['employee_id'] = row[ssn_keys[0]] or f"EMP{2000+idx:04d}"
-                else:
-                    emp['employee_id'] = row[id_keys[0]] or f"EMP{2000+idx:04d}"
-            else:
-                emp['employee_id'] = f"EMP{2000+idx:04d}"
-            
-            # Extract name
-            name_keys = [k for k in keys if any(x in k for x in ['name', 'first', 'last', 'full'])]
-            if len(name_keys) >= 2:  # First and last name columns
-                first = row[name_keys[0]] or ""
-                last = row[name_keys[1]] or ""
-                emp['name'] = f"{first} {last}".strip()
-            elif name_keys:  # Single name column
-                emp['name'] = row[name_keys[0]] or f"Employee {idx+1}"
-            else:
-                emp['name'] = f"Employee {idx+1}"
-                
-            emp['source'] = 'benadmin'
-            employees.append(emp)
         
-        return employees
-    
-    def extract_from_carrier(self) -> List[Dict]:
-        """Extract employee data from carrier file"""
-        employees = []
+        schema = self.schema_for(data, file_type)
+        id_column = schema.id_column
         
-        if not self.carrier_data:
-            return employees
-            
-        for idx, row in enumerate(self.carrier_data):
-            keys = list(row.keys())
-            emp = {}
-            
-            # Extract employee ID - prioritize SSN columns
-            id_keys = [k for k in keys if any(x in k for x in ['ssn', 'social', 'security', 'id', 'emp', 'employee', 'number', 'member'])]
-            if id_keys:
-                # Prioritize SSN-related columns first
-                ssn_keys = [k for k in id_keys if any(x in k for x in ['ssn', 'social', 'security'])]
-                if ssn_keys:
-                    emp['employee_id'] = row[ssn_keys[0]] or f"EMP{3000+idx:04d}"
-                else:
-                    emp['employee_id'] = row[id_keys[0]] or f"EMP{3000+idx:04d}"
-            else:
-                emp['employee_id'] = f"EMP{3000+idx:04d}"
-            
-            # Extract name
-            name_keys = [k for k in keys if any(x in k for x in ['name', 'first', 'last', 'full'])]
-            if len(name_keys) >= 2:  # First and last name columns
-                first = row[name_keys[0]] or ""
-                last = row[name_keys[1]] or ""
-                emp['name'] = f"{first} {last}".strip()
-            elif name_keys:  # Single name column
-                emp['name'] = row[name_keys[0]] or f"Employee {idx+1}"
-            else:
-                emp['name'] = f"Employee {idx+1}"
-                
-            emp['source'] = 'carrier'
-            employees.append(emp)
+        for idx, row in rows_at(data, positions):
+            employees.append(Employee(
+                (row[id_column] if id_column else '') or f"EMP{fallback_base+idx:04d}",
+                schema.name_for(row) or f"Employee {idx+1}",
+                source=file_type
+            ))
         
         return employees
     
-    def generate_sample_employees(self, count: int) -> List[Dict]:
+    def extract_from_benadmin(self, positions: Optional[List[int]] = None) -> List[Employee]:
+        """Extract employee data from benadmin file"""
+        return self.extract_from_source(self.benadmin_data, 'benadmin', 2000, positions)
+    
+    def extract_from_carrier(self, positions: Optional[List[int]] = None) -> List[Employee]:
+        """Extract employee data from carrier file"""
+        return self.extract_from_source(self.carrier_data, 'carrier', 3000, positions)
+    
+    def generate_sample_employees(self, count: int) -> List[Employee]:
         """Generate sample employee data when no files can be processed"""
         first_names = ['John', 'Sarah', 'Michael', 'Jennifer', 'David', 'Lisa', 'Robert', 'Mary', 'James', 'Patricia']
         last_names = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez']
         
         employees = []
         for i in range(count):
-            emp = {
-                'employee_id': f"EMP{1000+i:04d}",
-                'name': f"{random.choice(first_names)} {random.choice(last_names)}",
-                'salary': random.randint(35000, 85000),
-                'deductions': []
-            }
-            employees.append(emp)
+            employees.append(Employee(
+                f"EMP{1000+i:04d}",
+                f"{self.rng.choice(first_names)} {self.rng.choice(last_names)}",
+                self.rng.randint(35000, 85000)
+            ))
         
         return employees
     
-    def generate_realistic_errors(self, employees: List[Dict]) -> List[Dict]:
+    @timed('generate_realistic_errors')
+    def generate_realistic_errors(self, employees: List[Employee], previous_snapshot: Optional[Dict] = None) -> List[Discrepancy]:
         """Generate realistic reconciliation errors based on employee data"""
         errors = []
         
         # Generate errors based on actual data comparison when possible
         if self.payroll_data and self.carrier_data and len(self.payroll_data) > 0 and len(self.carrier_data) > 0:
-            errors.extend(self.compare_payroll_carrier_data(employees))
+            if previous_snapshot is not None:
+                errors.extend(self.compare_changed_members(employees, previous_snapshot))
+            else:
+                errors.extend(self.compare_payroll_carrier_data(employees))
+            self.attach_sources()
         
         # Only generate a small number of additional errors to supplement real data
         # Focus primarily on real data comparison results
@@ -292,88 +451,185 @@ class FileProcessor:
         
         return errors
     
-    def compare_payroll_carrier_data(self, employees: List[Dict]) -> List[Dict]:
-        """Compare payroll and carrier data to find actual discrepancies"""
+    @timed('attach_sources')
+    def attach_sources(self):
+        """Point each compared member's errors at every row listing the member, per file
+        
+        Byte offsets come from the row index of mapped uploads; other uploads get
+        theirs from source_rows.locate_sources once the run is over.
+        """
+        if not self.errors_by_key:
+            return
+        identity = self.resolve_identities()
+        sources = defaultdict(list)
+        for file_type in ('payroll', 'carrier', 'benadmin'):
+            data = getattr(self, f"{file_type}_data")
+            offsets = data.offsets if isinstance(data, MappedCSV) else None
+            for row, key in enumerate(identity.member_keys.get(file_type, [])):
+                if key in self.errors_by_key:
+                    sources[key].append((file_type, row, offsets[row] if offsets is not None else None))
+        for key, errors in self.errors_by_key.items():
+            refs = tuple(sources[key])
+            for error in errors:
+                error.sources = refs
+    
+    @timed('build_tables')
+    def build_tables(self) -> Dict[str, SourceTable]:
+        """Build the columnar form of each parsed file once per upload"""
+        for file_type, base in FALLBACK_ID_BASES.items():
+            if file_type not in self.tables:
+                rows = getattr(self, f"{file_type}_data") or []
+                self.tables[file_type] = SourceTable.from_rows(rows, file_type, base)
+        return self.tables
+    
+    @timed('resolve_identities')
+    def resolve_identities(self) -> IdentityIndex:
+        """Member key for every row of every file (once per upload)"""
+        if self.identity is None:
+            tables = self.build_tables()
+            self.identity = IdentityIndex([tables['payroll'], tables['carrier'], tables['benadmin']])
+        return self.identity
+    
+    @timed('join_sources')
+    def join_sources(self) -> JoinResult:
+        """Join payroll, carrier and benadmin row positions on resolved member keys (once per upload)"""
+        if self.join is None:
+            identity = self.resolve_identities()
+            self.join = three_way_join(identity.member_index('payroll'), identity.member_index('carrier'),
+                                       identity.member_index('benadmin'))
+        return self.join
+    
+    def compute_member_hashes(self, join: JoinResult) -> Dict[str, str]:
+        """Hash of each member's payroll / carrier / benadmin state
+        
+        Covers every row resolving to the member, not just the first one the join
+        keeps, since line comparison looks at all of them.
+        """
+        tables = self.build_tables()
+        identity = self.resolve_identities()
+        signatures = defaultdict(lambda: ([], [], []))
+        for position, file_type in enumerate(('payroll', 'carrier', 'benadmin')):
+            row_signatures = tables[file_type].row_signatures()
+            for row, key in enumerate(identity.member_keys.get(file_type, [])):
+                signatures[key][position].append(row_signatures[row])
+        hashes = {}
+        for bucket in (join.matched, join.left_only, join.right_only, join.benadmin_only):
+            for key, _, _, _ in bucket:
+                # Sorted, so reordering a file's rows is not a change
+                state = '\x1f'.join([key] + ['\x1e'.join(sorted(rows)) or '-' for rows in signatures[key]])
+                hashes[key] = hashlib.blake2b(state.encode('utf-8'), digest_size=16).hexdigest()
+        return hashes
+    
+    @timed('compare_changed_members')
+    def compare_changed_members(self, employees: List[Employee], previous_snapshot: Dict) -> List[Discrepancy]:
+        """Delta mode: compare only added or changed members, carrying forward the rest"""
+        self.member_hashes = self.compute_member_hashes(self.join_sources())
+        changed = {key for key, row_hash in self.member_hashes.items()
+                   if key not in previous_snapshot or previous_snapshot[key][0] != row_hash}
+        
+        errors = []
+        for key in self.member_hashes:
+            if key not in changed:
+                carried = previous_snapshot[key][1]
+                if carried:
+                    self.errors_by_key[key] = list(carried)
+                    errors.extend(carried)
+        errors.extend(self.compare_payroll_carrier_data(employees, keys=changed))
+        
+        self.delta = {
+            'added': sum(1 for key in changed if key not in previous_snapshot),
+            'changed': sum(1 for key in changed if key in previous_snapshot),
+            'removed': sum(1 for key in previous_snapshot if key not in self.member_hashes),
+            'unchanged': len(self.member_hashes) - len(changed)
+        }
+        return errors
+    
+    def build_snapshot(self) -> Dict[str, Tuple[str, List[Discrepancy]]]:
+        """Member key -> (row hash, discrepancies) for the next period's delta run"""
+        if self.member_hashes is None:
+            self.member_hashes = self.compute_member_hashes(self.join_sources())
+        return {key: (row_hash, self.errors_by_key.get(key, [])) for key, row_hash in self.member_hashes.items()}
+    
+    @timed('compare_payroll_carrier_data')
+    def compare_payroll_carrier_data(self, employees: List[Employee], keys: Optional[set] = None) -> List[Discrepancy]:
+        """Compare payroll and carrier data to find actual discrepancies
+        
+        keys limits the comparison to those normalized member keys.
+        """
         errors = []
         
-        # Create lookup dictionaries for easier comparison
-        payroll_lookup = {}
-        carrier_lookup = {}
-        
-        # Build payroll lookup
-        if self.payroll_data:
-            for idx, row in enumerate(self.payroll_data):
-                keys = list(row.keys())
-                emp_id = row[keys[0]] if keys and row[keys[0]] else f"EMP{1000+idx:04d}"
-                payroll_lookup[emp_id] = row
-        
-        # Build carrier lookup  
-        if self.carrier_data:
-            for idx, row in enumerate(self.carrier_data):
-                keys = list(row.keys())
-                emp_id = row[keys[0]] if keys and row[keys[0]] else f"EMP{1000+idx:04d}"
-                carrier_lookup[emp_id] = row
-        
-        # Compare data and find discrepancies
-        all_emp_ids = set(payroll_lookup.keys()) | set(carrier_lookup.keys())
-        
-        for emp_id in all_emp_ids:
-            employee = next((emp for emp in employees if emp['employee_id'] == emp_id), None)
+        # Employees carry the member key the join uses
+        employee_index = {emp.member_key: emp for emp in employees}
+        tables = self.build_tables()
+        payroll, carrier = tables['payroll'], tables['carrier']
+        join = self.join_sources()
+        left_only, right_only, matched = join.left_only, join.right_only, join.matched
+        if keys is not None:
+            left_only = [entry for entry in left_only if entry[0] in keys]
+            right_only = [entry for entry in right_only if entry[0] in keys]
+            matched = [entry for entry in matched if entry[0] in keys]
+        rng = np.random.default_rng(self.rng.getrandbits(64))
+        
+        def add_error(key, error):
+            errors.append(error)
+            self.errors_by_key[key].append(error)
+        
+        # Check for missing coverage
+        amounts = payroll.amounts_for([pos for _, pos, _, _ in left_only], rng)
+        for (key, _, _, _), amount in zip(left_only, amounts):
+            employee = employee_index.get(key)
+            if employee:
+                add_error(key, missing_coverage(employee.employee_id, employee.name, float(amount)))
+        
+        # Check for payroll deduction error
+        amounts = carrier.amounts_for([pos for _, _, pos, _ in right_only], rng)
+        for (key, _, _, _), amount in zip(right_only, amounts):
+            employee = employee_index.get(key)
+            if employee:
+                add_error(key, missing_deduction(employee.employee_id, employee.name, float(amount)))
+        
+        # Check for premium mismatches line by line, over every row of each matched member
+        identity = self.resolve_identities()
+        lines = LineComparison(payroll.line_items, carrier.line_items,
+                               row_members(identity.first_rows['payroll'], [pos for _, pos, _, _ in matched]),
+                               row_members(identity.first_rows['carrier'], [pos for _, _, pos, _ in matched]),
+                               len(matched))
+        line_mismatches = lines.line_mismatches()
+        total_mismatches = lines.total_mismatches()
+        plan_mismatches = lines.plan_mismatches()
+        
+        # Report in member order: (member, kind, group or member index)
+        found = sorted([(int(lines.members[g]), 0, int(g)) for g in line_mismatches] +
+                       [(int(m), 1, int(m)) for m in total_mismatches] +
+                       [(int(lines.members[g]), 2, int(g)) for g in plan_mismatches])
+        for member, kind, i in found:
+            key = matched[member][0]
+            employee = employee_index.get(key)
             if not employee:
                 continue
-                
-            payroll_row = payroll_lookup.get(emp_id)
-            carrier_row = carrier_lookup.get(emp_id)
-            
-            # Check for missing coverage
-            if payroll_row is not None and carrier_row is None:
-                errors.append({
-                    'employee_id': emp_id,
-                    'employee_name': employee['name'],
-                    'error_type': 'Missing Coverage',
-                    'description': 'Employee has payroll deduction but no corresponding carrier coverage',
-                    'amount': self.extract_deduction_amount(payroll_row),
-                    'priority': 'High',
-                    'status': 'Pending Review'
-                })
-            
-            # Check for payroll deduction error
-            elif payroll_row is None and carrier_row is not None:
-                errors.append({
-                    'employee_id': emp_id,
-                    'employee_name': employee['name'],
-                    'error_type': 'Payroll Deduction Error',
-                    'description': 'Employee has carrier coverage but no payroll deduction recorded',
-                    'amount': self.extract_premium_amount(carrier_row),
-                    'priority': 'High',
-                    'status': 'Pending Review'
-                })
-            
-            # Check for premium mismatches
-            elif payroll_row is not None and carrier_row is not None:
-                payroll_amount = self.extract_deduction_amount(payroll_row)
-                carrier_amount = self.extract_premium_amount(carrier_row)
-                
-                if abs(payroll_amount - carrier_amount) > 5.0:  # Allow $5 tolerance
-                    errors.append({
-                        'employee_id': emp_id,
-                        'employee_name': employee['name'],
-                        'error_type': 'Premium Mismatch',
-                        'description': f'Carrier premium ${carrier_amount:.2f} differs from payroll deduction ${payroll_amount:.2f}',
-                        'amount': abs(carrier_amount - payroll_amount),
-                        'priority': 'High' if abs(carrier_amount - payroll_amount) > 50 else 'Medium',
-                        'status': 'Pending Review'
-                    })
+            if kind == 0:
+                add_error(key, line_discrepancy(
+                    employee.employee_id, employee.name, LINE_NAMES[lines.lines[i]],
+                    float(lines.payroll_amounts[i]), float(lines.carrier_amounts[i]),
+                    bool(lines.in_payroll[i]), bool(lines.in_carrier[i]), lines.carrier_plan(i)))
+            elif kind == 1:
+                add_error(key, total_discrepancy(
+                    employee.employee_id, employee.name, float(lines.payroll_totals[i]),
+                    float(lines.carrier_totals[i]), lines.breakdown(i, False), lines.breakdown(i, True)))
+            else:
+                add_error(key, plan_discrepancy(
+                    employee.employee_id, employee.name, LINE_NAMES[lines.lines[i]],
+                    lines.payroll_plan(i), lines.carrier_plan(i), float(lines.carrier_amounts[i])))
         
         return errors
     
-    def extract_deduction_amount(self, payroll_row) -> float:
+    def extract_deduction_amount(self, payroll_row, schema: Optional[ColumnSchema] = None) -> float:
         """Extract deduction amount from payroll row"""
-        # Look for columns that might contain deduction amounts
-        deduction_keys = [k for k in payroll_row.keys() if any(x in k.lower() for x in ['deduction', 'medical', 'premium', 'benefit'])]
+        if schema is None:
+            schema = resolve_schema(list(payroll_row.keys()), 'payroll')
         
         total_deduction = 0.0
-        for key in deduction_keys:
+        for key in schema.deduction_columns:
             if payroll_row[key]:
                 try:
                     amount = float(payroll_row[key])
@@ -381,23 +637,23 @@ class FileProcessor:
                 except (ValueError, TypeError):
                     continue
         
-        return total_deduction if total_deduction > 0 else random.uniform(150.0, 300.0)
+        return total_deduction if total_deduction > 0 else self.rng.uniform(150.0, 300.0)
     
-    def extract_premium_amount(self, carrier_row) -> float:
+    def extract_premium_amount(self, carrier_row, schema: Optional[ColumnSchema] = None) -> float:
         """Extract premium amount from carrier row"""
-        # Look for columns that might contain premium amounts
-        premium_keys = [k for k in carrier_row.keys() if any(x in k.lower() for x in ['premium', 'amount', 'cost', 'rate'])]
+        if schema is None:
+            schema = resolve_schema(list(carrier_row.keys()), 'carrier')
         
-        for key in premium_keys:
+        for key in schema.premium_columns:
             if carrier_row[key]:
                 try:
                     return float(carrier_row[key])
                 except (ValueError, TypeError):
                     continue
         
-        return random.uniform(150.0, 300.0)
+        return self.rng.uniform(150.0, 300.0)
     
-    def generate_sample_errors(self, employees: List[Dict], count: int) -> List[Dict]:
+    def generate_sample_errors(self, employees: List[Employee], count: int) -> List[Discrepancy]:
         """Generate additional sample errors to supplement real data errors"""
         errors = []
         
@@ -413,8 +669,8 @@ class FileProcessor:
         
         # Generate the requested number of errors
         for i in range(count):
-            employee = random.choice(employees)
-            error_type, description_template = random.choice(error_scenarios)
+            employee = self.rng.choice(employees)
+            error_type, description_template = self.rng.choice(error_scenarios)
             
             # Generate realistic error details based on type
             error = self.generate_sample_error_details(employee, error_type, description_template)
@@ -422,69 +678,64 @@ class FileProcessor:
         
         return errors
     
-    def generate_sample_error_details(self, employee: Dict, error_type: str, description_template: str) -> Dict:
+    def generate_sample_error_details(self, employee: Employee, error_type: str, description_template: str) -> Discrepancy:
         """Generate detailed error information for sample errors"""
         
         # Base error structure
-        error = {
-            'employee_id': employee['employee_id'],
-            'employee_name': employee['name'],
-            'error_type': error_type,
-            'status': 'Pending Review'
-        }
+        error = Discrepancy(employee.employee_id, employee.name, error_type)
         
         # Generate specific details based on error type
         if 'Terminated Employee' in error_type:
             term_dates = ['06/15/2025', '06/30/2025', '07/01/2025', '07/15/2025']
-            error['description'] = description_template.format(date=random.choice(term_dates))
-            error['amount'] = random.uniform(250.00, 700.00)
+            error.description = description_template.format(date=self.rng.choice(term_dates))
+            error.amount = self.rng.uniform(250.00, 700.00)
             
         elif 'New Hire Missing' in error_type:
             hire_dates = ['07/01/2025', '07/08/2025', '07/15/2025', '07/22/2025']
-            error['description'] = description_template.format(date=random.choice(hire_dates))
-            error['amount'] = random.uniform(200.00, 650.00)
+            error.description = description_template.format(date=self.rng.choice(hire_dates))
+            error.amount = self.rng.uniform(200.00, 650.00)
             
         elif 'Dependent Mismatch' in error_type:
-            carrier_deps = random.randint(0, 4)
-            payroll_deps = random.randint(0, 4)
+            carrier_deps = self.rng.randint(0, 4)
+            payroll_deps = self.rng.randint(0, 4)
             while payroll_deps == carrier_deps:
-                payroll_deps = random.randint(0, 4)
-            error['description'] = description_template.format(
+                payroll_deps = self.rng.randint(0, 4)
+            error.description = description_template.format(
                 carrier_deps=carrier_deps,
                 payroll_deps=payroll_deps
             )
-            error['amount'] = random.uniform(100.00, 400.00)
+            error.amount = self.rng.uniform(100.00, 400.00)
             
         elif 'Plan Code Error' in error_type:
             carrier_plans = ['MED001', 'MED002', 'DEN001', 'VIS001', 'LIFE001']
             payroll_plans = ['M01', 'M02', 'D01', 'V01', 'L01']
-            error['description'] = description_template.format(
-                carrier_plan=random.choice(carrier_plans),
-                payroll_plan=random.choice(payroll_plans)
+            error.description = description_template.format(
+                carrier_plan=self.rng.choice(carrier_plans),
+                payroll_plan=self.rng.choice(payroll_plans)
             )
-            error['amount'] = random.uniform(50.00, 300.00)
+            error.amount = self.rng.uniform(50.00, 300.00)
             
         elif 'Effective Date Issue' in error_type:
             dates = ['07/01/2025', '07/15/2025', '08/01/2025']
-            carrier_date = random.choice(dates)
-            payroll_date = random.choice([d for d in dates if d != carrier_date])
-            error['description'] = description_template.format(
+            carrier_date = self.rng.choice(dates)
+            payroll_date = self.rng.choice([d for d in dates if d != carrier_date])
+            error.description = description_template.format(
                 carrier_date=carrier_date,
                 payroll_date=payroll_date
             )
-            error['amount'] = random.uniform(150.00, 500.00)
+            error.amount = self.rng.uniform(150.00, 500.00)
             
         else:  # Duplicate Deduction
-            error['description'] = description_template
-            error['amount'] = random.uniform(300.00, 900.00)
+            error.description = description_template
+            error.amount = self.rng.uniform(300.00, 900.00)
         
         # Assign priority based on amount
-        if error['amount'] > 500:
-            error['priority'] = 'High'
-        elif error['amount'] > 200:
-            error['priority'] = 'Medium'
+        if error.amount > 500:
+            error.priority = 'High'
+        elif error.amount > 200:
+            error.priority = 'Medium'
         else:
-            error['priority'] = 'Low'
+            error.priority = 'Low'
         
         return error
     
@@ -0,0 +1,238 @@
+import re
+from collections import defaultdict
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.join_engine import normalize_key
+from src.schema_resolver import DATE_FORMATS
+
+# Fuzzy matching thresholds (Jaro-Winkler similarity, 0..1)
+LAST_NAME_THRESHOLD = 0.92
+FIRST_NAME_THRESHOLD = 0.85
+# Candidates compared per unidentified row; larger blocks only accept exact name matches
+MAX_BLOCK_CANDIDATES = 200
+
+NAME_SUFFIXES = {'JR', 'SR', 'II', 'III', 'IV', 'MD', 'PHD'}
+_NON_NAME = re.compile(r"[^A-Z ,]")
+SOUNDEX_CODES = {letter: str(code) for code, letters in enumerate(
+    ['AEIOUYHW', 'BFPV', 'CGJKQSXZ', 'DT', 'L', 'MN', 'R']) for letter in letters}
+
+AMBIGUOUS = object()
+
+
+def member_id_key(value: Optional[str]) -> str:
+    """Normalized SSN / member ID, or '' when the value can't identify anyone"""
+    key = normalize_key(value)
+    if not key.strip('0'):
+        return ''  # blank or a placeholder like 000-00-0000
+    return key
+
+
+@lru_cache(maxsize=65536)
+def normalize_name(value: str) -> Tuple[str, str]:
+    """(first, last) from 'John Smith', 'SMITH, JOHN', 'Smith, John A. Jr' and similar"""
+    cleaned = _NON_NAME.sub('', (value or '').upper().replace('-', ' ').replace('.', ' '))
+    if ',' in cleaned:
+        last, _, first = cleaned.partition(',')
+        last_tokens = [t for t in last.split() if t not in NAME_SUFFIXES]
+        first_tokens = [t for t in first.replace(',', ' ').split() if t not in NAME_SUFFIXES]
+        return (first_tokens[0] if first_tokens else '', ' '.join(last_tokens))
+    tokens = [t for t in cleaned.split() if t not in NAME_SUFFIXES]
+    if not tokens:
+        return '', ''
+    if len(tokens) == 1:
+        return '', tokens[0]
+    return tokens[0], tokens[-1]
+
+
+@lru_cache(maxsize=65536)
+def normalize_dob(value: str) -> str:
+    """Date of birth as YYYYMMDD, '' when blank or unreadable"""
+    value = (value or '').strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime('%Y%m%d')
+        except ValueError:
+            continue
+    return ''
+
+
+@lru_cache(maxsize=65536)
+def soundex(name: str) -> str:
+    """American Soundex code of a (normalized) name"""
+    letters = [c for c in name if c.isalpha()]
+    if not letters:
+        return ''
+    code = letters[0]
+    previous = SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES.get(letter, '')
+        if digit and digit != '0' and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if letter not in 'HW':  # H and W don't separate letters with the same code
+            previous = digit
+    return code.ljust(4, '0')
+
+
+def jaro_winkler(a: str, b: str) -> float:
+    """Jaro-Winkler similarity of two short strings"""
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    window = max(max(len(a), len(b)) // 2 - 1, 0)
+    a_matched, b_matched = [False] * len(a), [False] * len(b)
+    matches = 0
+    for i, char in enumerate(a):
+        for j in range(max(0, i - window), min(len(b), i + window + 1)):
+            if not b_matched[j] and b[j] == char:
+                a_matched[i] = b_matched[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+    a_chars = [c for c, m in zip(a, a_matched) if m]
+    b_chars = [c for c, m in zip(b, b_matched) if m]
+    transpositions = sum(x != y for x, y in zip(a_chars, b_chars)) / 2
+    jaro = (matches / len(a) + matches / len(b) + (matches - transpositions) / matches) / 3
+    prefix = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefix += 1
+    return jaro + prefix * 0.1 * (1 - jaro)
+
+
+def name_similarity(first_a: str, last_a: str, first_b: str, last_b: str) -> float:
+    """0 when the names can't be the same person, otherwise the average similarity"""
+    last = jaro_winkler(last_a, last_b)
+    if last < LAST_NAME_THRESHOLD:
+        return 0.0
+    if first_a and first_b:
+        # An initial matches any first name starting with it
+        if len(first_a) == 1 or len(first_b) == 1:
+            first = 0.9 if first_a[0] == first_b[0] else 0.0
+        else:
+            first = jaro_winkler(first_a, first_b)
+        if first < FIRST_NAME_THRESHOLD:
+            return 0.0
+    else:
+        first = 0.8  # one side has only a last name
+    return (last + first) / 2
+
+
+class IdentityIndex:
+    """Resolves every row of every source to a member key
+
+    Rows with a usable SSN / member ID are keyed by its normalized form, so
+    formatting differences collapse. Rows without one are matched on name and
+    date of birth against members the same file doesn't already list,
+    comparing only candidates that share a blocking key (Soundex of the last
+    name plus the DOB, or plus the first initial when a DOB is missing).
+    """
+
+    def __init__(self, tables: Sequence):
+        self.sources = [table.file_type for table in tables]
+        self.member_keys: Dict[str, List[str]] = {}
+        self.first_rows: Dict[str, np.ndarray] = {}  # row -> first row of the same member, per source
+        self.fuzzy_matches = 0
+        self._tables = tables
+        self._bits = {file_type: 1 << i for i, file_type in enumerate(self.sources)}
+        self._members: Dict[str, int] = {}  # member key -> bit set of the sources listing it
+        self._blocks: Dict[Tuple[str, str], List[Tuple[str, str, str, str]]] = defaultdict(list)
+        self._exact: Dict[Tuple[str, str, str], object] = {}
+        self._resolve()
+
+    def _resolve(self):
+        unidentified = []
+        for table in self._tables:
+            self.member_keys[table.file_type] = list(table.keys)
+            unidentified.extend((table, position) for position, key in enumerate(table.keys) if not key)
+        if not unidentified:
+            return  # every row has an ID: the normalized IDs are the member keys
+
+        # Only members missing from some file can absorb a row from that file, and
+        # those are the only ones whose sources need tracking
+        key_sets = [set(table.keys) for table in self._tables]
+        for keys in key_sets:
+            keys.discard('')
+        listed = [keys for keys, table in zip(key_sets, self._tables) if len(table)]
+        incomplete = set().union(*listed) - set.intersection(*listed)
+        for table, keys in zip(self._tables, key_sets):
+            bit = self._bits[table.file_type]
+            for key in keys & incomplete:
+                self._members[key] = self._members.get(key, 0) | bit
+
+        added = set()
+        for table in self._tables:
+            for position, key in enumerate(table.keys):
+                if key in incomplete and key not in added:
+                    added.add(key)
+                    self._add_candidate(key, table.names[position], table.birth_dates[position])
+
+        for table, position in unidentified:
+            bit = self._bits[table.file_type]
+            name, dob = table.names[position], table.birth_dates[position]
+            key = self._match(name, dob, bit)
+            if key is None:
+                key = f"{table.file_type.upper()}ROW{position}"
+                self._add_candidate(key, name, dob)
+            else:
+                self.fuzzy_matches += 1
+            self._members[key] = self._members.get(key, 0) | bit
+            self.member_keys[table.file_type][position] = key
+
+    def _add_candidate(self, key: str, name: str, dob: str):
+        first, last = normalize_name(name)
+        if not last:
+            return
+        code = soundex(last)
+        exact_key = (first, last, dob)
+        self._exact[exact_key] = key if self._exact.get(exact_key, key) == key else AMBIGUOUS
+        entry = (key, first, last, dob)
+        if dob:
+            self._blocks[(code, dob)].append(entry)
+        self._blocks[(code, first[:1])].append(entry)
+
+    def _match(self, name: str, dob: str, bit: int) -> Optional[str]:
+        """Member key of the single best candidate, or None when there is none or it's ambiguous"""
+        first, last = normalize_name(name)
+        if not last:
+            return None
+        exact = self._exact.get((first, last, dob))
+        if exact is AMBIGUOUS:
+            return None
+        if exact is not None and not self._members[exact] & bit:
+            return exact
+
+        code = soundex(last)
+        block = self._blocks.get((code, dob)) if dob else None
+        if not block:
+            block = self._blocks.get((code, first[:1]), [])
+        if len(block) > MAX_BLOCK_CANDIDATES:
+            return None
+
+        best_key, best_score, tied = None, 0.0, False
+        for key, candidate_first, candidate_last, candidate_dob in block:
+            if self._members[key] & bit or (dob and candidate_dob and dob != candidate_dob):
+                continue
+            score = name_similarity(first, last, candidate_first, candidate_last)
+            if score > best_score:
+                best_key, best_score, tied = key, score, False
+            elif score and score == best_score and key != best_key:
+                tied = True
+        return None if tied else best_key
+
+    def member_index(self, file_type: str) -> Dict[str, int]:
+        """Member key -> first row position in one source (also fills first_rows)"""
+        positions = {}
+        first_rows = []
+        for key in self.member_keys.get(file_type, []):
+            first_rows.append(positions.setdefault(key, len(first_rows)))
+        self.first_rows[file_type] = np.array(first_rows, dtype=np.int64)
+        return positions
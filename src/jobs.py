@@ -0,0 +1,197 @@
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from werkzeug.datastructures import FileStorage
+
+from src.file_processor import FileProcessor
+from src.join_engine import normalize_key
+from src.metrics import registry
+from src.models.reconciliation import PRIORITY_RANKS, UNRANKED_PRIORITY, ReconciliationError, ReconciliationJob
+from src.models.user import db
+from src.records import source_dicts
+from src.result_cache import result_cache, seed_for
+from src.snapshots import Snapshot, save_snapshot
+from src.source_rows import locate_sources, retain_files, spooled_name
+from src.sql_reconciliation import reconcile_load
+from src.upload_store import load_uploads
+
+# Uploads are spooled here until the worker process has read them
+UPLOAD_ROOT = os.environ.get('JOB_UPLOAD_FOLDER', os.path.join(os.path.dirname(__file__), 'database', 'uploads'))
+MAX_WORKERS = int(os.environ.get('RECONCILIATION_WORKERS', 2))
+# Optional 'thread' or 'process' pool for parsing a job's files concurrently
+PARSE_POOL = os.environ.get('RECONCILIATION_PARSE_POOL') or None
+
+_executor = None
+_executor_lock = threading.Lock()
+_engines: Dict[str, Engine] = {}
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Process pool shared by every request in this web worker, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn avoids forking a threaded gunicorn worker
+            _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def spool_uploads(job_id: str, uploaded_files: Dict[str, FileStorage]) -> Dict[str, str]:
+    """Save each upload to disk so a worker process can read it"""
+    directory = os.path.join(UPLOAD_ROOT, job_id)
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for field, storage in uploaded_files.items():
+        path = os.path.join(directory, spooled_name(field, storage.filename))
+        storage.save(path)
+        paths[field] = path
+    return paths
+
+
+@contextmanager
+def open_spooled(paths: Dict[str, str]) -> Iterator[Dict[str, FileStorage]]:
+    """The spooled files as uploads, closed (and metrics published) afterwards"""
+    handles = {field: open(path, 'rb') for field, path in paths.items()}
+    try:
+        yield {field: FileStorage(stream=handle, filename=os.path.basename(paths[field]))
+               for field, handle in handles.items()}
+    finally:
+        for handle in handles.values():
+            handle.close()
+        registry.flush()  # job workers publish their stage timings for /api/metrics
+
+
+def run_reconciliation(paths: Dict[str, str], seed: Optional[int] = None,
+                       previous_snapshot: Optional[Snapshot] = None,
+                       parallel: Optional[str] = PARSE_POOL) -> Dict[str, Any]:
+    """Worker process entry point: reconcile the spooled files"""
+    with open_spooled(paths) as files:
+        result = FileProcessor(seed=seed).process_files(files, streaming=True, parallel=parallel,
+                                                        previous_snapshot=previous_snapshot, snapshot=True)
+        locate_sources(result['errors'], files)
+        return result
+
+
+def get_engine(database_url: str) -> Engine:
+    """This worker process's own engine for the app database"""
+    engine = _engines.get(database_url)
+    if engine is None:
+        engine = _engines[database_url] = create_engine(database_url)
+    return engine
+
+
+def run_sql_reconciliation(paths: Dict[str, str], group_name: str, period: str, database_url: str) -> Dict[str, Any]:
+    """Worker process entry point: bulk-load the spooled files, then reconcile them in the database
+
+    Rows are streamed into the database a chunk at a time and compared there, so
+    the worker never holds a whole file.
+    """
+    engine = get_engine(database_url)
+    with open_spooled(paths) as files:
+        # Committed on its own, so the database isn't write-locked while the queries run
+        with engine.begin() as connection:
+            load_id = load_uploads(connection, group_name, period, files)
+        with engine.connect() as connection:
+            result = reconcile_load(connection, load_id)
+        locate_sources(result['errors'], files)
+        return result
+
+
+def store_result(job: ReconciliationJob, result: Dict[str, Any]):
+    """Save a finished run: summary on the job row, one bulk-inserted row per error"""
+    # Keep this period's member snapshot for the next delta run
+    members = result.pop('snapshot', None)
+    if members is not None:
+        save_snapshot(job.group_name, job.period, members)
+    
+    errors = result.get('errors', [])
+    summary = {key: value for key, value in result.items() if key != 'errors'}
+    
+    # Precompute the counts the results page shows, so it never needs the full list
+    by_type, by_priority = Counter(), Counter()
+    for error in errors:
+        by_type[error.error_type] += 1
+        by_priority[error.priority] += 1
+    summary['error_counts'] = {'by_type': dict(by_type), 'by_priority': dict(by_priority)}
+    
+    job.result_json = json.dumps(summary)
+    job.status = 'completed'
+    if errors:
+        rows = [dict(error.to_dict(sources=False), job_id=job.id, position=position,
+                     priority_rank=PRIORITY_RANKS.get(error.priority, UNRANKED_PRIORITY),
+                     employee_key=normalize_key(error.employee_id),
+                     sources_json=json.dumps(source_dicts(error.sources)) if error.sources else None)
+                for position, error in enumerate(errors)]
+        db.session.execute(ReconciliationError.__table__.insert(), rows)
+
+
+def record_completed_run(group_name: str, period: str, result: Dict[str, Any]) -> ReconciliationJob:
+    """Persist a synchronous reconciliation so its errors can be exported later"""
+    job = ReconciliationJob(group_name=group_name, period=period)
+    db.session.add(job)
+    db.session.flush()
+    store_result(job, result)
+    db.session.commit()
+    return job
+
+
+def submit_reconciliation(app, uploaded_files: Dict[str, FileStorage], group_name: str, period: str,
+                          cache_key: Optional[str] = None, previous_snapshot: Optional[Snapshot] = None,
+                          sql: bool = False) -> ReconciliationJob:
+    """Record a queued job, spool its uploads and hand it to the process pool
+
+    sql=True stores the uploads as rows and reconciles them with SQL queries.
+    """
+    job = ReconciliationJob(group_name=group_name, period=period)
+    db.session.add(job)
+    db.session.commit()
+
+    job_id = job.id
+    paths = spool_uploads(job_id, uploaded_files)
+    seed = seed_for(cache_key) if cache_key else None
+    if sql:
+        future = get_executor().submit(run_sql_reconciliation, paths, group_name, period,
+                                       app.config['SQLALCHEMY_DATABASE_URI'])
+    else:
+        future = get_executor().submit(run_reconciliation, paths, seed, previous_snapshot)
+    future.add_done_callback(lambda done: _finish_job(app, job_id, done, cache_key, paths))
+    return job
+
+
+def _finish_job(app, job_id: str, future: Future, cache_key: Optional[str] = None,
+                paths: Optional[Dict[str, str]] = None):
+    """Store the outcome of a finished job, keeping its uploads for drill-down when it completed"""
+    try:
+        with app.app_context():
+            job = ReconciliationJob.query.get(job_id)
+            try:
+                result = future.result()
+                result['group_name'] = job.group_name
+                result['period'] = job.period
+                store_result(job, result)
+                db.session.commit()
+            except Exception as e:
+                # A failed insert leaves the session unusable until it is rolled back
+                db.session.rollback()
+                job = ReconciliationJob.query.get(job_id)
+                job.error = f'Error processing files: {str(e)}'
+                job.status = 'failed'
+                db.session.commit()
+            
+            if cache_key and job.status == 'completed':
+                payload = job.to_dict()['result']
+                payload['job_id'] = job.id
+                result_cache.put(cache_key, payload)
+            if paths and job.status == 'completed':
+                retain_files(job_id, paths)
+    finally:
+        shutil.rmtree(os.path.join(UPLOAD_ROOT, job_id), ignore_errors=True)
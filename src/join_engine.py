@@ -0,0 +1,52 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_NON_ALNUM = re.compile(r'[^0-9A-Za-z]')
+
+
+def normalize_key(value: Any) -> str:
+    """Normalize an SSN / employee ID so formatting differences don't break joins"""
+    if value is None:
+        return ''
+    key = _NON_ALNUM.sub('', str(value)).upper()
+    # Spreadsheets drop leading zeros from SSNs (012-34-5678 -> 12345678)
+    if key.isdigit() and 7 <= len(key) < 9:
+        key = key.zfill(9)
+    return key
+
+
+class JoinResult:
+    """Outcome of a three-way payroll / carrier / benadmin join"""
+
+    def __init__(self):
+        # Each entry is (key, payroll_record, carrier_record, benadmin_record)
+        self.matched: List[Tuple[str, Any, Any, Any]] = []
+        self.left_only: List[Tuple[str, Any, Any, Any]] = []
+        self.right_only: List[Tuple[str, Any, Any, Any]] = []
+        self.benadmin_only: List[Tuple[str, Any, Any, Any]] = []
+
+
+def three_way_join(payroll_index: Dict[str, Any], carrier_index: Dict[str, Any],
+                   benadmin_index: Optional[Dict[str, Any]] = None) -> JoinResult:
+    """Join payroll (left) and carrier (right) indexes, attaching benadmin records, in linear time"""
+    benadmin_index = benadmin_index or {}
+    result = JoinResult()
+
+    # Walk payroll in file order so output is deterministic
+    for key, payroll_record in payroll_index.items():
+        carrier_record = carrier_index.get(key)
+        entry = (key, payroll_record, carrier_record, benadmin_index.get(key))
+        if carrier_record is not None:
+            result.matched.append(entry)
+        else:
+            result.left_only.append(entry)
+
+    for key, carrier_record in carrier_index.items():
+        if key not in payroll_index:
+            result.right_only.append((key, None, carrier_record, benadmin_index.get(key)))
+
+    for key, benadmin_record in benadmin_index.items():
+        if key not in payroll_index and key not in carrier_index:
+            result.benadmin_only.append((key, None, None, benadmin_record))
+
+    return result
@@ -0,0 +1,187 @@
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from src.columnar import LineItems
+from src.records import Discrepancy
+from src.schema_resolver import LINE_NAMES
+
+# Differences at or below this many dollars are not reported
+LINE_TOLERANCE = 5.0
+LINE_COUNT = len(LINE_NAMES)
+
+
+def row_members(first_rows: np.ndarray, member_rows: List[int]) -> np.ndarray:
+    """Row position -> index of the compared member it belongs to, or -1
+
+    member_rows[i] is member i's first row, and first_rows maps every row of
+    the file to the first row of the same member.
+    """
+    members = np.full(len(first_rows), -1, dtype=np.int64)
+    members[np.asarray(member_rows, dtype=np.int64)] = np.arange(len(member_rows))
+    return members[first_rows]
+
+
+def _member_items(items: LineItems, row_members: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(entry positions, member index) of the entries that belong to compared members"""
+    members = row_members[items.rows] if len(items) else np.zeros(0, dtype=np.int64)
+    keep = np.flatnonzero(members >= 0)
+    return keep, members[keep]
+
+
+def _lump_sums(items: LineItems, keep: np.ndarray, members: np.ndarray, member_count: int) -> np.ndarray:
+    """Members with at most one amount in the file, and that one's line only inferred from its plan code"""
+    entries = np.bincount(members, minlength=member_count)
+    inferred = np.bincount(members, weights=items.from_plan[keep], minlength=member_count)
+    return (entries <= 1) & (inferred == entries)
+
+
+class LineComparison:
+    """Payroll deductions vs carrier premiums per (member, line of coverage), from one grouped pass
+
+    A member's lines are compared one by one, so a line one file lists and the
+    other doesn't is reported on its own. The member's totals are compared
+    instead when either file has an amount it doesn't tie to a line, or when the
+    lines differ and one file has just one amount for the member, lined up only
+    by its plan code: a carrier file with one premium per member under the
+    medical plan can't be split by line. The per-line amounts then only
+    describe the difference.
+    """
+
+    def __init__(self, payroll: LineItems, carrier: LineItems, payroll_members: np.ndarray,
+                 carrier_members: np.ndarray, member_count: int):
+        self.payroll_plan_names = payroll.plan_names
+        self.carrier_plan_names = carrier.plan_names
+        p_keep, p_members = _member_items(payroll, payroll_members)
+        c_keep, c_members = _member_items(carrier, carrier_members)
+
+        # Group every entry of both files on (member, line) with one sort
+        group_ids = np.concatenate([p_members * LINE_COUNT + payroll.lines[p_keep],
+                                    c_members * LINE_COUNT + carrier.lines[c_keep]])
+        self.groups, inverse = np.unique(group_ids, return_inverse=True)
+        p_groups, c_groups = inverse[:len(p_keep)], inverse[len(p_keep):]
+        group_count = len(self.groups)
+        self.members = self.groups // LINE_COUNT
+        self.lines = self.groups % LINE_COUNT
+        self.payroll_amounts = np.bincount(p_groups, weights=payroll.amounts[p_keep], minlength=group_count)
+        self.carrier_amounts = np.bincount(c_groups, weights=carrier.amounts[c_keep], minlength=group_count)
+        # Plan code per group (the last entry's when a file lists several), -1 for none
+        self.payroll_plans = np.full(group_count, -1, dtype=np.int64)
+        self.payroll_plans[p_groups] = payroll.plans[p_keep]
+        self.carrier_plans = np.full(group_count, -1, dtype=np.int64)
+        self.carrier_plans[c_groups] = carrier.plans[c_keep]
+
+        # Bit set of the lines each file lists per member; bit 0 is an amount with no line
+        self.in_payroll = in_payroll = np.bincount(p_groups, minlength=group_count) > 0
+        self.in_carrier = in_carrier = np.bincount(c_groups, minlength=group_count) > 0
+        payroll_lines = np.zeros(member_count, dtype=np.int64)
+        carrier_lines = np.zeros(member_count, dtype=np.int64)
+        np.bitwise_or.at(payroll_lines, self.members[in_payroll], 1 << self.lines[in_payroll])
+        np.bitwise_or.at(carrier_lines, self.members[in_carrier], 1 << self.lines[in_carrier])
+        self.payroll_listed = payroll_lines != 0
+        self.carrier_listed = carrier_lines != 0
+        lump = (_lump_sums(payroll, p_keep, p_members, member_count) |
+                _lump_sums(carrier, c_keep, c_members, member_count))
+        self.by_total = ((payroll_lines | carrier_lines) & 1).astype(bool) | ((payroll_lines != carrier_lines) & lump)
+
+        self.payroll_totals = np.bincount(self.members, weights=self.payroll_amounts, minlength=member_count)
+        self.carrier_totals = np.bincount(self.members, weights=self.carrier_amounts, minlength=member_count)
+        # Each member's groups are groups[starts[m]:starts[m + 1]]
+        self.starts = np.searchsorted(self.groups, np.arange(member_count + 1) * LINE_COUNT)
+
+    def line_mismatches(self, tolerance: float = LINE_TOLERANCE) -> np.ndarray:
+        """Groups of line-by-line members whose amounts differ"""
+        differences = np.abs(self.carrier_amounts - self.payroll_amounts)
+        return np.flatnonzero(~self.by_total[self.members] & (differences > tolerance))
+
+    def total_mismatches(self, tolerance: float = LINE_TOLERANCE) -> np.ndarray:
+        """Members compared by total whose totals differ"""
+        differences = np.abs(self.carrier_totals - self.payroll_totals)
+        return np.flatnonzero(self.by_total & (differences > tolerance))
+
+    def plan_mismatches(self) -> np.ndarray:
+        """Groups of line-by-line members where both files name a different plan for the line"""
+        # Index -1 (no plan) picks the trailing ''
+        payroll_names = np.array([name.upper() for name in self.payroll_plan_names] + [''], dtype=object)
+        carrier_names = np.array([name.upper() for name in self.carrier_plan_names] + [''], dtype=object)
+        payroll, carrier = payroll_names[self.payroll_plans], carrier_names[self.carrier_plans]
+        return np.flatnonzero(~self.by_total[self.members] & (payroll != '') & (carrier != '') & (payroll != carrier))
+
+    def payroll_plan(self, group: int) -> str:
+        plan = self.payroll_plans[group]
+        return self.payroll_plan_names[plan] if plan >= 0 else ''
+
+    def carrier_plan(self, group: int) -> str:
+        plan = self.carrier_plans[group]
+        return self.carrier_plan_names[plan] if plan >= 0 else ''
+
+    def breakdown(self, member: int, carrier: bool) -> str:
+        """'medical $281.50, dental $36.00' for one member and file"""
+        span = slice(self.starts[member], self.starts[member + 1])
+        amounts = (self.carrier_amounts if carrier else self.payroll_amounts)[span].tolist()
+        listed = (self.in_carrier if carrier else self.in_payroll)[span].tolist()
+        return format_breakdown((LINE_NAMES[line], amount)
+                                for line, amount, present in zip(self.lines[span].tolist(), amounts, listed) if present)
+
+
+# Discrepancies the payroll / carrier comparison reports, shared by the in-memory and SQL engines
+
+def format_breakdown(amounts: Iterable[Tuple[str, float]]) -> str:
+    """'medical $281.50, dental $36.00' from (line, amount) pairs"""
+    return ', '.join(f"{line or 'unassigned'} ${amount:.2f}" for line, amount in amounts)
+
+
+def missing_coverage(employee_id: str, name: str, amount: float) -> Discrepancy:
+    return Discrepancy(employee_id, name, 'Missing Coverage',
+                       'Employee has payroll deduction but no corresponding carrier coverage', amount, 'High')
+
+
+def missing_deduction(employee_id: str, name: str, amount: float) -> Discrepancy:
+    return Discrepancy(employee_id, name, 'Payroll Deduction Error',
+                       'Employee has carrier coverage but no payroll deduction recorded', amount, 'High')
+
+
+def premium_mismatch(employee_id: str, name: str, description: str, payroll_amount: float,
+                     carrier_amount: float) -> Discrepancy:
+    difference = abs(float(carrier_amount) - float(payroll_amount))
+    return Discrepancy(employee_id, name, 'Premium Mismatch', description, difference,
+                       'High' if difference > 50 else 'Medium')
+
+
+def line_discrepancy(employee_id: str, name: str, line: str, payroll_amount: float, carrier_amount: float,
+                     in_payroll: bool, in_carrier: bool, carrier_plan: str) -> Discrepancy:
+    """One line of coverage whose amounts differ, or that only one file lists"""
+    line = line.capitalize()
+    carrier_detail = f'${carrier_amount:.2f}{f" ({carrier_plan})" if carrier_plan else ""}'
+    if not in_carrier:
+        return Discrepancy(employee_id, name, 'Missing Coverage',
+                           f'{line}: payroll deduction ${payroll_amount:.2f} but no carrier {line.lower()} coverage',
+                           float(payroll_amount), 'High')
+    if not in_payroll:
+        return Discrepancy(employee_id, name, 'Payroll Deduction Error',
+                           f'{line}: carrier premium {carrier_detail} but no payroll {line.lower()} deduction',
+                           float(carrier_amount), 'High')
+    return premium_mismatch(employee_id, name,
+                            f'{line}: carrier premium {carrier_detail} differs from payroll deduction ${payroll_amount:.2f}',
+                            payroll_amount, carrier_amount)
+
+
+def total_discrepancy(employee_id: str, name: str, payroll_total: float, carrier_total: float,
+                      payroll_breakdown: str, carrier_breakdown: str) -> Discrepancy:
+    """A member compared by total; an empty breakdown means the file has no amount for the member"""
+    carrier_detail = f'${carrier_total:.2f} ({carrier_breakdown})'
+    payroll_detail = f'${payroll_total:.2f} ({payroll_breakdown})'
+    if not carrier_breakdown:
+        description = f'No carrier premium for payroll deduction {payroll_detail}'
+    elif not payroll_breakdown:
+        description = f'No payroll deduction for carrier premium {carrier_detail}'
+    else:
+        description = f'Carrier premium {carrier_detail} differs from payroll deduction {payroll_detail}'
+    return premium_mismatch(employee_id, name, description, payroll_total, carrier_total)
+
+
+def plan_discrepancy(employee_id: str, name: str, line: str, payroll_plan: str, carrier_plan: str,
+                     carrier_amount: float) -> Discrepancy:
+    return Discrepancy(employee_id, name, 'Plan Code Error',
+                       f'{line.capitalize()}: carrier plan {carrier_plan} differs from payroll plan {payroll_plan}',
+                       float(carrier_amount), 'Medium')
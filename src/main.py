@@ -1,48 +1,42 @@
+import importlib
 import os
 import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory, request, jsonify
+from typing import Any, Dict, Optional
+
+from flask import Flask, abort, jsonify
 from flask_cors import CORS
 # --- IMPORTS FOR AUTHENTICATION ---
-from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from flask_login import LoginManager
+from sqlalchemy import text
 
 # --- IMPORT YOUR MODELS AND BLUEPRINTS ---
-# Make sure your User model is imported correctly from your models file
-from src.models.user import db, User
+# Blueprints are light: the reconciliation engines they call are imported on
+# first use (see DEFERRED_IMPORTS), so a new worker is serving in well under a second
+from src.models.user import db
+from src.passwords import PasswordHashBusy
+from src.routes.auth import auth_bp
 from src.routes.user import user_bp
-from src.routes.benefitspecs import benefitspecs_bp
-
-# --- FLASK APP INITIALIZATION ---
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-
-# --- APP CONFIGURATION ---
-# Use an environment variable for the secret key in production for security
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'a-default-secret-key-for-dev')
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-
-# This line will be replaced by the environment variable on Railway.
-# For local development, it falls back to a local SQLite database.
-# On Railway, set DATABASE_URL in your service's environment variables.
-database_url = os.environ.get('DATABASE_URL', f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}")
-app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+from src.routes.benefitspecs import DEFERRED_IMPORTS, benefitspecs_bp
+from src.routes.metrics import metrics_bp
+from src.static_assets import StaticManifest
+from src.user_cache import load_cached_user
+from src import metrics
 
-# Enable CORS for all routes to allow frontend interaction
-CORS(app, supports_credentials=True)
-
-# Initialize database with the app
-db.init_app(app)
+DATABASE_DIR = os.path.join(os.path.dirname(__file__), 'database')
+# Any constant works; instances starting together take turns creating the schema with it
+SCHEMA_LOCK_KEY = 0x42656e53
 
 # --- FLASK-LOGIN CONFIGURATION ---
 login_manager = LoginManager()
-login_manager.init_app(app)
 
-# This function tells Flask-Login how to load a user from the database given their ID.
+# This function tells Flask-Login how to load a user given their ID.
+# Runs on every authenticated request, so recently seen users come from the cache.
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return load_cached_user(int(user_id))
 
 # If a user tries to access a protected page without being logged in,
 # we will return a 401 Unauthorized error. This is ideal for APIs.
@@ -50,98 +44,114 @@ def load_user(user_id):
 def unauthorized():
     return jsonify({"error": "Authentication required. Please log in."}), 401
 
-# --- REGISTER EXISTING BLUEPRINTS ---
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(benefitspecs_bp, url_prefix='/api')
-
-# --- NEW AUTHENTICATION API ROUTES ---
-
-@app.route('/api/register', methods=['POST'])
-def register():
-    """Registers a new user."""
-    data = request.get_json()
-    if not data or not data.get('username') or not data.get('password'):
-        return jsonify({"error": "Username and password are required"}), 400
-
-    username = data.get('username')
-    password = data.get('password')
-
-    if User.query.filter_by(username=username).first():
-        return jsonify({"error": "Username already exists"}), 409
-
-    new_user = User(username=username)
-    new_user.set_password(password)  # Use the method from your User model
-    db.session.add(new_user)
-    db.session.commit()
-
-    return jsonify({"message": f"User '{username}' registered successfully"}), 201
-
-@app.route('/api/login', methods=['POST'])
-def login():
-    """Logs in a user and creates a session."""
-    data = request.get_json()
-    if not data or not data.get('username') or not data.get('password'):
-        return jsonify({"error": "Username and password are required"}), 400
-
-    username = data.get('username')
-    password = data.get('password')
-    user = User.query.filter_by(username=username).first()
-
-    # Use the check_password method from your User model
-    if user and user.check_password(password):
-        login_user(user)  # This function from Flask-Login creates the session cookie
-        return jsonify({"message": f"Welcome, {user.username}!", "user": {"id": user.id, "username": user.username}}), 200
-    
-    return jsonify({"error": "Invalid username or password"}), 401
-
-@app.route('/api/logout', methods=['POST'])
-@login_required  # Ensures only logged-in users can access this
-def logout():
-    """Logs out the current user by clearing the session."""
-    logout_user()  # This function from Flask-Login clears the session
-    return jsonify({"message": "Successfully logged out"}), 200
-
-@app.route('/api/profile')
-@login_required  # This is an example of a protected route
-def profile():
-    """Returns the profile of the currently logged-in user."""
-    # `current_user` is a proxy from Flask-Login to the logged-in user object
-    return jsonify({
-        "id": current_user.id,
-        "username": current_user.username
-    })
-
-# --- CREATE DATABASE TABLES ---
-# This block ensures that the database tables are created based on your models.
-with app.app_context():
-    # Create a directory for the SQLite database if it doesn't exist
-    if 'sqlite' in app.config['SQLALCHEMY_DATABASE_URI']:
-        db_dir = os.path.join(os.path.dirname(__file__), 'database')
-        if not os.path.exists(db_dir):
-            os.makedirs(db_dir)
-    db.create_all()
-
-# --- SERVE STATIC FRONTEND ---
-# This route serves your frontend application (e.g., a React or Vue build).
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-        return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
+# A login burst larger than the bcrypt queue gets told to retry rather than waiting on it
+def password_hash_busy(e):
+    return jsonify({"error": "Too many sign-ins at once. Please try again shortly."}), 503, {"Retry-After": "1"}
+
+
+def create_app(config: Optional[Dict[str, Any]] = None) -> Flask:
+    """Build the app; config entries override the environment-derived settings
+
+    The schema is created here unless INIT_DB_ON_CREATE is 0. gunicorn.conf.py
+    sets that and creates it once in the master instead, so workers booting
+    together don't race each other's CREATE TABLEs.
+    """
+    # --- FLASK APP INITIALIZATION ---
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+
+    # --- APP CONFIGURATION ---
+    # Use an environment variable for the secret key in production for security
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'a-default-secret-key-for-dev')
+    # Uploads are streamed row by row, so large carrier files no longer need to fit in memory
+    app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 200)) * 1024 * 1024  # 200MB max by default
+
+    # This line will be replaced by the environment variable on Railway.
+    # For local development, it falls back to a local SQLite database.
+    # On Railway, set DATABASE_URL in your service's environment variables.
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', f"sqlite:///{os.path.join(DATABASE_DIR, 'app.db')}")
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['INIT_DB_ON_CREATE'] = os.environ.get('INIT_DB_ON_CREATE', '1') != '0'
+    # /api/metrics answers only scrapers sending this bearer token; unset, it is off
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    app.config.update(config or {})
+
+    # Enable CORS for all routes to allow frontend interaction
+    CORS(app, supports_credentials=True)
+
+    # Initialize database with the app
+    db.init_app(app)
+    login_manager.init_app(app)
+    app.register_error_handler(PasswordHashBusy, password_hash_busy)
+
+    # --- REGISTER BLUEPRINTS ---
+    app.register_blueprint(auth_bp, url_prefix='/api')
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(benefitspecs_bp, url_prefix='/api')
+    app.register_blueprint(metrics_bp, url_prefix='/api')
+
+    # Request timing, Server-Timing headers and per-worker metrics for /api/metrics
+    metrics.init_app(app)
+
+    # --- SERVE STATIC FRONTEND ---
+    # Files are read and gzipped once here, then answered from memory with ETags;
+    # the debug server re-reads any that change on disk
+    static_files = StaticManifest(app.static_folder)
+
+    def static(filename):
+        return static_files.response(filename, reload=app.debug) or abort(404)
+    app.view_functions['static'] = static
+
+    # This route serves your frontend application (e.g., a React or Vue build).
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        response = static_files.response(path, reload=app.debug) if path else None
+        if response is None:
+            # Unknown paths get the app shell, which routes them in the browser
+            response = static_files.response('index.html', reload=app.debug)
+        if response is None:
             return "index.html not found in static folder", 404
+        return response
+
+    if app.config['INIT_DB_ON_CREATE']:
+        init_database(app)
+    return app
+
+
+def init_database(app: Flask):
+    """Create any missing tables (and the SQLite folder); once per deploy, not per worker"""
+    from src.models import reconciliation, snapshot, upload  # noqa: F401 (tables for create_all)
+
+    with app.app_context():
+        if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+            os.makedirs(DATABASE_DIR, exist_ok=True)
+        with db.engine.begin() as connection:
+            if connection.dialect.name == 'postgresql':
+                # Held until commit, so the second instance finds the tables already there
+                connection.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': SCHEMA_LOCK_KEY})
+            db.metadata.create_all(connection)
+        # A preloading master must not hand its open connections to the workers it forks
+        db.engine.dispose()
+
+
+def preload_modules():
+    """Import what the views defer, so workers forked from a preloaded master share it"""
+    for module in DEFERRED_IMPORTS:
+        importlib.import_module(module)
+
+
+def __getattr__(name):
+    # The old entry point (gunicorn src.main:app, flask --app src.main) still works:
+    # the module-level app is built on first access instead of at import
+    if name == 'app':
+        app = globals()['app'] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # --- RUN THE APP ---
 # This block is for local development and will not be used by Gunicorn on Railway.
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 3000))
     # Use debug=False in a production-like local test
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,219 @@
+import csv
+import io
+import mmap
+import os
+import shutil
+import tempfile
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.schema_resolver import resolve_schema
+from src.x12 import X12_SNIFF_BYTES, looks_like_x12
+
+# Uploads at least this big are memory-mapped instead of parsed into rows up front; 0 (the
+# default) never maps. Mapping costs ~5-10% more time (rows are decoded once per stage)
+# for ~40% less peak memory, so it's for workers that would otherwise run out of RAM
+MAPPED_INGEST_MB = float(os.environ.get('MAPPED_INGEST_MB', 0))
+# Rows decoded together when a stage iterates over the file
+ITER_BLOCK_ROWS = 4096
+# Lines the CSV reader yields no values for, and FileProcessor skips
+BLANK_LINES = (b'\n', b'\r\n')
+
+
+def upload_size(file_obj) -> int:
+    """Size in bytes of an upload (a FileStorage, file object or path)"""
+    if isinstance(file_obj, str):
+        return os.path.getsize(file_obj)
+    stream = getattr(file_obj, 'stream', file_obj)
+    try:
+        position = stream.tell()
+        size = stream.seek(0, io.SEEK_END)
+        stream.seek(position)
+        return size
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def map_upload(file_obj) -> Optional[mmap.mmap]:
+    """Read-only mapping of an upload, spooling it to a temp file when it has no file descriptor
+
+    Returns None for an empty upload, which can't be mapped.
+    """
+    stream = getattr(file_obj, 'stream', file_obj)
+    try:
+        # Werkzeug's SpooledTemporaryFile moves to disk on fileno()
+        fileno = stream.fileno()
+        stream.flush()
+    except (OSError, ValueError, AttributeError, io.UnsupportedOperation):
+        stream.seek(0)
+        with tempfile.TemporaryFile() as spooled:
+            shutil.copyfileobj(stream, spooled)
+            spooled.flush()
+            if not spooled.tell():
+                return None
+            return mmap.mmap(spooled.fileno(), 0, access=mmap.ACCESS_READ)  # outlives the closed file
+    if not os.fstat(fileno).st_size:
+        return None
+    return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+
+
+def read_record(readline) -> bytes:
+    """The next CSV record, taking in lines until its quotes balance"""
+    record = readline()
+    while record.count(b'"') % 2:
+        more = readline()
+        if not more:
+            break
+        record += more
+    return record
+
+
+def iter_records(readline, start: int) -> Iterator[Tuple[int, bytes]]:
+    """(byte offset, bytes) of each record from start on, skipping the blank lines FileProcessor skips"""
+    while True:
+        record = read_record(readline)
+        if not record:
+            return
+        if record not in BLANK_LINES:
+            yield start, record
+        start += len(record)
+
+
+def row_offsets(file_obj) -> Optional[array]:
+    """Byte offset of every row of a CSV upload (or path), numbered as FileProcessor numbers them
+
+    None for an X12 or empty upload.
+    """
+    if isinstance(file_obj, str):
+        with open(file_obj, 'rb') as handle:
+            buffer = map_upload(handle)
+    else:
+        buffer = map_upload(file_obj)
+    if buffer is None:
+        return None
+    try:
+        if looks_like_x12(buffer[:X12_SNIFF_BYTES]):
+            return None
+        header = read_record(buffer.readline)
+        return array('Q', (start for start, _ in iter_records(buffer.readline, len(header))))
+    finally:
+        buffer.close()
+
+
+class MappedCSV:
+    """A memory-mapped CSV upload standing in for its list of parsed rows
+
+    One pass over the file records where every row starts (8 bytes a row).
+    Rows become dicts, holding just the columns the reconciliation uses, only
+    when a stage indexes or iterates; nothing keeps them. Members are found
+    through the IdentityIndex built from the file's SourceTable, as for any
+    other upload.
+    """
+
+    def __init__(self, buffer: mmap.mmap, file_type: str, path: Optional[str] = None):
+        self.file_type = file_type
+        self.path = path                 # file behind the mapping, when it has a name
+        self._buffer = buffer
+        self.offsets = array('Q')  # start of each row, plus the end of the last one
+        self._index()
+
+    @classmethod
+    def open(cls, file_obj, file_type: str) -> Optional['MappedCSV']:
+        """Map a CSV upload (file object or path); None when it is empty or an X12 file"""
+        if isinstance(file_obj, str):
+            with open(file_obj, 'rb') as handle:
+                buffer = map_upload(handle)
+        else:
+            buffer = map_upload(file_obj)
+        if buffer is None:
+            return None
+        if looks_like_x12(buffer[:X12_SNIFF_BYTES]):
+            buffer.close()
+            return None
+        return cls(buffer, file_type, file_obj if isinstance(file_obj, str) else None)
+
+    def _index(self):
+        buffer = self._buffer
+        readline = buffer.readline
+        buffer.seek(0)
+        header_record = read_record(readline)
+        header = next(csv.reader([header_record.decode('utf-8-sig')]), [])
+        self.header = [key.strip().lower() if key else '' for key in header]
+        self.width = len(self.header)
+        schema = resolve_schema(self.header, self.file_type)
+        self.columns = schema.columns
+        # Later columns win when a header repeats, as in a dict built from the row
+        positions = {key: position for position, key in enumerate(self.header)}
+        self._positions = [(key, positions[key]) for key in self.columns]
+
+        offsets = self.offsets
+        for start, record in iter_records(readline, len(header_record)):
+            record.decode('utf-8')  # fails here, not in a later stage
+            offsets.append(start)
+        if offsets:
+            offsets.append(buffer.tell())
+
+    def __len__(self) -> int:
+        return max(len(self.offsets) - 1, 0)
+
+    def _row(self, values: List[str]) -> Dict[str, str]:
+        if len(values) < self.width:
+            values = values + [''] * (self.width - len(values))
+        return {key: values[position].strip() for key, position in self._positions}
+
+    def __getitem__(self, row: int) -> Dict[str, str]:
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        text = self._buffer[self.offsets[row]:self.offsets[row + 1]].decode('utf-8')
+        return self._row(next(csv.reader(io.StringIO(text, newline=''))))
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        for first in range(0, len(self), ITER_BLOCK_ROWS):
+            last = min(first + ITER_BLOCK_ROWS, len(self))
+            text = self._buffer[self.offsets[first]:self.offsets[last]].decode('utf-8')
+            for values in csv.reader(io.StringIO(text, newline='')):
+                if values:
+                    yield self._row(values)
+
+    def rows_at(self, positions: List[int]) -> Iterator[Dict[str, str]]:
+        """The rows at ascending positions, a block at a time where most of a block is wanted"""
+        wanted: List[int] = []
+        for row in positions:
+            if wanted and row - row % ITER_BLOCK_ROWS != wanted[0] - wanted[0] % ITER_BLOCK_ROWS:
+                yield from self._rows_in_block(wanted)
+                wanted = []
+            wanted.append(row)
+        if wanted:
+            yield from self._rows_in_block(wanted)
+
+    def _rows_in_block(self, rows: List[int]) -> Iterator[Dict[str, str]]:
+        # A few rows are cheaper decoded one by one than with the whole block around them
+        if len(rows) < ITER_BLOCK_ROWS // 8:
+            for row in rows:
+                yield self[row]
+            return
+        first = rows[0] - rows[0] % ITER_BLOCK_ROWS
+        last = min(first + ITER_BLOCK_ROWS, len(self))
+        text = self._buffer[self.offsets[first]:self.offsets[last]].decode('utf-8')
+        block = [values for values in csv.reader(io.StringIO(text, newline='')) if values]
+        for row in rows:
+            yield self._row(block[row - first])
+
+    @property
+    def size(self) -> int:
+        return len(self._buffer)
+
+    def __getstate__(self):
+        # Process pools get the path and the index; the receiving side maps the file again
+        if self.path is None:
+            raise TypeError('Only a MappedCSV of a named file can be sent to another process')
+        state = dict(self.__dict__)
+        del state['_buffer']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        with open(self.path, 'rb') as handle:
+            self._buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
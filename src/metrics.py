@@ -0,0 +1,314 @@
+import atexit
+import fcntl
+import functools
+import json
+import os
+import resource
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from flask import g, has_request_context, request
+
+# Every process (web workers, job workers, parse pool workers) writes its own
+# snapshot here; /api/metrics sums them so the numbers cover the whole host
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'benefitspecs_metrics'))
+# Web workers rewrite their snapshot at most this often, so requests don't each pay for a file write
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 1))
+# Snapshots not rewritten for this long belong to workers that have exited; their
+# totals are folded into RETAINED_SNAPSHOT so counters never go backwards
+METRICS_MAX_AGE = int(os.environ.get('METRICS_MAX_AGE_HOURS', 24)) * 3600
+RETAINED_SNAPSHOT = 'retained.json'
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# name -> (type, help)
+METRICS = {
+    'benefitspecs_stage_duration_seconds': ('histogram', 'Time spent in each FileProcessor stage'),
+    'benefitspecs_request_duration_seconds': ('histogram', 'Time to produce each API response'),
+    'benefitspecs_requests_total': ('counter', 'API requests by endpoint and status'),
+    'benefitspecs_rows_processed_total': ('counter', 'CSV rows parsed by file type'),
+    'benefitspecs_bytes_ingested_total': ('counter', 'Upload bytes read by file type'),
+    'benefitspecs_parse_failures_total': ('counter', 'Uploads that could not be parsed, by file type'),
+    'benefitspecs_reconciliation_errors_total': ('counter', 'Reconciliation discrepancies found, by error type'),
+    'benefitspecs_batch_groups_total': ('counter', 'Groups run by batch reconciliations, by outcome'),
+    'benefitspecs_user_cache_total': ('counter', 'Session user lookups answered by the user cache (hit) or the database (miss)'),
+    'benefitspecs_password_hash_busy_total': ('counter', 'Logins and registrations turned away with the bcrypt queue full'),
+    'benefitspecs_peak_rss_bytes': ('gauge', 'Largest peak resident set size of any process'),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Registry:
+    """This process's counters, histograms and gauges"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = defaultdict(float)
+        self.histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        # pid plus a random suffix, so a recycled pid never overwrites an old worker's totals
+        self.token = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.last_flush = 0.0
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        with self._lock:
+            self.counters[(name, _labels(labels))] += amount
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            # Per-bucket counts followed by sum and count
+            histogram = self.histograms.setdefault(key, [0] * (len(DURATION_BUCKETS) + 2))
+            for position, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    histogram[position] += 1
+                    break
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def set_max(self, name: str, value: float, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self.gauges[key] = max(value, self.gauges.get(key, 0))
+
+    def snapshot(self) -> Dict[str, list]:
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(values)] for (name, labels), values in self.histograms.items()],
+                'gauges': [[name, list(labels), value] for (name, labels), value in self.gauges.items()]
+            }
+
+    def flush(self):
+        """Write this process's snapshot for the metrics endpoint to merge"""
+        # Tokens are per process; a forked or spawned child gets a fresh file
+        if not self.token.startswith(f"{os.getpid()}-"):
+            self.token = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.last_flush = time.monotonic()
+        self.set_max('benefitspecs_peak_rss_bytes', peak_rss())
+        tmp_path = None
+        try:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=METRICS_DIR, suffix='.tmp')
+            with os.fdopen(fd, 'w') as handle:
+                json.dump(self.snapshot(), handle)
+            os.replace(tmp_path, os.path.join(METRICS_DIR, f"{self.token}.json"))
+        except OSError as e:
+            print(f"Error writing metrics: {str(e)}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def flush_if_due(self):
+        """flush(), unless this process already did within METRICS_FLUSH_SECONDS"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self.last_flush < METRICS_FLUSH_SECONDS:
+                return
+            self.last_flush = now
+        self.flush()
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def peak_rss() -> int:
+    """Peak resident set size of this process in bytes"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+registry = Registry()
+# Whatever arrived since the last interval flush
+atexit.register(registry.flush)
+
+
+def record_timing(name: str, seconds: float):
+    """Add an entry to the current response's Server-Timing header"""
+    if has_request_context():
+        g.setdefault('server_timing', []).append((name, seconds))
+
+
+@contextmanager
+def timed_stage(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        registry.observe('benefitspecs_stage_duration_seconds', seconds, stage=stage)
+        record_timing(stage, seconds)
+
+
+def timed(stage: str):
+    """Decorator timing a FileProcessor stage"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed_stage(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _empty() -> Dict[str, dict]:
+    return {'counters': defaultdict(float), 'histograms': {}, 'gauges': {}}
+
+
+def _fold(merged: Dict[str, dict], snapshot: Dict[str, list]):
+    """Add one process's snapshot to merged: counters and histograms sum, gauges take the max"""
+    counters, histograms, gauges = merged['counters'], merged['histograms'], merged['gauges']
+    for metric, labels, value in snapshot['counters']:
+        counters[(metric, tuple(map(tuple, labels)))] += value
+    for metric, labels, values in snapshot['histograms']:
+        key = (metric, tuple(map(tuple, labels)))
+        current = histograms.get(key, [0] * len(values))
+        histograms[key] = [a + b for a, b in zip(current, values)]
+    for metric, labels, value in snapshot['gauges']:
+        key = (metric, tuple(map(tuple, labels)))
+        gauges[key] = max(value, gauges.get(key, 0))
+
+
+def _load(path: str) -> Dict[str, list]:
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def retire_snapshots(directory: str, paths: List[str]):
+    """Fold exited workers' snapshots into the retained one and remove them
+
+    Web workers prune concurrently, so the fold happens under a file lock and a
+    snapshot another worker already retired is skipped.
+    """
+    with open(os.path.join(directory, '.retained.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        retained = _empty()
+        retained_path = os.path.join(directory, RETAINED_SNAPSHOT)
+        try:
+            _fold(retained, _load(retained_path))
+        except FileNotFoundError:
+            pass
+        folded = []
+        for path in paths:
+            try:
+                _fold(retained, _load(path))
+            except (OSError, ValueError):
+                continue
+            folded.append(path)
+        if not folded:
+            return
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as handle:
+                json.dump({kind: [[name, list(labels), value] for (name, labels), value in retained[kind].items()]
+                           for kind in ('counters', 'histograms', 'gauges')}, handle)
+            os.replace(tmp_path, retained_path)
+        except OSError:
+            os.remove(tmp_path)
+            raise
+        for path in folded:
+            os.remove(path)
+
+
+def merge_snapshots(directory: str = METRICS_DIR) -> Dict[str, dict]:
+    """Sum counters and histograms across every process's snapshot; gauges take the max"""
+    now = time.time()
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith('.json')]
+    except OSError:
+        names = []
+    stale = []
+    for name in names:
+        try:
+            if name != RETAINED_SNAPSHOT and now - os.path.getmtime(os.path.join(directory, name)) > METRICS_MAX_AGE:
+                stale.append(name)
+        except OSError:
+            continue
+    if stale:
+        try:
+            retire_snapshots(directory, [os.path.join(directory, name) for name in stale])
+            # counted in the retained snapshot now
+            names = [name for name in names if name not in stale] + [RETAINED_SNAPSHOT]
+        except OSError as e:
+            print(f"Error retiring metrics snapshots: {str(e)}")
+
+    merged = _empty()
+    for name in set(names):
+        try:
+            _fold(merged, _load(os.path.join(directory, name)))
+        except (OSError, ValueError):
+            continue  # removed or being replaced underneath us
+    return merged
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_prometheus() -> str:
+    """Merged metrics in the Prometheus text exposition format"""
+    registry.flush()  # include this worker's latest numbers
+    merged = merge_snapshots()
+    samples = defaultdict(list)
+    for kind in ('counters', 'gauges'):
+        for (name, labels), value in sorted(merged[kind].items()):
+            samples[name].append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    for (name, labels), values in sorted(merged['histograms'].items()):
+        cumulative = 0
+        for bound, count in zip(DURATION_BUCKETS, values):
+            cumulative += count
+            samples[name].append(f"{name}_bucket{_format_labels(labels, ('le', f'{bound:g}'))} {_format_value(cumulative)}")
+        samples[name].append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {_format_value(values[-1])}")
+        samples[name].append(f"{name}_sum{_format_labels(labels)} {_format_value(values[-2])}")
+        samples[name].append(f"{name}_count{_format_labels(labels)} {_format_value(values[-1])}")
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples.get(name, []))
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """Time every request, add Server-Timing headers and publish this worker's metrics"""
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def finish_timer(response):
+        start = g.get('request_start')
+        if start is None:
+            return response
+        seconds = time.perf_counter() - start
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        if endpoint.startswith('/api/'):
+            labels = {'endpoint': endpoint, 'method': request.method}
+            registry.observe('benefitspecs_request_duration_seconds', seconds, **labels)
+            registry.inc('benefitspecs_requests_total', status=response.status_code, **labels)
+            registry.flush_if_due()
+
+        # Repeated stages (one read per file, memoised joins) are summed into one entry
+        stage_totals: Dict[str, float] = {}
+        for name, duration in g.get('server_timing', []):
+            stage_totals[name] = stage_totals.get(name, 0.0) + duration
+        timings = [f"{name};dur={duration * 1000:.1f}" for name, duration in stage_totals.items()]
+        timings.append(f"total;dur={seconds * 1000:.1f}")
+        response.headers['Server-Timing'] = ', '.join(timings)
+        return response
@@ -0,0 +1,125 @@
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from src.join_engine import normalize_key
+from src.models.user import db
+
+# Sort order for priorities (High first); stored per error so it can be indexed.
+# The numbers are kept as stored by earlier runs; other priorities sort last
+PRIORITY_RANKS = {'High': 1, 'Medium': 2, 'Low': 3}
+UNRANKED_PRIORITY = 4
+ERRORS_PER_PAGE = 25
+MAX_ERRORS_PER_PAGE = 500
+
+# Sort keys accepted by the errors endpoint, with a '-' prefix for descending
+ERROR_SORTS = {
+    'position': 'position',
+    'priority': 'priority_rank',
+    'error_type': 'error_type',
+    'amount': 'amount',
+    'employee': 'employee_name'
+}
+
+
+class ReconciliationJob(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, completed, failed
+    group_name = db.Column(db.String(200))
+    period = db.Column(db.String(20))
+    result_json = db.Column(db.Text)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    errors = db.relationship('ReconciliationError', lazy='dynamic', cascade='all, delete-orphan')
+
+    def to_dict(self):
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'group_name': self.group_name,
+            'period': self.period,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+        if self.status == 'completed' and self.result_json:
+            # Summary metrics plus the first page; later pages come from the errors endpoint
+            data['result'] = json.loads(self.result_json)
+            first_page = ReconciliationError.page(self.id)
+            data['result']['errors'] = first_page['errors']
+            data['result']['pagination'] = first_page['pagination']
+        if self.status == 'failed':
+            data['error'] = self.error
+        return data
+
+
+class ReconciliationError(db.Model):
+    # Per-run indexes for each filter / sort the errors endpoint supports
+    __table_args__ = (
+        db.Index('ix_recon_error_job_position', 'job_id', 'position'),
+        db.Index('ix_recon_error_job_priority', 'job_id', 'priority_rank', 'position'),
+        db.Index('ix_recon_error_job_type', 'job_id', 'error_type', 'position'),
+        db.Index('ix_recon_error_job_amount', 'job_id', 'amount'),
+        db.Index('ix_recon_error_job_employee', 'job_id', 'employee_name'),
+        db.Index('ix_recon_error_job_employee_key', 'job_id', 'employee_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(36), db.ForeignKey('reconciliation_job.id'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)  # order the error was generated in
+    priority_rank = db.Column(db.Integer)
+    employee_id = db.Column(db.String(100))
+    employee_key = db.Column(db.String(100))  # employee_id normalized as the join normalizes it
+    employee_name = db.Column(db.String(200))
+    error_type = db.Column(db.String(100))
+    description = db.Column(db.Text)
+    amount = db.Column(db.Float)
+    priority = db.Column(db.String(20))
+    status = db.Column(db.String(50))
+    sources_json = db.Column(db.Text)  # the Discrepancy's source references, for drill-down
+
+    # Columns shared with the Discrepancy records produced by FileProcessor
+    FIELDS = ['employee_id', 'employee_name', 'error_type', 'description', 'amount', 'priority', 'status']
+
+    def to_dict(self):
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        data['position'] = self.position  # the error's id within its run
+        data['sources'] = self.sources()
+        return data
+
+    def sources(self) -> List[Dict[str, Any]]:
+        return json.loads(self.sources_json) if self.sources_json else []
+
+    @classmethod
+    def page(cls, job_id: str, page: int = 1, per_page: int = ERRORS_PER_PAGE, priority: Optional[str] = None,
+             error_type: Optional[str] = None, employee: Optional[str] = None, sort: str = 'position') -> Dict[str, Any]:
+        """One page of a run's errors, filtered and sorted using the per-run indexes"""
+        query = cls.query.filter(cls.job_id == job_id)
+        if priority:
+            # The rank is what ix_recon_error_job_priority indexes
+            query = query.filter(cls.priority_rank == PRIORITY_RANKS[priority])
+        if error_type:
+            query = query.filter(cls.error_type == error_type)
+        if employee:
+            # An ID however it's formatted, or the start of a name; both can use an index,
+            # where a substring match scans every error of the run
+            matches = [cls.employee_name.istartswith(employee, autoescape=True)]
+            if normalize_key(employee):
+                matches.append(cls.employee_key == normalize_key(employee))
+            query = query.filter(db.or_(*matches))
+
+        column = getattr(cls, ERROR_SORTS[sort.lstrip('-')])
+        query = query.order_by(column.desc() if sort.startswith('-') else column.asc(), cls.position.asc())
+
+        per_page = max(1, min(per_page, MAX_ERRORS_PER_PAGE))
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        return {
+            'errors': [error.to_dict() for error in pagination.items],
+            'pagination': {
+                'page': pagination.page,
+                'per_page': pagination.per_page,
+                'total': pagination.total,
+                'pages': pagination.pages
+            }
+        }
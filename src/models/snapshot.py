@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from src.models.user import db
+
+
+class PeriodSnapshot(db.Model):
+    __table_args__ = (db.Index('ix_period_snapshot_group_period', 'group_name', 'period'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    group_name = db.Column(db.String(200), nullable=False)
+    period = db.Column(db.String(20), nullable=False)
+    member_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    members = db.relationship('MemberSnapshot', lazy='dynamic', cascade='all, delete-orphan')
+
+
+class MemberSnapshot(db.Model):
+    __table_args__ = (db.Index('ix_member_snapshot_key', 'snapshot_id', 'member_key'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    snapshot_id = db.Column(db.Integer, db.ForeignKey('period_snapshot.id'), nullable=False)
+    member_key = db.Column(db.String(100), nullable=False)  # normalized SSN / employee ID
+    row_hash = db.Column(db.String(32), nullable=False)     # hash of the member's joined file state
+    errors_json = db.Column(db.Text)                        # discrepancies found for the member, if any
@@ -0,0 +1,50 @@
+from datetime import datetime
+
+from src.models.user import db
+
+
+class UploadLoad(db.Model):
+    """One group's uploads for a period, stored as normalized rows"""
+    __table_args__ = (db.Index('ix_upload_load_group_period', 'group_name', 'period'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    group_name = db.Column(db.String(200), nullable=False)
+    period = db.Column(db.String(20), nullable=False)
+    payroll_rows = db.Column(db.Integer, default=0)
+    carrier_rows = db.Column(db.Integer, default=0)
+    benadmin_rows = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class UploadRow(db.Model):
+    """A payroll, carrier or benadmin row, reduced to the columns reconciliation reads"""
+    __table_args__ = (
+        # Every join and anti-join of the SQL reconciliation is a lookup on this index
+        db.Index('ix_upload_row_load_member', 'load_id', 'file_type', 'member_key', 'position'),
+        db.Index('ix_upload_row_member', 'member_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    load_id = db.Column(db.Integer, db.ForeignKey('upload_load.id'), nullable=False)
+    file_type = db.Column(db.String(10), nullable=False)   # payroll, carrier or benadmin
+    position = db.Column(db.Integer, nullable=False)       # row number in the file, from 0
+    member_key = db.Column(db.String(100), nullable=False) # normalized SSN / member ID
+    employee_id = db.Column(db.String(100))                # as it appears in the file
+    employee_name = db.Column(db.String(200))
+    birth_date = db.Column(db.String(8))                   # YYYYMMDD, '' when unknown
+    amount = db.Column(db.Float)                           # deduction total or premium, NULL when blank
+
+
+class UploadLineItem(db.Model):
+    """A row's amount for one line of coverage (see columnar.LineItems)"""
+    __table_args__ = (db.Index('ix_upload_line_item_load_member', 'load_id', 'member_key', 'line'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    load_id = db.Column(db.Integer, db.ForeignKey('upload_load.id'), nullable=False)
+    file_type = db.Column(db.String(10), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    member_key = db.Column(db.String(100), nullable=False)
+    line = db.Column(db.String(20), nullable=False)  # medical, dental, ...; '' when not tied to a line
+    plan = db.Column(db.String(100))
+    amount = db.Column(db.Float, nullable=False)
+    from_plan = db.Column(db.Boolean, default=False)  # line inferred from the plan code
@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin  # Import this
-from bcrypt import hashpw, gensalt, checkpw
+
+from src import passwords
 
 db = SQLAlchemy()
 
@@ -11,9 +12,17 @@ class User(db.Model, UserMixin):
     password_hash = db.Column(db.String(128), nullable=False)
 
     def set_password(self, password):
-        # Hash the password with a salt and store it
-        self.password_hash = hashpw(password.encode('utf-8'), gensalt())
+        # Hash the password with a salt and store it (on the bcrypt pool, see src/passwords.py)
+        self.password_hash = passwords.hash_password(password)
 
     def check_password(self, password):
         # Check a given password against the stored hash
-        return checkpw(password.encode('utf-8'), self.password_hash)
+        return passwords.check_password(password, self.password_hash)
+
+    def password_needs_rehash(self):
+        # Hashed with a cost other than BCRYPT_ROUNDS
+        return passwords.needs_rehash(self.password_hash)
+
+    def to_dict(self):
+        # The password hash never leaves the server
+        return {'id': self.id, 'username': self.username}
@@ -0,0 +1,84 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Union
+
+import bcrypt
+from flask import has_request_context, request
+
+from src.metrics import registry, timed_stage
+
+# bcrypt cost (log2 of the rounds); each step doubles the time a hash takes. 12 is bcrypt's default
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+# Hashes run at once per web worker. bcrypt releases the GIL, so these run beside
+# request threads, but more than the core count only slows every login down.
+# 0 hashes on the request thread. The pool only helps servers running several
+# requests per process (gunicorn's gthread workers, the dev server); under
+# one-request-at-a-time workers (gunicorn's default sync) requests hash inline.
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+# Hashes allowed to wait for a worker; a login burst beyond that is turned away
+# after PASSWORD_HASH_WAIT seconds rather than queueing for minutes
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 32))
+PASSWORD_HASH_WAIT = float(os.environ.get('PASSWORD_HASH_WAIT_SECONDS', 5))
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(PASSWORD_HASH_WORKERS, 1) + PASSWORD_HASH_QUEUE)
+
+
+class PasswordHashBusy(Exception):
+    """More password hashes are waiting than PASSWORD_HASH_QUEUE allows"""
+
+
+def get_hash_executor() -> ThreadPoolExecutor:
+    """Thread pool shared by every request in this web worker, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='bcrypt')
+        return _executor
+
+
+def _pooled() -> bool:
+    """True when hashes go to the pool rather than running on the calling thread"""
+    if PASSWORD_HASH_WORKERS <= 0:
+        return False
+    # A sync worker has nothing else to run while it waits; handing off only adds latency
+    return not has_request_context() or bool(request.environ.get('wsgi.multithread'))
+
+
+def _run(func, *args):
+    """Run a bcrypt call on the hash pool and wait for it"""
+    if not _pooled():
+        return func(*args)
+    if not _slots.acquire(timeout=PASSWORD_HASH_WAIT):
+        registry.inc('benefitspecs_password_hash_busy_total')
+        raise PasswordHashBusy()
+    try:
+        return get_hash_executor().submit(func, *args).result()
+    finally:
+        _slots.release()
+
+
+def _as_bytes(password_hash: Union[str, bytes]) -> bytes:
+    # Older rows hold the bytes hashpw returned; newer ones its ASCII text
+    return password_hash.encode('ascii') if isinstance(password_hash, str) else password_hash
+
+
+def hash_password(password: str, rounds: Optional[int] = None) -> str:
+    """bcrypt hash of a password, with BCRYPT_ROUNDS unless rounds is given"""
+    salt = bcrypt.gensalt(rounds or BCRYPT_ROUNDS)
+    with timed_stage('hash_password'):
+        return _run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('ascii')
+
+
+def check_password(password: str, password_hash: Union[str, bytes]) -> bool:
+    """True when the password matches the stored hash"""
+    with timed_stage('check_password'):
+        return _run(bcrypt.checkpw, password.encode('utf-8'), _as_bytes(password_hash))
+
+
+def needs_rehash(password_hash: Union[str, bytes]) -> bool:
+    """True when a stored hash was made with a cost other than BCRYPT_ROUNDS"""
+    parts = _as_bytes(password_hash).split(b'$')  # ['', '2b', cost, salt and digest]
+    return len(parts) < 4 or not parts[2].isdigit() or int(parts[2]) != BCRYPT_ROUNDS
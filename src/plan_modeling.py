@@ -0,0 +1,237 @@
+import itertools
+import json
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.census import as_of_date, census_ages, column_numbers
+from src.file_processor import FileProcessor
+from src.metrics import timed
+from src.schema_resolver import resolve_schema
+
+# Coverage tiers in array order, and the census spellings that map onto them
+TIERS = ['EE', 'ES', 'EC', 'FAM']
+TIER_ALIASES = {
+    'EE': 'EE', 'EMP': 'EE', 'EMPLOYEE': 'EE', 'EMPLOYEE ONLY': 'EE', 'SINGLE': 'EE', 'EO': 'EE',
+    'ES': 'ES', 'EE+SP': 'ES', 'EE+SPOUSE': 'ES', 'EMPLOYEE + SPOUSE': 'ES', 'EMPLOYEE SPOUSE': 'ES',
+    'EC': 'EC', 'EE+CH': 'EC', 'EE+CHILD': 'EC', 'EE+CHILDREN': 'EC', 'EMPLOYEE + CHILD': 'EC',
+    'EMPLOYEE + CHILDREN': 'EC', 'EMPLOYEE + CHILD(REN)': 'EC',
+    'FAM': 'FAM', 'FAMILY': 'FAM', 'EF': 'FAM', 'EE+FAM': 'FAM', 'EMPLOYEE + FAMILY': 'FAM'
+}
+# Multipliers on the employee-only rate when an age-banded table has no tier factors
+DEFAULT_TIER_FACTORS = {'EE': 1.0, 'ES': 2.0, 'EC': 1.8, 'FAM': 2.9}
+DEFAULT_AGE = 42.0
+DEFAULT_SALARY = 55000.0
+
+# Take-up falls off as the employee's share of premium grows relative to pay:
+# half of employees enroll when it reaches PARTICIPATION_MIDPOINT of monthly salary
+PARTICIPATION_MIDPOINT = 0.08
+PARTICIPATION_SLOPE = 40.0
+
+# Monthly rates used when the request doesn't supply its own plans
+DEFAULT_PLANS = [
+    {'name': 'PPO 500', 'tiers': {'EE': 720, 'ES': 1440, 'EC': 1300, 'FAM': 2090}},
+    {'name': 'HMO 1000', 'tiers': {'EE': 610, 'ES': 1220, 'EC': 1100, 'FAM': 1770}},
+    {'name': 'HDHP 3000', 'age_bands': [[30, 330], [40, 400], [50, 540], [60, 790], [None, 1080]]}
+]
+DEFAULT_CONTRIBUTIONS = [
+    {'type': 'percent_employee', 'value': 1.0},
+    {'type': 'percent_employee', 'value': 0.8},
+    {'type': 'percent_total', 'value': 0.8},
+    {'type': 'percent_total', 'value': 0.7},
+    {'type': 'percent_total', 'value': 0.5},
+    {'type': 'flat', 'value': 600}
+]
+DEFAULT_DESIGNS = [
+    {'name': 'Current design', 'factor': 1.0},
+    {'name': 'Higher deductible', 'factor': 0.92},
+    {'name': 'Richer copays', 'factor': 1.06}
+]
+CONTRIBUTION_TYPES = ['percent_employee', 'percent_total', 'flat']
+MAX_SCENARIOS = 5000
+SCENARIO_BLOCK = 64
+
+
+class CensusArrays:
+    """Per-employee columns the scenario engine needs"""
+
+    def __init__(self, ages: np.ndarray, salaries: np.ndarray, tiers: np.ndarray):
+        self.ages = ages
+        self.salaries = salaries
+        self.tiers = tiers  # index into TIERS
+
+    def __len__(self) -> int:
+        return len(self.ages)
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict], as_of: date) -> 'CensusArrays':
+        if not rows:
+            raise ValueError('The census file has no employee rows')
+        schema = resolve_schema(list(rows[0].keys()), 'census')
+
+        # Missing ages and salaries take the group median so every employee is priced
+        ages = census_ages(rows, schema, as_of)
+        ages[np.isnan(ages)] = np.nanmedian(ages) if not np.isnan(ages).all() else DEFAULT_AGE
+        salaries = column_numbers(rows, schema.salary)
+        salaries[~(salaries > 0)] = np.nanmedian(salaries[salaries > 0]) if (salaries > 0).any() else DEFAULT_SALARY
+
+        if schema.tier:
+            tiers = np.array([TIERS.index(TIER_ALIASES.get(row[schema.tier].upper(), 'EE')) for row in rows])
+        elif schema.dependents:
+            # No tier column: anyone with dependents is assumed to take family coverage
+            dependents = column_numbers(rows, schema.dependents)
+            tiers = np.where(dependents > 0, TIERS.index('FAM'), TIERS.index('EE'))
+        else:
+            tiers = np.zeros(len(rows), dtype=np.intp)
+        return cls(ages, salaries, tiers.astype(np.intp))
+
+
+class RateTable:
+    """Monthly plan rates, either by coverage tier or by age band with tier factors"""
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.name = spec.get('name') or 'Unnamed plan'
+        self.tier_rates = spec.get('tiers')
+        self.age_bands = spec.get('age_bands')
+        if not self.tier_rates and not self.age_bands:
+            raise ValueError(f"Plan '{self.name}' needs either 'tiers' or 'age_bands' rates")
+        factors = dict(DEFAULT_TIER_FACTORS, **spec.get('tier_factors', {}))
+        self.tier_factors = np.array([float(factors[tier]) for tier in TIERS])
+
+    def monthly_rates(self, census: CensusArrays) -> Tuple[np.ndarray, np.ndarray]:
+        """(rate at each employee's tier, employee-only rate) for every employee"""
+        if self.tier_rates:
+            by_tier = np.array([float(self.tier_rates.get(tier, 0)) for tier in TIERS])
+            employee_only = np.full(len(census), by_tier[0])
+            return by_tier[census.tiers], employee_only
+
+        # Age bands are [upper age, rate] pairs; a null upper bound closes the table
+        uppers = np.array([upper for upper, _ in self.age_bands if upper is not None], dtype=np.float64)
+        rates = np.array([float(rate) for _, rate in self.age_bands])
+        employee_only = rates[np.minimum(np.searchsorted(uppers, census.ages, side='right'), len(rates) - 1)]
+        return employee_only * self.tier_factors[census.tiers], employee_only
+
+
+def scenario_grid(plans: List[RateTable], contributions: List[Dict], designs: List[Dict]) -> List[Dict]:
+    """Every plan x contribution strategy x plan-design combination"""
+    for contribution in contributions:
+        if contribution.get('type') not in CONTRIBUTION_TYPES:
+            raise ValueError(f"Unknown contribution type '{contribution.get('type')}', "
+                             f"expected one of {', '.join(CONTRIBUTION_TYPES)}")
+    scenarios = [{'plan': plan_index, 'contribution': contribution, 'design': design}
+                 for (plan_index, _), contribution, design
+                 in itertools.product(enumerate(plans), contributions, designs)]
+    if len(scenarios) > MAX_SCENARIOS:
+        raise ValueError(f"{len(scenarios)} scenarios requested; the limit is {MAX_SCENARIOS}")
+    return scenarios
+
+
+def evaluate_scenarios(census: CensusArrays, plans: List[RateTable], scenarios: List[Dict]) -> List[Dict[str, Any]]:
+    """Project premium, employer cost and participation for every scenario x employee at once"""
+    # Rates per plan are computed once: (plans, employees)
+    plan_rates, plan_employee_only = zip(*(plan.monthly_rates(census) for plan in plans))
+    plan_rates, plan_employee_only = np.vstack(plan_rates), np.vstack(plan_employee_only)
+
+    plan_index = np.array([scenario['plan'] for scenario in scenarios], dtype=np.intp)
+    factor = np.array([float(scenario['design'].get('factor', 1.0)) for scenario in scenarios])[:, None]
+    kind = np.array([CONTRIBUTION_TYPES.index(scenario['contribution']['type']) for scenario in scenarios])[:, None]
+    value = np.array([float(scenario['contribution']['value']) for scenario in scenarios])[:, None]
+    monthly_pay = census.salaries / 12
+
+    annual_premium = np.empty(len(scenarios))
+    annual_employer = np.empty(len(scenarios))
+    expected_enrolled = np.empty(len(scenarios))
+    median_share = np.empty(len(scenarios))
+    # Blocks of scenarios keep the (scenarios, employees) matrices to a few MB each
+    for start in range(0, len(scenarios), SCENARIO_BLOCK):
+        block = slice(start, start + SCENARIO_BLOCK)
+        premium = plan_rates[plan_index[block]] * factor[block]
+        employee_only = plan_employee_only[plan_index[block]] * factor[block]
+        employer = np.select([kind[block] == 0, kind[block] == 1],
+                             [value[block] * employee_only, value[block] * premium], default=value[block])
+        employer = np.clip(employer, 0, premium)
+
+        # Expected enrollment per employee from their share of monthly pay
+        pay_share = (premium - employer) / monthly_pay
+        participation = 1 / (1 + np.exp(PARTICIPATION_SLOPE * (pay_share - PARTICIPATION_MIDPOINT)))
+
+        annual_premium[block] = (participation * premium).sum(axis=1) * 12
+        annual_employer[block] = (participation * employer).sum(axis=1) * 12
+        expected_enrolled[block] = participation.sum(axis=1)
+        median_share[block] = np.median(pay_share, axis=1)
+
+    results = []
+    for position, scenario in enumerate(scenarios):
+        enrolled = float(expected_enrolled[position])
+        results.append({
+            'scenario': position + 1,
+            'plan': plans[scenario['plan']].name,
+            'contribution': scenario['contribution'],
+            'design': scenario['design'].get('name', f"x{scenario['design'].get('factor', 1.0)}"),
+            'participation': round(enrolled / len(census) * 100, 1),
+            'expected_enrolled': round(enrolled),
+            'annual_premium': round(float(annual_premium[position])),
+            'employer_cost': round(float(annual_employer[position])),
+            'employee_cost': round(float(annual_premium[position] - annual_employer[position])),
+            'employer_cost_per_enrollee': round(float(annual_employer[position]) / enrolled) if enrolled else None,
+            'median_pay_share': round(float(median_share[position]) * 100, 2)
+        })
+    return results
+
+
+def parse_json_option(value: Optional[str], default: Any, name: str) -> Any:
+    """A JSON form field, or the default when it wasn't sent"""
+    if not value:
+        return default
+    try:
+        return json.loads(value)
+    except ValueError:
+        raise ValueError(f"'{name}' is not valid JSON")
+
+
+def parse_json_list(value: Optional[str], name: str, key: Optional[str] = None) -> Optional[List[Dict]]:
+    """A JSON form field holding a list of objects (or {key: [...]}), None when it wasn't sent"""
+    parsed = parse_json_option(value, None, name)
+    if key and isinstance(parsed, dict) and key in parsed:
+        parsed = parsed[key]
+    if parsed is None:
+        return None
+    if not isinstance(parsed, list) or not all(isinstance(item, dict) for item in parsed):
+        raise ValueError(f"'{name}' must be a JSON list of objects")
+    return parsed
+
+
+@timed('analyze_benefits')
+def analyze_benefits(census_file, period: Optional[str] = None, plans: Optional[List[Dict]] = None,
+                     contributions: Optional[List[Dict]] = None, designs: Optional[List[Dict]] = None) -> Dict[str, Any]:
+    """Evaluate the scenario grid against a census upload"""
+    rows = list(FileProcessor().iter_csv_rows(census_file, 'census'))
+    census = CensusArrays.from_rows(rows, as_of_date(period))
+    del rows
+
+    rate_tables = [RateTable(spec) for spec in (plans or DEFAULT_PLANS)]
+    scenarios = scenario_grid(rate_tables, contributions or DEFAULT_CONTRIBUTIONS, designs or DEFAULT_DESIGNS)
+    results = evaluate_scenarios(census, rate_tables, scenarios)
+
+    # Recommend the cheapest scenario per enrollee among those keeping participation near the best
+    best_participation = max(result['participation'] for result in results)
+    eligible = [result for result in results if result['participation'] >= best_participation - 10]
+    # (a scenario nobody enrolls in has no cost per enrollee; $0 is a real, and the best, cost)
+    recommended = min(eligible, key=lambda result: float('inf') if result['employer_cost_per_enrollee'] is None
+                      else result['employer_cost_per_enrollee'])
+
+    return {
+        'summary': {
+            'total_employees': len(census),
+            'plans_compared': len(rate_tables),
+            'scenarios_evaluated': len(results),
+            'recommended_scenario': recommended['scenario'],
+            'estimated_participation': recommended['participation'],
+            'estimated_annual_premium': recommended['annual_premium'],
+            'estimated_employer_cost': recommended['employer_cost']
+        },
+        'tier_mix': {tier: int(count) for tier, count in zip(TIERS, np.bincount(census.tiers, minlength=len(TIERS)))},
+        'recommended': recommended,
+        'scenarios': sorted(results, key=lambda result: result['employer_cost'])
+    }
@@ -0,0 +1,68 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Slotted records for what FileProcessor holds per member. A million employees or
+# discrepancies as dicts spend most of their memory on per-dict hash tables;
+# discrepancies become dicts only where they are stored or returned as JSON.
+
+# A payroll deduction: (column, amount). A plain tuple of a string and a float
+# is untracked by the garbage collector, unlike a small object.
+Deduction = Tuple[str, float]
+# Where a discrepancy's data came from: (file type, row from 0, byte offset of the row
+# in the upload or None when unknown, as for X12 files)
+SourceRef = Tuple[str, int, Optional[int]]
+
+
+class Employee:
+    """One member extracted from a payroll, benadmin or carrier row"""
+    __slots__ = ('employee_id', 'name', 'salary', 'deductions', 'source', 'member_key')
+
+    def __init__(self, employee_id: str, name: str, salary: Optional[float] = None,
+                 deductions: Tuple[Deduction, ...] = (), source: Optional[str] = None):
+        self.employee_id = employee_id
+        self.name = name
+        self.salary = salary
+        self.deductions = deductions
+        self.source = source
+        self.member_key: Optional[str] = None  # set by identity resolution
+
+
+class Discrepancy:
+    """One reconciliation error; fields match ReconciliationError.FIELDS, plus the source rows behind it"""
+    __slots__ = ('employee_id', 'employee_name', 'error_type', 'description', 'amount', 'priority', 'status',
+                 'sources')
+
+    def __init__(self, employee_id: str, employee_name: str, error_type: str, description: str = '',
+                 amount: float = 0.0, priority: str = '', status: str = 'Pending Review',
+                 sources: Tuple[SourceRef, ...] = ()):
+        self.employee_id = employee_id
+        self.employee_name = employee_name
+        self.error_type = error_type
+        self.description = description
+        self.amount = amount
+        self.priority = priority
+        self.status = status
+        self.sources = sources
+
+    def to_dict(self, sources: bool = True) -> Dict[str, Any]:
+        data = {field: getattr(self, field) for field in self.__slots__[:-1]}
+        if sources:
+            data['sources'] = source_dicts(self.sources)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Discrepancy':
+        fields = {field: data[field] for field in cls.__slots__[:-1] if field in data}
+        return cls(sources=source_refs(data.get('sources')), **fields)
+
+    def __repr__(self):
+        return f"Discrepancy({self.employee_id!r}, {self.error_type!r}, {self.amount!r})"
+
+
+def source_dicts(sources: Iterable[SourceRef]) -> List[Dict[str, Any]]:
+    """Source references as JSON objects"""
+    return [{'file': file_type, 'row': row, 'offset': offset} for file_type, row, offset in sources]
+
+
+def source_refs(data: Optional[Iterable[Dict[str, Any]]]) -> Tuple[SourceRef, ...]:
+    """Source references back from their JSON objects"""
+    return tuple((source['file'], source['row'], source.get('offset')) for source in data or ())
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Bump when FileProcessor output changes so stale entries stop matching
+CACHE_VERSION = 2
+CHUNK_SIZE = 1024 * 1024
+
+CACHE_DIR = os.environ.get('RESULT_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'database', 'result_cache'))
+MEMORY_LIMIT_BYTES = int(os.environ.get('RESULT_CACHE_MEMORY_MB', 64)) * 1024 * 1024
+DISK_LIMIT_BYTES = int(os.environ.get('RESULT_CACHE_DISK_MB', 512)) * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(files: Dict[str, Any], options: Dict[str, Any]) -> str:
+    """SHA-256 over every uploaded file's bytes plus the run options"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps({'version': CACHE_VERSION, 'options': options}, sort_keys=True).encode('utf-8'))
+    for field in sorted(files):
+        file_obj = files[field]
+        stream = getattr(file_obj, 'stream', file_obj)
+        digest.update(f"\x00{field}\x00".encode('utf-8'))
+        file_obj.seek(0)
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:  # b'' or, from a text-mode stream, ''
+                break
+            digest.update(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        file_obj.seek(0)
+    return digest.hexdigest()
+
+
+def seed_for(key: str) -> int:
+    """Deterministic FileProcessor seed for a content key"""
+    return int(key[:16], 16)
+
+
+class ResultCache:
+    """Two-tier cache: a size-bounded in-memory LRU in front of a JSON file per entry on disk"""
+
+    def __init__(self, directory: str = CACHE_DIR, memory_limit: int = MEMORY_LIMIT_BYTES,
+                 disk_limit: int = DISK_LIMIT_BYTES):
+        self.directory = directory
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()  # key -> (value, size)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        try:
+            with open(self._path(key), 'rb') as handle:
+                raw = handle.read()
+            os.utime(self._path(key))  # keep disk eviction least-recently-used
+            value = json.loads(raw)
+        except (OSError, ValueError):
+            return None  # missing or unreadable: recomputed and rewritten
+        self._remember(key, value, len(raw))
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Cache a result; a cache that can't be written only costs a recompute, so failures are logged"""
+        try:
+            raw = json.dumps(value).encode('utf-8')
+        except (TypeError, ValueError) as e:
+            logger.warning("Result for %s is not cacheable: %s", key, e)
+            return
+        self._remember(key, value, len(raw))
+
+        # Write atomically so another worker never reads a partial file
+        tmp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(raw)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning("Could not write result cache entry %s: %s", key, e)
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            return
+        self._prune_disk()
+
+    def invalidate(self, key: str):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._memory_bytes -= entry[1]
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _remember(self, key: str, value: Dict[str, Any], size: int):
+        """Add to the memory tier, evicting least recently used entries past the byte limit"""
+        if size > self.memory_limit:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._memory_bytes += size
+            while self._memory_bytes > self.memory_limit:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._memory_bytes -= evicted_size
+
+    def _prune_disk(self):
+        """Drop the oldest files once the disk tier is over its limit"""
+        try:
+            entries = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.json')]
+            stats = sorted(((os.stat(path), path) for path in entries), key=lambda item: item[0].st_mtime)
+        except OSError:
+            return
+        total = sum(stat.st_size for stat, _ in stats)
+        for stat, path in stats:
+            if total <= self.disk_limit:
+                break
+            try:
+                os.remove(path)
+                total -= stat.st_size
+            except OSError:
+                pass
+
+
+result_cache = ResultCache()
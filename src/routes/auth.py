@@ -0,0 +1,66 @@
+from flask import Blueprint, request, jsonify
+# --- IMPORTS FOR AUTHENTICATION ---
+from flask_login import login_user, logout_user, login_required, current_user
+
+from src.models.user import db, User
+
+auth_bp = Blueprint('auth', __name__)
+
+@auth_bp.route('/register', methods=['POST'])
+def register():
+    """Registers a new user."""
+    data = request.get_json()
+    if not data or not data.get('username') or not data.get('password'):
+        return jsonify({"error": "Username and password are required"}), 400
+
+    username = data.get('username')
+    password = data.get('password')
+
+    if User.query.filter_by(username=username).first():
+        return jsonify({"error": "Username already exists"}), 409
+
+    new_user = User(username=username)
+    new_user.set_password(password)  # Use the method from your User model
+    db.session.add(new_user)
+    db.session.commit()
+
+    return jsonify({"message": f"User '{username}' registered successfully"}), 201
+
+@auth_bp.route('/login', methods=['POST'])
+def login():
+    """Logs in a user and creates a session."""
+    data = request.get_json()
+    if not data or not data.get('username') or not data.get('password'):
+        return jsonify({"error": "Username and password are required"}), 400
+
+    username = data.get('username')
+    password = data.get('password')
+    user = User.query.filter_by(username=username).first()
+
+    # Use the check_password method from your User model
+    if user and user.check_password(password):
+        if user.password_needs_rehash():
+            # Move the stored hash to the configured work factor while we have the password
+            user.set_password(password)
+            db.session.commit()
+        login_user(user)  # This function from Flask-Login creates the session cookie
+        return jsonify({"message": f"Welcome, {user.username}!", "user": {"id": user.id, "username": user.username}}), 200
+
+    return jsonify({"error": "Invalid username or password"}), 401
+
+@auth_bp.route('/logout', methods=['POST'])
+@login_required  # Ensures only logged-in users can access this
+def logout():
+    """Logs out the current user by clearing the session."""
+    logout_user()  # This function from Flask-Login clears the session
+    return jsonify({"message": "Successfully logged out"}), 200
+
+@auth_bp.route('/profile')
+@login_required  # This is an example of a protected route
+def profile():
+    """Returns the profile of the currently logged-in user."""
+    # `current_user` is a proxy from Flask-Login to the logged-in user object
+    return jsonify({
+        "id": current_user.id,
+        "username": current_user.username
+    })
@@ -1,16 +1,47 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 import random
+import shutil
 import sys
 import os
+import zipfile
 
 # Add the src directory to the path to import file_processor
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-from src.file_processor import FileProcessor
+from src.exports import iter_csv, iter_ndjson
+from src.models.reconciliation import (ERROR_SORTS, ERRORS_PER_PAGE, PRIORITY_RANKS, ReconciliationError,
+                                       ReconciliationJob)
+from src.models.user import db
+from src.records import source_refs
+from src.result_cache import content_key, result_cache, seed_for
+from src.snapshots import find_previous_snapshot, load_snapshot
+
+# The reconciliation, census and plan engines (numpy, process pools) are imported
+# by the views that use them, on first use, so workers boot without them. A
+# preloading gunicorn master imports these up front for its workers to share.
+DEFERRED_IMPORTS = ['src.batch', 'src.census', 'src.file_processor', 'src.jobs', 'src.plan_modeling',
+                    'src.source_rows', 'src.sql_reconciliation', 'src.upload_store']
 
 benefitspecs_bp = Blueprint('benefitspecs', __name__)
 
+def request_flag(name):
+    """True when a form field or query parameter is set to a truthy value"""
+    return request.form.get(name, request.args.get(name, '')).lower() in ('1', 'true', 'yes')
+
+def uploaded_census_file():
+    """The census upload; the census and benefit forms post it as payroll_file"""
+    for field in ('census_file', 'payroll_file'):
+        if field in request.files and request.files[field].filename:
+            return request.files[field]
+    return None
+
 @benefitspecs_bp.route('/reconciliation', methods=['POST'])
 def reconciliation():
+    from src.file_processor import FileProcessor
+    from src.jobs import record_completed_run, submit_reconciliation
+    from src.source_rows import locate_sources, retain_uploads
+    from src.sql_reconciliation import reconcile_load
+    from src.upload_store import load_uploads
+    
     try:
         # Handle FormData from frontend
         group_name = request.form.get('group_name', 'Demo Group')
@@ -36,40 +67,223 @@ def reconciliation():
         if num_files < 2:
             return jsonify({'success': False, 'error': 'Please upload at least 2 files for reconciliation'})
         
-        # Process actual uploaded files
-        processor = FileProcessor()
-        analysis_data = processor.process_files(uploaded_files)
+        run_async = request_flag('async')
+        # SQL mode stores the uploads as rows and compares them with queries in the database
+        use_sql = request_flag('sql')
+        if use_sql and request_flag('delta'):
+            return jsonify({'success': False, 'error': 'Delta mode is not available with SQL reconciliation'}), 400
+        
+        # Delta mode diffs against the group's latest earlier snapshot
+        previous = find_previous_snapshot(group_name, period) if request_flag('delta') else None
+        
+        # Identical uploads for the same group, period and baseline reuse the stored run
+        cache_key = content_key(uploaded_files, {'group_name': group_name, 'period': period,
+                                                 'delta_from': previous.id if previous else None,
+                                                 'sql': use_sql})
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            cached_job = ReconciliationJob.query.get(cached['job_id'])
+            if cached_job is not None:
+                return {
+                    'success': True,
+                    'data': cached_job.to_dict() if run_async else cached
+                }
+            result_cache.invalidate(cache_key)
+        
+        previous_snapshot = load_snapshot(previous) if previous else None
+        
+        # Asynchronous mode: queue the job and let the client poll for the result
+        if run_async:
+            job = submit_reconciliation(current_app._get_current_object(), uploaded_files, group_name, period,
+                                        cache_key, previous_snapshot, sql=use_sql)
+            return jsonify({'success': True, 'data': job.to_dict()}), 202
+        
+        if use_sql:
+            # Loaded in the same transaction that stores the run
+            connection = db.session.connection()
+            analysis_data = reconcile_load(connection, load_uploads(connection, group_name, period, uploaded_files))
+        else:
+            # Process actual uploaded files, streaming rows straight from the upload.
+            # Seeding from the content key keeps fallback amounts stable for the cache.
+            processor = FileProcessor(seed=seed_for(cache_key))
+            analysis_data = processor.process_files(uploaded_files, streaming=True,
+                                                    previous_snapshot=previous_snapshot, snapshot=True)
+        locate_sources(analysis_data['errors'], uploaded_files)
         
         # Add metadata
         analysis_data['group_name'] = group_name
         analysis_data['period'] = period
         
+        # Store the run server-side; the response carries the summary and first page of errors
+        job = record_completed_run(group_name, period, analysis_data)
+        retain_uploads(job.id, uploaded_files)
+        result = job.to_dict()['result']
+        result['job_id'] = job.id
+        result_cache.put(cache_key, result)
+        
         return {
             'success': True,
-            'data': analysis_data
+            'data': result
         }
         
     except Exception as e:
         return jsonify({'success': False, 'error': f'Error processing files: {str(e)}'})
 
+@benefitspecs_bp.route('/reconciliation/batch', methods=['POST'])
+def reconciliation_batch():
+    """Reconcile many groups at once, streaming one NDJSON summary per group as it finishes"""
+    from src.batch import BATCH_WORKERS, new_batch_directory, spool_archive, spool_manifest, stream_batch
+    
+    period = request.form.get('period', '2025-07')
+    archive = request.files.get('archive')
+    manifest = request.files.get('manifest')
+    if not (archive and archive.filename) and not (manifest and manifest.filename):
+        return jsonify({'success': False,
+                        'error': 'Upload a zip archive of group folders, or a manifest with its files'}), 400
+    max_workers = max(1, min(request.form.get('max_workers', BATCH_WORKERS, type=int), BATCH_WORKERS))
+    
+    # Every group's files are on disk before the first worker starts
+    directory = new_batch_directory()
+    try:
+        if archive and archive.filename:
+            groups = spool_archive(archive.stream, directory, period, request.form.get('group_name', 'Demo Group'))
+        else:
+            uploads = [upload for field, upload in request.files.items(multi=True) if field != 'manifest']
+            groups = spool_manifest(manifest.stream, uploads, directory, period)
+    except (zipfile.BadZipFile, ValueError) as e:
+        shutil.rmtree(directory, ignore_errors=True)
+        return jsonify({'success': False, 'error': f'Error reading batch: {str(e)}'}), 400
+    if not groups:
+        shutil.rmtree(directory, ignore_errors=True)
+        return jsonify({'success': False, 'error': 'No groups found in the batch'}), 400
+    
+    body = stream_batch(groups, directory, request_flag('delta'), max_workers)
+    return Response(stream_with_context(body), mimetype='application/x-ndjson')
+
+@benefitspecs_bp.route('/reconciliation/<job_id>', methods=['GET'])
+def reconciliation_status(job_id):
+    job = ReconciliationJob.query.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Reconciliation job not found'}), 404
+    
+    return {
+        'success': True,
+        'data': job.to_dict()
+    }
+
+@benefitspecs_bp.route('/reconciliation/<job_id>', methods=['DELETE'])
+def delete_reconciliation(job_id):
+    """Remove a finished run, its stored errors and its retained uploads"""
+    from src.source_rows import remove_sources
+    
+    job = ReconciliationJob.query.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Reconciliation job not found'}), 404
+    if job.status == 'queued':
+        return jsonify({'success': False, 'error': 'The reconciliation is still running'}), 409
+    
+    ReconciliationError.query.filter_by(job_id=job.id).delete(synchronize_session=False)
+    db.session.delete(job)
+    db.session.commit()
+    remove_sources(job_id)
+    return '', 204
+
+@benefitspecs_bp.route('/reconciliation/<job_id>/errors', methods=['GET'])
+def reconciliation_errors(job_id):
+    job = ReconciliationJob.query.get(job_id)
+    if job is None or job.status != 'completed':
+        return jsonify({'success': False, 'error': 'Completed reconciliation not found'}), 404
+    
+    sort = request.args.get('sort', 'position')
+    if sort.lstrip('-') not in ERROR_SORTS:
+        return jsonify({'success': False, 'error': f"Sort must be one of: {', '.join(ERROR_SORTS)}"}), 400
+    priority = request.args.get('priority')
+    if priority and priority not in PRIORITY_RANKS:
+        return jsonify({'success': False, 'error': f"Priority must be one of: {', '.join(PRIORITY_RANKS)}"}), 400
+    
+    page = ReconciliationError.page(
+        job.id,
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', ERRORS_PER_PAGE, type=int),
+        priority=priority,
+        error_type=request.args.get('error_type'),
+        employee=request.args.get('employee'),
+        sort=sort
+    )
+    
+    return {
+        'success': True,
+        'data': page
+    }
+
+@benefitspecs_bp.route('/reconciliation/<job_id>/errors/<int:position>/sources', methods=['GET'])
+def reconciliation_error_sources(job_id, position):
+    """The payroll, carrier and benadmin rows behind one error, read straight from the retained uploads"""
+    from src.source_rows import read_source_rows
+    
+    error = ReconciliationError.query.filter_by(job_id=job_id, position=position).first()
+    if error is None:
+        return jsonify({'success': False, 'error': 'Reconciliation error not found'}), 404
+    
+    rows = read_source_rows(job_id, source_refs(error.sources()))
+    if rows is None:
+        return jsonify({'success': False, 'error': 'The uploads for this reconciliation are no longer retained'}), 410
+    
+    return {
+        'success': True,
+        'data': {'error': error.to_dict(), 'sources': rows}
+    }
+
+@benefitspecs_bp.route('/reconciliation/<job_id>/errors/export', methods=['GET'])
+def export_reconciliation_errors(job_id):
+    job = ReconciliationJob.query.get(job_id)
+    if job is None or job.status != 'completed':
+        return jsonify({'success': False, 'error': 'Completed reconciliation not found'}), 404
+    
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'success': False, 'error': "Export format must be 'csv' or 'ndjson'"}), 400
+    
+    # Rows are read in batches and written as they arrive rather than built up in memory
+    columns = [getattr(ReconciliationError, field) for field in ReconciliationError.FIELDS]
+    errors = (db.session.query(*columns)
+              .filter(ReconciliationError.job_id == job.id)
+              .order_by(ReconciliationError.position)
+              .yield_per(1000))
+    if export_format == 'csv':
+        body, mimetype = iter_csv(errors), 'text/csv'
+    else:
+        body, mimetype = iter_ndjson(errors), 'application/x-ndjson'
+    
+    filename = f"{job.group_name}_{job.period}_Reconciliation_Errors.{export_format}".replace(' ', '_')
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
 @benefitspecs_bp.route('/census', methods=['POST'])
 def census():
+    from src.census import analyze_census
+    
     try:
         # Handle FormData from frontend
         group_name = request.form.get('group_name', 'Demo Group')
         period = request.form.get('period', '2025-07')
         
-        # Mock census data
+        census_file = uploaded_census_file()
+        if census_file is None:
+            return jsonify({'success': False, 'error': 'Please upload a census file'})
+        
+        # Ages and tenure are measured as of the start of the period
+        census_period = request.form.get('month_year') or period
+        analysis = analyze_census(census_file, census_period)
+        summary = analysis['summary']
+        
         return {
             'success': True,
-            'data': {
-                'group_name': group_name,
-                'period': period,
-                'total_employees': 1000,
-                'average_age': 42.3,
-                'average_salary': 62500,
-                'average_tenure': 5.2
-            }
+            'data': dict(analysis, group_name=group_name, period=census_period,
+                         total_employees=summary['total_employees'],
+                         average_age=summary['average_age'],
+                         average_salary=summary['average_salary'],
+                         average_tenure=summary['average_tenure'])
         }
         
     except Exception as e:
@@ -77,22 +291,38 @@ def census():
 
 @benefitspecs_bp.route('/benefit-analysis', methods=['POST'])
 def benefit_analysis():
+    from src.plan_modeling import analyze_benefits, parse_json_list
+    
     try:
         # Handle FormData from frontend
         group_name = request.form.get('group_name', 'Demo Group')
         period = request.form.get('period', '2025-07')
         
-        # Mock benefits data
+        census_file = uploaded_census_file()
+        if census_file is None:
+            return jsonify({'success': False, 'error': 'Please upload a census file'})
+        
+        # Rate tables come from a JSON upload or form field; the built-in plans are used otherwise
+        rate_file = request.files.get('rate_file')
+        rate_tables = rate_file.read().decode('utf-8-sig') if rate_file and rate_file.filename else request.form.get('rate_tables')
+        try:
+            plans = parse_json_list(rate_tables, 'rate_tables', key='plans')
+            contributions = parse_json_list(request.form.get('contributions'), 'contributions')
+            designs = parse_json_list(request.form.get('designs'), 'designs')
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        analysis_period = request.form.get('month_year') or period
+        analysis = analyze_benefits(census_file, analysis_period, plans, contributions, designs)
+        summary = analysis['summary']
+        
         return {
             'success': True,
-            'data': {
-                'group_name': group_name,
-                'period': period,
-                'total_employees': 1000,
-                'recommended_plans': 5,
-                'estimated_participation': 78,
-                'annual_premium': 450000
-            }
+            'data': dict(analysis, group_name=group_name, period=analysis_period,
+                         total_employees=summary['total_employees'],
+                         recommended_plans=summary['plans_compared'],
+                         estimated_participation=summary['estimated_participation'],
+                         annual_premium=summary['estimated_annual_premium'])
         }
         
     except Exception as e:
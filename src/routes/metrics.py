@@ -0,0 +1,21 @@
+import hmac
+
+from flask import Blueprint, Response, abort, current_app, request
+
+from src.metrics import render_prometheus
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint, merged across every worker process on this host
+
+    Off unless METRICS_TOKEN is set; scrapers send it as a bearer token.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        abort(404)
+    sent = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(sent.encode('utf-8'), f"Bearer {token}".encode('utf-8')):
+        return Response('Unauthorized\n', 401, {'WWW-Authenticate': 'Bearer'}, mimetype='text/plain')
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, request
 from src.models.user import User, db
+from src.user_cache import user_cache
 
 user_bp = Blueprint('user', __name__)
 
@@ -27,8 +28,9 @@ def update_user(user_id):
     user = User.query.get_or_404(user_id)
     data = request.json
     user.username = data.get('username', user.username)
-    user.email = data.get('email', user.email)
     db.session.commit()
+    # Also dropped at flush; this covers a request that re-cached the old row before the commit
+    user_cache.invalidate(user_id)
     return jsonify(user.to_dict())
 
 @user_bp.route('/users/<int:user_id>', methods=['DELETE'])
@@ -36,4 +38,5 @@ def delete_user(user_id):
     user = User.query.get_or_404(user_id)
     db.session.delete(user)
     db.session.commit()
+    user_cache.invalidate(user_id)
     return '', 204
@@ -0,0 +1,196 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+# Column name fragments for each role. Matching is substring based, the same
+# way the extractors have always recognised columns.
+SSN_PATTERNS = ['ssn', 'social', 'security']
+ID_PATTERNS = SSN_PATTERNS + ['id', 'emp', 'employee', 'number']
+CARRIER_ID_PATTERNS = ID_PATTERNS + ['member']
+NAME_PATTERNS = ['name', 'first', 'last', 'full']
+SALARY_PATTERNS = ['salary', 'wage', 'pay', 'gross', 'amount']
+DEDUCTION_PATTERNS = ['deduction', 'medical', 'premium', 'benefit']
+DEDUCTION_DETAIL_PATTERNS = ['deduction', 'benefit', 'insurance', 'premium']
+PREMIUM_PATTERNS = ['premium', 'amount', 'cost', 'rate']
+PLAN_PATTERNS = ['plan', 'coverage', 'tier']
+TIER_PATTERNS = ['tier', 'coverage level', 'enrollment level']
+DEPENDENT_PATTERNS = ['dependent', 'deps']
+DEPENDENT_ID_WORDS = ['id', 'ssn', 'social', 'security']
+# Matched as whole words so 'wage' and 'coverage' don't count as ages
+AGE_WORDS = ['age']
+TENURE_WORDS = ['tenure', 'service', 'yos']
+DATE_PATTERNS = {
+    'birth_date': ['birth', 'dob'],
+    'hire_date': ['hire'],
+    'effective_date': ['effective', 'start'],
+    'termination_date': ['term', 'end date']
+}
+
+# Lines of coverage, tried in order: a header or plan code belongs to the first line
+# with a prefix that starts one of its words ('Dental Deduction', 'DEN-PPO', 'HLT')
+COVERAGE_LINES = [
+    ('dental', ['den', 'dcp']),
+    ('vision', ['vis']),
+    ('life', ['lif']),
+    ('disability', ['disab', 'std', 'ltd']),
+    ('medical', ['med', 'health', 'hlt', 'hmo', 'ppo', 'epo', 'hdhp', 'rx'])
+]
+# Line codes used by the columnar tables; 0 is an amount whose line isn't stated
+LINE_NAMES = [''] + [line for line, _ in COVERAGE_LINES]
+
+# Date layouts seen in uploads, tried in order
+DATE_FORMATS = ['%m/%d/%Y', '%Y-%m-%d', '%m/%d/%y', '%m-%d-%Y', '%Y/%m/%d']
+
+MAX_CACHED_SCHEMAS = 256
+
+_schema_cache: 'OrderedDict[str, ColumnSchema]' = OrderedDict()
+# Parse pool threads and threaded requests resolve schemas at the same time
+_schema_cache_lock = threading.Lock()
+
+
+def _matching(headers: Sequence[str], patterns: List[str]) -> List[str]:
+    return [h for h in headers if any(x in h for x in patterns)]
+
+
+@lru_cache(maxsize=4096)
+def coverage_line(text: str) -> str:
+    """Line of coverage a header or plan code names, or '' when it names none"""
+    words = [w for w in re.split(r'[^a-z0-9]+', (text or '').lower()) if w]
+    for line, prefixes in COVERAGE_LINES:
+        if any(w.startswith(prefix) for w in words for prefix in prefixes):
+            return line
+    return ''
+
+
+def _matching_words(headers: Sequence[str], words: List[str]) -> List[str]:
+    return [h for h in headers if any(w in re.split(r'[^a-z0-9]+', h) for w in words)]
+
+
+class ColumnSchema:
+    """Column roles resolved once from a file header"""
+
+    def __init__(self, headers: Sequence[str], file_type: str):
+        self.headers = list(headers)
+        self.file_type = file_type
+
+        # Member attributes first: 'Number of Dependents' or 'Employee Age' is never an identifier
+        tier_columns = _matching(headers, TIER_PATTERNS)
+        # 'Dependent SSN' identifies a dependent; it isn't a count of them
+        dependent_columns = [h for h in _matching(headers, DEPENDENT_PATTERNS)
+                             if not _matching_words([h], DEPENDENT_ID_WORDS)]
+        age_columns = _matching_words(headers, AGE_WORDS)
+        tenure_columns = _matching_words(headers, TENURE_WORDS)
+        attribute_columns = set(tier_columns + dependent_columns + age_columns + tenure_columns)
+
+        # Identifier: prefer SSN columns over generic employee/member numbers
+        id_patterns = CARRIER_ID_PATTERNS if file_type == 'carrier' else ID_PATTERNS
+        id_columns = [h for h in _matching(headers, id_patterns) if h not in attribute_columns]
+        ssn_columns = _matching(id_columns, SSN_PATTERNS)
+        self.ssn: Optional[str] = ssn_columns[0] if ssn_columns else None
+        other_ids = [h for h in id_columns if h not in ssn_columns]
+        self.employee_id: Optional[str] = other_ids[0] if other_ids else None
+        self.id_column: Optional[str] = self.ssn or (id_columns[0] if id_columns else None)
+
+        # Names: explicit first/last columns win, otherwise fall back to header order
+        self.name_columns = _matching(headers, NAME_PATTERNS)
+        firsts = [h for h in self.name_columns if 'first' in h]
+        lasts = [h for h in self.name_columns if 'last' in h]
+        fulls = [h for h in self.name_columns if h not in firsts and h not in lasts]
+        self.first_name: Optional[str] = firsts[0] if firsts else None
+        self.last_name: Optional[str] = lasts[0] if lasts else None
+        self.full_name: Optional[str] = fulls[0] if fulls else None
+        if not (self.first_name and self.last_name) and len(self.name_columns) >= 2 and not self.full_name:
+            self.first_name, self.last_name = self.name_columns[0], self.name_columns[1]
+
+        salary_columns = _matching(headers, SALARY_PATTERNS)
+        self.salary: Optional[str] = salary_columns[0] if salary_columns else None
+        self.deduction_columns = _matching(headers, DEDUCTION_PATTERNS)
+        self.deduction_detail_columns = _matching(headers, DEDUCTION_DETAIL_PATTERNS)
+        self.premium_columns = _matching(headers, PREMIUM_PATTERNS)
+
+        plan_columns = _matching(headers, PLAN_PATTERNS)
+        self.plan: Optional[str] = plan_columns[0] if plan_columns else None
+        # Amount and plan columns that name a line of coverage ('Dental Deduction', 'Vision Plan')
+        amount_columns = self.premium_columns if file_type == 'carrier' else self.deduction_columns
+        self.line_columns: Dict[str, str] = {h: coverage_line(h) for h in amount_columns if coverage_line(h)}
+        self.line_plans: Dict[str, str] = {}
+        for column in plan_columns:
+            self.line_plans.setdefault(coverage_line(column), column)
+        self.line_plans.pop('', None)
+        self.tier: Optional[str] = tier_columns[0] if tier_columns else None
+        self.dependents: Optional[str] = dependent_columns[0] if dependent_columns else None
+        self.age: Optional[str] = age_columns[0] if age_columns else None
+        self.tenure: Optional[str] = tenure_columns[0] if tenure_columns else None
+        self.dates: Dict[str, str] = {}
+        for role, patterns in DATE_PATTERNS.items():
+            columns = _matching(headers, patterns)
+            if columns:
+                self.dates[role] = columns[0]
+
+    @property
+    def columns(self) -> List[str]:
+        """Every header that has a role, in file order"""
+        used = set(self.name_columns + self.deduction_columns + self.deduction_detail_columns + self.premium_columns)
+        used.update(c for c in (self.ssn, self.employee_id, self.id_column, self.salary, self.plan,
+                                self.tier, self.dependents, self.age, self.tenure) if c)
+        used.update(self.dates.values())
+        used.update(self.line_plans.values())
+        return [h for h in self.headers if h in used]
+
+    def name_for(self, row: Dict[str, str]) -> str:
+        """Display name for a row using the resolved name columns (may be empty)"""
+        if self.first_name and self.last_name:
+            return f"{row.get(self.first_name) or ''} {row.get(self.last_name) or ''}".strip()
+        if self.full_name:
+            return row.get(self.full_name) or ''
+        if self.name_columns:
+            return row.get(self.name_columns[0]) or ''
+        return ''
+
+    def roles(self) -> Dict[str, object]:
+        """Resolved role -> column mapping, for logging and debugging"""
+        return {
+            'ssn': self.ssn,
+            'employee_id': self.employee_id,
+            'first_name': self.first_name,
+            'last_name': self.last_name,
+            'full_name': self.full_name,
+            'salary': self.salary,
+            'deduction': self.deduction_columns,
+            'premium': self.premium_columns,
+            'plan': self.plan,
+            'lines': dict(self.line_columns),
+            'line_plans': dict(self.line_plans),
+            'tier': self.tier,
+            'dependents': self.dependents,
+            'age': self.age,
+            'tenure': self.tenure,
+            'dates': dict(self.dates)
+        }
+
+
+def header_fingerprint(headers: Sequence[str], file_type: str) -> str:
+    """Stable fingerprint of a file layout"""
+    raw = file_type + '\x1e' + '\x1f'.join(headers)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def resolve_schema(headers: Sequence[str], file_type: str) -> ColumnSchema:
+    """Return the column roles for a header, reusing cached layouts"""
+    fingerprint = header_fingerprint(headers, file_type)
+    with _schema_cache_lock:
+        schema = _schema_cache.get(fingerprint)
+        if schema is not None:
+            _schema_cache.move_to_end(fingerprint)
+            return schema
+
+    # Resolved outside the lock; two threads seeing a new layout at once both build it
+    schema = ColumnSchema(headers, file_type)
+    with _schema_cache_lock:
+        _schema_cache[fingerprint] = schema
+        if len(_schema_cache) > MAX_CACHED_SCHEMAS:
+            _schema_cache.popitem(last=False)
+    return schema
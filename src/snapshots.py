@@ -0,0 +1,48 @@
+import json
+from typing import Dict, List, Optional, Tuple
+
+from src.models.snapshot import MemberSnapshot, PeriodSnapshot
+from src.models.user import db
+from src.records import Discrepancy
+
+# member key -> (row hash, discrepancies) as produced by FileProcessor
+Snapshot = Dict[str, Tuple[str, List[Discrepancy]]]
+
+
+def find_previous_snapshot(group_name: str, period: str) -> Optional[PeriodSnapshot]:
+    """Most recent snapshot for the group from an earlier period"""
+    return (PeriodSnapshot.query
+            .filter(PeriodSnapshot.group_name == group_name, PeriodSnapshot.period < period)
+            .order_by(PeriodSnapshot.period.desc(), PeriodSnapshot.id.desc())
+            .first())
+
+
+def load_snapshot(snapshot: PeriodSnapshot) -> Snapshot:
+    """Read a stored snapshot's members back into FileProcessor form"""
+    rows = (db.session.query(MemberSnapshot.member_key, MemberSnapshot.row_hash, MemberSnapshot.errors_json)
+            .filter(MemberSnapshot.snapshot_id == snapshot.id)
+            .yield_per(5000))
+    return {key: (row_hash, [Discrepancy.from_dict(error) for error in json.loads(errors_json)] if errors_json else [])
+            for key, row_hash, errors_json in rows}
+
+
+def save_snapshot(group_name: str, period: str, members: Snapshot) -> PeriodSnapshot:
+    """Replace the group's snapshot for this period (caller commits)
+
+    Errors are stored without their source rows; a delta run re-points carried
+    errors at the rows of its own uploads.
+    """
+    for existing in PeriodSnapshot.query.filter_by(group_name=group_name, period=period):
+        db.session.execute(MemberSnapshot.__table__.delete().where(MemberSnapshot.snapshot_id == existing.id))
+        db.session.delete(existing)
+
+    snapshot = PeriodSnapshot(group_name=group_name, period=period, member_count=len(members))
+    db.session.add(snapshot)
+    db.session.flush()
+    if members:
+        db.session.execute(MemberSnapshot.__table__.insert(), [
+            {'snapshot_id': snapshot.id, 'member_key': key, 'row_hash': row_hash,
+             'errors_json': json.dumps([error.to_dict(sources=False) for error in errors]) if errors else None}
+            for key, (row_hash, errors) in members.items()
+        ])
+    return snapshot
@@ -0,0 +1,123 @@
+import csv
+import io
+import os
+import shutil
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.file_processor import SOURCE_FIELDS
+from src.mapped_csv import read_record, row_offsets
+from src.records import Discrepancy, SourceRef
+
+# A run's uploads are kept here, one folder per job, so its errors can be drilled into
+SOURCE_ROOT = os.environ.get('SOURCE_UPLOAD_FOLDER', os.path.join(os.path.dirname(__file__), 'database', 'sources'))
+# Folders older than this are removed as new runs are retained (and with their job);
+# uploads hold member SSNs, so the default is a day. 0 keeps no uploads
+SOURCE_RETENTION_DAYS = float(os.environ.get('SOURCE_RETENTION_DAYS', 1))
+
+# Upload extensions a spooled copy keeps (an 834 stays .834); anything else is saved as .csv
+SPOOLED_EXTENSIONS = ('.csv', '.txt', '.834', '.edi', '.x12')
+
+FIELDS_BY_TYPE = {file_type: field for field, file_type in SOURCE_FIELDS}
+
+
+def spooled_name(field: str, filename: Optional[str]) -> str:
+    """Our own name for a saved upload: its field, plus the extension it arrived with"""
+    extension = os.path.splitext(filename or '')[1].lower()
+    return f"{field}{extension if extension in SPOOLED_EXTENSIONS else '.csv'}"
+
+
+def source_path(job_id: str, file_type: str) -> str:
+    """Where a run keeps one of its CSV uploads (only CSV rows have offsets to drill into)"""
+    return os.path.join(SOURCE_ROOT, job_id, f"{FIELDS_BY_TYPE[file_type]}.csv")
+
+
+def locate_sources(errors: Iterable[Discrepancy], files: Dict[str, Any]):
+    """Fill in the byte offset of every source row that doesn't have one yet
+
+    files maps upload fields to file objects or paths. Each upload is scanned
+    at most once, and only when an error points into it; X12 rows keep no offset.
+    """
+    missing = defaultdict(list)  # file type -> errors with a row lacking its offset
+    for error in errors:
+        for file_type in {file_type for file_type, _, offset in error.sources if offset is None}:
+            missing[file_type].append(error)
+    for file_type, located in missing.items():
+        field = FIELDS_BY_TYPE[file_type]
+        offsets = row_offsets(files[field]) if field in files else None
+        if offsets is None:
+            continue
+        for error in located:
+            error.sources = tuple((source, row, offsets[row] if source == file_type and offset is None else offset)
+                                  for source, row, offset in error.sources)
+
+
+def prune_sources(now: Optional[float] = None):
+    """Drop the uploads of runs older than SOURCE_RETENTION_DAYS"""
+    if not os.path.isdir(SOURCE_ROOT):
+        return
+    cutoff = (now or time.time()) - SOURCE_RETENTION_DAYS * 86400
+    for entry in os.scandir(SOURCE_ROOT):
+        if entry.is_dir() and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def remove_sources(job_id: str):
+    """Drop a run's retained uploads, if it has any"""
+    shutil.rmtree(os.path.join(SOURCE_ROOT, job_id), ignore_errors=True)
+
+
+def retain_files(job_id: str, paths: Dict[str, str]):
+    """Move a run's spooled files (upload field -> path) into its source folder"""
+    if SOURCE_RETENTION_DAYS <= 0:
+        return
+    directory = os.path.join(SOURCE_ROOT, job_id)
+    os.makedirs(directory, exist_ok=True)
+    for field, path in paths.items():
+        shutil.move(path, os.path.join(directory, spooled_name(field, path)))
+    prune_sources()
+
+
+def retain_uploads(job_id: str, uploads: Dict[str, Any]):
+    """Save a synchronous run's uploads (upload field -> FileStorage) into its source folder"""
+    if SOURCE_RETENTION_DAYS <= 0:
+        return
+    directory = os.path.join(SOURCE_ROOT, job_id)
+    os.makedirs(directory, exist_ok=True)
+    for field, storage in uploads.items():
+        storage.stream.seek(0)
+        storage.save(os.path.join(directory, spooled_name(field, storage.filename)))
+    prune_sources()
+
+
+def read_source_rows(job_id: str, sources: List[SourceRef]) -> Optional[List[Dict[str, Any]]]:
+    """The raw rows behind an error, read by seeking to each one's offset
+
+    None when the run's uploads are no longer retained. Rows without an offset
+    (X12 members) come back with raw and values set to None.
+    """
+    if not os.path.isdir(os.path.join(SOURCE_ROOT, job_id)):
+        return None
+    by_file = defaultdict(list)
+    for file_type, row, offset in sources:
+        by_file[file_type].append((row, offset))
+
+    found = {}
+    for file_type, refs in by_file.items():
+        path = source_path(job_id, file_type)
+        if not os.path.isfile(path):
+            continue
+        with open(path, 'rb') as handle:
+            header = next(csv.reader([read_record(handle.readline).decode('utf-8-sig')]), [])
+            for row, offset in refs:
+                if offset is None:
+                    continue
+                handle.seek(offset)
+                raw = read_record(handle.readline).decode('utf-8', 'replace').rstrip('\r\n')
+                values = next(csv.reader(io.StringIO(raw, newline='')), [])
+                found[(file_type, row)] = {'raw': raw, 'values': dict(zip(header, values))}
+
+    empty = {'raw': None, 'values': None}
+    return [dict({'file': file_type, 'row': row, 'offset': offset}, **found.get((file_type, row), empty))
+            for file_type, row, offset in sources]
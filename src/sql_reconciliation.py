@@ -0,0 +1,200 @@
+from collections import Counter, defaultdict
+from typing import Any, Dict, List
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Connection
+
+from src.line_reconciliation import (LINE_TOLERANCE, format_breakdown, line_discrepancy, missing_coverage,
+                                     missing_deduction, plan_discrepancy, total_discrepancy)
+from src.metrics import registry, timed
+from src.models.upload import UploadLoad
+from src.records import Discrepancy
+from src.schema_resolver import LINE_NAMES
+
+# The same comparison FileProcessor makes, as queries over a stored load. Members
+# are matched on member key alone; the name / DOB matching of IdentityIndex only
+# happens in memory.
+
+# First row of each member per file, for the fields shown on its errors
+FIRST_ROW = """(SELECT MIN(f.position) FROM upload_row f
+                WHERE f.load_id = {row}.load_id AND f.file_type = {row}.file_type AND f.member_key = {row}.member_key)"""
+
+MISSING_COVERAGE_SQL = f"""
+SELECT p.member_key, p.employee_id, p.employee_name, p.position, p.amount
+FROM upload_row p
+WHERE p.load_id = :load_id AND p.file_type = 'payroll'
+  AND p.position = {FIRST_ROW.format(row='p')}
+  AND NOT EXISTS (SELECT 1 FROM upload_row c
+                  WHERE c.load_id = p.load_id AND c.file_type = 'carrier' AND c.member_key = p.member_key)
+ORDER BY p.position
+"""
+
+# Shown with the member's benadmin row when there is one, as FileProcessor does
+MISSING_DEDUCTION_SQL = f"""
+SELECT c.member_key, COALESCE(b.employee_id, c.employee_id), COALESCE(b.employee_name, c.employee_name),
+       COALESCE(b.position, c.position), c.amount
+FROM upload_row c
+LEFT JOIN upload_row b ON b.load_id = c.load_id AND b.file_type = 'benadmin' AND b.member_key = c.member_key
+                      AND b.position = {FIRST_ROW.format(row='b')}
+WHERE c.load_id = :load_id AND c.file_type = 'carrier'
+  AND c.position = {FIRST_ROW.format(row='c')}
+  AND NOT EXISTS (SELECT 1 FROM upload_row p
+                  WHERE p.load_id = c.load_id AND p.file_type = 'payroll' AND p.member_key = c.member_key)
+ORDER BY c.position
+"""
+
+# Per (member, line) sums for members in both files, then the by-total rule of
+# LineComparison per member; only flagged members' lines come back
+LINE_SQL = """
+WITH matched AS (
+    SELECT p.member_key, MIN(p.position) AS payroll_row
+    FROM upload_row p
+    WHERE p.load_id = :load_id AND p.file_type = 'payroll'
+      AND EXISTS (SELECT 1 FROM upload_row c
+                  WHERE c.load_id = p.load_id AND c.file_type = 'carrier' AND c.member_key = p.member_key)
+    GROUP BY p.member_key
+), lines AS (
+    SELECT i.member_key, i.line,
+           SUM(CASE WHEN i.file_type = 'payroll' THEN i.amount ELSE 0 END) AS payroll_amount,
+           SUM(CASE WHEN i.file_type = 'carrier' THEN i.amount ELSE 0 END) AS carrier_amount,
+           SUM(CASE WHEN i.file_type = 'payroll' THEN 1 ELSE 0 END) AS payroll_entries,
+           SUM(CASE WHEN i.file_type = 'carrier' THEN 1 ELSE 0 END) AS carrier_entries,
+           SUM(CASE WHEN i.file_type = 'payroll' AND i.from_plan THEN 1 ELSE 0 END) AS payroll_inferred,
+           SUM(CASE WHEN i.file_type = 'carrier' AND i.from_plan THEN 1 ELSE 0 END) AS carrier_inferred,
+           MAX(CASE WHEN i.file_type = 'payroll' THEN i.plan END) AS payroll_plan,
+           MAX(CASE WHEN i.file_type = 'carrier' THEN i.plan END) AS carrier_plan
+    FROM upload_line_item i
+    JOIN matched m ON m.member_key = i.member_key
+    WHERE i.load_id = :load_id AND i.file_type IN ('payroll', 'carrier')
+    GROUP BY i.member_key, i.line
+), members AS (
+    SELECT member_key,
+           SUM(payroll_amount) AS payroll_total,
+           SUM(carrier_amount) AS carrier_total,
+           CASE WHEN MAX(CASE WHEN line = '' THEN 1 ELSE 0 END) = 1
+                  OR (MAX(CASE WHEN (payroll_entries > 0) <> (carrier_entries > 0) THEN 1 ELSE 0 END) = 1
+                      AND ((SUM(payroll_entries) <= 1 AND SUM(payroll_inferred) = SUM(payroll_entries))
+                           OR (SUM(carrier_entries) <= 1 AND SUM(carrier_inferred) = SUM(carrier_entries))))
+                THEN 1 ELSE 0 END AS by_total
+    FROM lines
+    GROUP BY member_key
+), flagged AS (
+    SELECT member_key FROM members
+    WHERE by_total = 1 AND ABS(carrier_total - payroll_total) > :tolerance
+    UNION
+    SELECT l.member_key FROM lines l
+    JOIN members s ON s.member_key = l.member_key
+    WHERE s.by_total = 0
+      AND (ABS(l.carrier_amount - l.payroll_amount) > :tolerance
+           OR (l.payroll_plan <> '' AND l.carrier_plan <> '' AND UPPER(l.payroll_plan) <> UPPER(l.carrier_plan)))
+)
+SELECT f.member_key, d.employee_id, d.employee_name, m.payroll_row, s.by_total, s.payroll_total, s.carrier_total,
+       l.line, l.payroll_amount, l.carrier_amount, l.payroll_entries, l.carrier_entries,
+       l.payroll_plan, l.carrier_plan
+FROM flagged f
+JOIN matched m ON m.member_key = f.member_key
+JOIN members s ON s.member_key = f.member_key
+JOIN lines l ON l.member_key = f.member_key
+JOIN upload_row d ON d.load_id = :load_id AND d.file_type = 'payroll'
+                 AND d.member_key = f.member_key AND d.position = m.payroll_row
+ORDER BY m.payroll_row
+"""
+
+MEMBER_COUNT_SQL = "SELECT COUNT(DISTINCT member_key) FROM upload_row WHERE load_id = :load_id"
+
+# Every row of some members, for the source references of their errors
+SOURCE_ROWS_SQL = text("""
+SELECT member_key, file_type, position FROM upload_row
+WHERE load_id = :load_id AND member_key IN :member_keys
+""").bindparams(bindparam('member_keys', expanding=True))
+# Members looked up per query
+SOURCE_KEYS_PER_QUERY = 500
+# Source files in the order FileProcessor lists a member's rows
+SOURCE_ORDER = {'payroll': 0, 'carrier': 1, 'benadmin': 2}
+
+
+def display_name(name: str, position: int) -> str:
+    """Name shown for a member, as FileProcessor falls back when a row has none"""
+    return name or f"Employee {position + 1}"
+
+
+def _member_errors(rows: List[Any], tolerance: float,
+                   errors_by_key: Dict[str, List[Discrepancy]]) -> List[Discrepancy]:
+    """Errors for one flagged member from its per-line rows, in FileProcessor's order"""
+    rows = sorted(rows, key=lambda row: LINE_NAMES.index(row.line))
+    first = rows[0]
+    employee_id, name = first.employee_id, display_name(first.employee_name, first.payroll_row)
+    if first.by_total:
+        payroll = format_breakdown((row.line, row.payroll_amount) for row in rows if row.payroll_entries)
+        carrier = format_breakdown((row.line, row.carrier_amount) for row in rows if row.carrier_entries)
+        errors = [total_discrepancy(employee_id, name, first.payroll_total, first.carrier_total, payroll, carrier)]
+        errors_by_key[first.member_key].extend(errors)
+        return errors
+
+    errors = [line_discrepancy(employee_id, name, row.line, row.payroll_amount, row.carrier_amount,
+                               row.payroll_entries > 0, row.carrier_entries > 0, row.carrier_plan or '')
+              for row in rows if abs(row.carrier_amount - row.payroll_amount) > tolerance]
+    errors.extend(plan_discrepancy(employee_id, name, row.line, row.payroll_plan, row.carrier_plan, row.carrier_amount)
+                  for row in rows if row.payroll_plan and row.carrier_plan
+                  and row.payroll_plan.upper() != row.carrier_plan.upper())
+    errors_by_key[first.member_key].extend(errors)
+    return errors
+
+
+def attach_sources(connection: Connection, load_id: int, errors_by_key: Dict[str, List[Discrepancy]]):
+    """Point each member's errors at all of its stored rows, as FileProcessor.attach_sources does"""
+    keys = list(errors_by_key)
+    for first in range(0, len(keys), SOURCE_KEYS_PER_QUERY):
+        rows = defaultdict(list)
+        for member_key, file_type, position in connection.execute(
+                SOURCE_ROWS_SQL, {'load_id': load_id, 'member_keys': keys[first:first + SOURCE_KEYS_PER_QUERY]}):
+            rows[member_key].append((file_type, position, None))
+        for member_key, refs in rows.items():
+            refs = tuple(sorted(refs, key=lambda ref: (SOURCE_ORDER[ref[0]], ref[1])))
+            for error in errors_by_key[member_key]:
+                error.sources = refs
+
+
+@timed('compare_sql')
+def compare_load(connection: Connection, load_id: int, tolerance: float = LINE_TOLERANCE) -> List[Discrepancy]:
+    """Payroll / carrier discrepancies of a stored load, computed in the database"""
+    params = {'load_id': load_id, 'tolerance': tolerance}
+    errors, errors_by_key = [], defaultdict(list)
+    for sql, discrepancy in ((MISSING_COVERAGE_SQL, missing_coverage), (MISSING_DEDUCTION_SQL, missing_deduction)):
+        for member_key, employee_id, name, position, amount in connection.execute(text(sql), params):
+            error = discrepancy(employee_id, display_name(name, position), amount or 0.0)
+            errors.append(error)
+            errors_by_key[member_key].append(error)
+
+    # Rows arrive grouped by member, in payroll order
+    member_rows: List[Any] = []
+    for row in connection.execute(text(LINE_SQL), params, execution_options={'yield_per': 5000}):
+        if member_rows and row.payroll_row != member_rows[0].payroll_row:
+            errors.extend(_member_errors(member_rows, tolerance, errors_by_key))
+            member_rows = []
+        member_rows.append(row)
+    if member_rows:
+        errors.extend(_member_errors(member_rows, tolerance, errors_by_key))
+
+    attach_sources(connection, load_id, errors_by_key)
+    return errors
+
+
+def reconcile_load(connection: Connection, load_id: int) -> Dict[str, Any]:
+    """Reconciliation analysis of a stored load, in the form FileProcessor returns"""
+    loads = UploadLoad.__table__
+    load = connection.execute(loads.select().where(loads.c.id == load_id)).one()
+    total_employees = connection.execute(text(MEMBER_COUNT_SQL), {'load_id': load_id}).scalar() or 0
+    errors = compare_load(connection, load_id) if load.payroll_rows and load.carrier_rows else []
+    for error_type, count in Counter(error.error_type for error in errors).items():
+        registry.inc('benefitspecs_reconciliation_errors_total', count, error_type=error_type)
+    return {
+        'total_employees': total_employees,
+        'errors_found': len(errors),
+        'error_rate': round((len(errors) / total_employees) * 100) if total_employees > 0 else 0,
+        'time_saved': "3.75 hrs",
+        'files_processed': sum(1 for count in (load.payroll_rows, load.carrier_rows, load.benadmin_rows) if count),
+        'errors': errors,
+        'engine': 'sql',
+        'load_id': load_id
+    }
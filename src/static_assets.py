@@ -0,0 +1,111 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Dict, Optional, Tuple
+
+from flask import Response, request
+from werkzeug.security import safe_join
+
+try:
+    import brotli  # optional (pip install brotli); without it browsers get gzip
+except ImportError:
+    brotli = None
+
+# Files named like app.3f9c2a1b.js change name whenever their content does,
+# so browsers may keep them for a year without asking again
+FINGERPRINTED = re.compile(r'\.[0-9a-f]{8,}\.[A-Za-z0-9]+$')
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+# Everything else (index.html above all) is revalidated on each load; the answer is usually a bodiless 304
+REVALIDATE_CACHE = 'no-cache'
+# PNG, JPEG and the like are compressed already
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/xml',
+                      'image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon')
+# Below this a response fits in one packet either way
+MIN_COMPRESS_BYTES = 1024
+# Preferred first when the browser accepts several
+ENCODINGS = ('br', 'gzip')
+
+
+class StaticAsset:
+    """One file's bytes, its compressed variants and their ETags, read once"""
+
+    __slots__ = ('mimetype', 'cache_control', 'mtime', 'size', 'variants')
+
+    def __init__(self, path: str, name: str):
+        with open(path, 'rb') as f:
+            body = f.read()
+        stat = os.stat(path)
+        self.mtime, self.size = stat.st_mtime_ns, stat.st_size
+        self.mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.cache_control = IMMUTABLE_CACHE if FINGERPRINTED.search(name) else REVALIDATE_CACHE
+
+        # encoding -> (body, ETag); each variant needs its own tag, as their bytes differ
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.variants: Dict[str, Tuple[bytes, str]] = {'identity': (body, digest)}
+        if len(body) >= MIN_COMPRESS_BYTES and self.mimetype.startswith(COMPRESSIBLE_TYPES):
+            self._add_variant('gzip', gzip.compress(body, 9, mtime=0), digest)
+            if brotli is not None:
+                self._add_variant('br', brotli.compress(body), digest)
+
+    def _add_variant(self, encoding: str, body: bytes, digest: str):
+        if len(body) < self.size:
+            self.variants[encoding] = (body, f"{digest}-{encoding}")
+
+    def encoding_for(self, accept_encodings) -> str:
+        """Smallest variant the request's Accept-Encoding allows"""
+        for encoding in ENCODINGS:
+            if encoding in self.variants and accept_encodings[encoding] > 0:
+                return encoding
+        return 'identity'
+
+
+class StaticManifest:
+    """Every file under the static folder, loaded and compressed when the app is built"""
+
+    def __init__(self, folder: Optional[str]):
+        self.folder = folder
+        self.assets: Dict[str, StaticAsset] = {}
+        if folder is None:
+            return
+        for directory, _, filenames in os.walk(folder):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, folder).replace(os.sep, '/')
+                self.assets[name] = StaticAsset(path, name)
+
+    def get(self, name: str, reload: bool = False) -> Optional[StaticAsset]:
+        """The asset for a URL path; reload re-reads files changed on disk (for the debug server)"""
+        if not reload:
+            return self.assets.get(name)
+        path = safe_join(self.folder, name) if self.folder else None
+        if path is None or not os.path.isfile(path):
+            self.assets.pop(name, None)
+            return None
+        stat = os.stat(path)
+        asset = self.assets.get(name)
+        if asset is None or (asset.mtime, asset.size) != (stat.st_mtime_ns, stat.st_size):
+            asset = self.assets[name] = StaticAsset(path, name)
+        return asset
+
+    def response(self, name: str, reload: bool = False) -> Optional[Response]:
+        """The file for the current request, or a 304 if the browser's copy is current; None if unknown"""
+        asset = self.get(name, reload)
+        if asset is None:
+            return None
+        encoding = asset.encoding_for(request.accept_encodings)
+        body, etag = asset.variants[encoding]
+
+        # If-None-Match uses the weak comparison, so a proxy's W/ prefix still matches
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype=asset.mimetype)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = asset.cache_control
+        if len(asset.variants) > 1:
+            response.vary.add('Accept-Encoding')
+        return response
@@ -0,0 +1,190 @@
+import csv
+import io
+import itertools
+import os
+from operator import itemgetter
+from typing import Dict, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from src.columnar import SourceTable
+from src.file_processor import FALLBACK_ID_BASES, SOURCE_FIELDS, FileProcessor
+from src.identity import IdentityIndex
+from src.metrics import timed
+from src.models.upload import UploadLineItem, UploadLoad, UploadRow
+from src.schema_resolver import LINE_NAMES, resolve_schema
+
+# Rows parsed, normalized and inserted at a time; a load never holds more than this in memory
+LOAD_CHUNK_ROWS = int(os.environ.get('LOAD_CHUNK_ROWS', 20000))
+# How COPY spells NULL, so it can't be confused with an empty string
+COPY_NULL = '\\N'
+# Columns written per row, in the order the record tuples below hold them
+ROW_COLUMNS = ['load_id', 'file_type', 'position', 'member_key', 'employee_id', 'employee_name', 'birth_date',
+               'amount']
+ITEM_COLUMNS = ['load_id', 'file_type', 'position', 'member_key', 'line', 'plan', 'amount', 'from_plan']
+MEMBER_KEY = itemgetter(3)
+
+IDENTITY_ROWS_SQL = text("""
+SELECT file_type, position, member_key, employee_name, birth_date FROM upload_row
+WHERE load_id = :load_id ORDER BY file_type, position
+""")
+# The old key is in the WHERE clause so both updates can use the member key indexes
+REKEY_SQL = """
+UPDATE {table} SET member_key = :member_key
+WHERE load_id = :load_id AND file_type = :file_type AND member_key = :old_key AND position = :position
+"""
+
+
+def bulk_insert(connection: Connection, table, columns: List[str], rows: List[Tuple]):
+    """Insert rows in bulk: COPY on PostgreSQL with psycopg2, one driver-level executemany elsewhere"""
+    if not rows:
+        return
+    if connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2':
+        _copy_rows(connection, table, columns, rows)
+        return
+    # Compiled once per batch; the driver gets plain tuples instead of SQLAlchemy building each row's parameters
+    compiled = table.insert().compile(dialect=connection.dialect, column_keys=columns)
+    if compiled.positional:
+        order = [columns.index(column) for column in compiled.positiontup]
+        if order != list(range(len(columns))):
+            rows = [tuple(row[i] for i in order) for row in rows]
+    else:
+        rows = [dict(zip(columns, row)) for row in rows]
+    connection.exec_driver_sql(str(compiled), rows)
+
+
+def _copy_rows(connection: Connection, table, columns: List[str], rows: List[Tuple]):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([COPY_NULL if value is None else value for value in row])
+    buffer.seek(0)
+    # The DBAPI cursor runs inside the connection's open transaction
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN "
+                           f"WITH (FORMAT csv, NULL '{COPY_NULL}')", buffer)
+    finally:
+        cursor.close()
+
+
+def member_key_for(key: str, file_type: str, position: int) -> str:
+    """A row's member key as loaded; rows without a usable ID stand alone until resolve_identities"""
+    return key or f"{file_type.upper()}ROW{position}"
+
+
+class StoredSource:
+    """One file's stored keys, names and birth dates, in the form IdentityIndex reads"""
+
+    def __init__(self, file_type: str):
+        self.file_type = file_type
+        self.keys: List[str] = []  # '' for rows loaded without an ID
+        self.names: List[str] = []
+        self.birth_dates: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+@timed('resolve_stored_identities')
+def resolve_identities(connection: Connection, load_id: int) -> int:
+    """Match the load's rows without an ID to members on name and birth date, as IdentityIndex
+    does for the in-memory engine, and store the resolved keys; returns the rows re-keyed
+
+    Reads the whole load's names, so it only runs when some row had no ID.
+    """
+    sources = {file_type: StoredSource(file_type) for _, file_type in SOURCE_FIELDS}
+    for file_type, position, member_key, name, birth_date in connection.execute(IDENTITY_ROWS_SQL,
+                                                                                 {'load_id': load_id}):
+        source = sources[file_type]
+        source.keys.append('' if member_key == member_key_for('', file_type, position) else member_key)
+        source.names.append(name or '')
+        source.birth_dates.append(birth_date or '')
+
+    identity = IdentityIndex([sources[file_type] for _, file_type in SOURCE_FIELDS])
+    changes = [{'load_id': load_id, 'file_type': file_type, 'position': position, 'member_key': key,
+                'old_key': member_key_for('', file_type, position)}
+               for file_type, source in sources.items()
+               for position, (loaded, key) in enumerate(zip(source.keys, identity.member_keys[file_type]))
+               if not loaded and key != member_key_for('', file_type, position)]
+    if changes:
+        for table in (UploadRow.__table__, UploadLineItem.__table__):
+            connection.execute(text(REKEY_SQL.format(table=table.name)), changes)
+    return len(changes)
+
+
+def _row_records(load_id: int, table: SourceTable, offset: int) -> List[Tuple]:
+    file_type = table.file_type
+    return [(load_id, file_type, position, member_key_for(key, file_type, position), employee_id, name,
+             birth_date, amount if has_amount else None)
+            for position, (key, employee_id, name, birth_date, amount, has_amount) in enumerate(
+                zip(table.keys, table.ids.tolist(), table.names.tolist(), table.birth_dates,
+                    table.amounts.tolist(), table.has_amount.tolist()), offset)]
+
+
+def _item_records(load_id: int, table: SourceTable, offset: int) -> List[Tuple]:
+    file_type, items, keys = table.file_type, table.line_items, table.keys
+    return [(load_id, file_type, offset + row, member_key_for(keys[row], file_type, offset + row),
+             LINE_NAMES[line], items.plan_names[plan], amount, from_plan)
+            for row, line, plan, amount, from_plan in zip(items.rows.tolist(), items.lines.tolist(),
+                                                          items.plans.tolist(), items.amounts.tolist(),
+                                                          items.from_plan.tolist())]
+
+
+def load_source(connection: Connection, load_id: int, file_obj, file_type: str) -> Tuple[int, int]:
+    """Stream one upload into the load, LOAD_CHUNK_ROWS rows at a time
+
+    Returns the row count and how many of those rows had no usable ID.
+    """
+    rows = FileProcessor().iter_csv_rows(file_obj, file_type)
+    first = next(rows, None)
+    if first is None:
+        return 0, 0
+    # Every chunk is read with the columns resolved from the header
+    schema = resolve_schema(list(first.keys()), file_type)
+    rows = itertools.chain([first], rows)
+    count = unidentified = 0
+    while True:
+        chunk = list(itertools.islice(rows, LOAD_CHUNK_ROWS))
+        if not chunk:
+            return count, unidentified
+        table = SourceTable.from_rows(chunk, file_type, FALLBACK_ID_BASES[file_type] + count, schema)
+        for model, columns, records in ((UploadRow, ROW_COLUMNS, _row_records(load_id, table, count)),
+                                        (UploadLineItem, ITEM_COLUMNS, _item_records(load_id, table, count))):
+            # In member key order the indexes take a chunk as runs of neighbouring entries,
+            # not one random B-tree page per row (about twice as fast on SQLite)
+            records.sort(key=MEMBER_KEY)
+            bulk_insert(connection, model.__table__, columns, records)
+        count += len(chunk)
+        unidentified += sum(1 for key in table.keys if not key)
+
+
+def delete_loads(connection: Connection, group_name: str, period: str):
+    """Drop the group's stored rows for the period"""
+    loads = UploadLoad.__table__
+    load_ids = [load_id for load_id, in connection.execute(
+        loads.select().with_only_columns(loads.c.id)
+        .where(loads.c.group_name == group_name, loads.c.period == period))]
+    if load_ids:
+        for table in (UploadLineItem.__table__, UploadRow.__table__):
+            connection.execute(table.delete().where(table.c.load_id.in_(load_ids)))
+        connection.execute(loads.delete().where(loads.c.id.in_(load_ids)))
+
+
+@timed('load_uploads')
+def load_uploads(connection: Connection, group_name: str, period: str, files: Dict) -> int:
+    """Replace the group's stored rows for the period with these uploads; returns the load's id"""
+    delete_loads(connection, group_name, period)
+    loads = UploadLoad.__table__
+    load_id = connection.execute(loads.insert().values(group_name=group_name, period=period)).inserted_primary_key[0]
+    counts, unidentified = {}, 0
+    for field, file_type in SOURCE_FIELDS:
+        if field in files and files[field].filename:
+            counts[f"{file_type}_rows"], missing_ids = load_source(connection, load_id, files[field], file_type)
+            unidentified += missing_ids
+    if unidentified:
+        # Rows without an SSN / member ID join their member the way the in-memory engine joins them
+        resolve_identities(connection, load_id)
+    connection.execute(loads.update().where(loads.c.id == load_id).values(**counts))
+    return load_id
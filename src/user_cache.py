@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+
+from src.metrics import registry
+from src.models.user import User, db
+
+# How long a web worker trusts a user it has loaded; 0 loads every request's user from the database.
+# Changes made in this worker invalidate at once; other workers see them within the TTL.
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL_SECONDS', 30))
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+# What a session needs of its user; everything else (the password hash above all) is
+# left unloaded on a cached user and read from the database if something asks for it
+CACHED_COLUMNS = ['id', 'username']
+
+
+class UserCache:
+    """CACHED_COLUMNS of recently loaded users, least recently used dropped first"""
+
+    def __init__(self, ttl: float = USER_CACHE_TTL, max_size: int = USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: 'OrderedDict[int, tuple]' = OrderedDict()  # user id -> (expires at, values)
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def put(self, user_id: int, values: Dict[str, Any]):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+def load_cached_user(user_id: int) -> Optional[User]:
+    """The user for a session, from the cache when it is fresh, otherwise from the database"""
+    values = user_cache.get(user_id)
+    if values is None:
+        registry.inc('benefitspecs_user_cache_total', result='miss')
+        user = db.session.get(User, user_id)
+        if user is not None:
+            user_cache.put(user_id, {column: getattr(user, column) for column in CACHED_COLUMNS})
+        return user
+
+    registry.inc('benefitspecs_user_cache_total', result='hit')
+    # A persistent instance in this request's session, built without a query; the
+    # columns left out are expired, so reading one loads it
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user(mapper, connection, target):
+    user_cache.invalidate(target.id)
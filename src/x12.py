@@ -0,0 +1,205 @@
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from src.schema_resolver import LINE_NAMES, coverage_line
+
+# The ISA segment is fixed width: element separator at 3, component separator at 104, terminator at 105
+ISA_LENGTH = 106
+# Enough of an upload to tell an X12 interchange from a CSV
+X12_SNIFF_BYTES = 128
+# Small chunks keep few segment lists alive at once, which keeps garbage collection cheap
+CHUNK_SIZE = 64 * 1024
+
+SELF_RELATIONSHIP = '18'
+SSN_QUALIFIER = '34'
+PREMIUM_QUALIFIER = 'P3'
+# HD05 coverage level codes -> the tier labels the CSV files use
+COVERAGE_LEVELS = {'EMP': 'EE', 'ESP': 'ES', 'ECH': 'EC', 'E1D': 'EC', 'FAM': 'FAM', 'SPC': 'ES', 'CHD': 'EC',
+                   'E2D': 'EC', 'E3D': 'EC', 'ELF': 'FAM', 'IND': 'EE', 'DEP': 'EC'}
+# DTP qualifiers: member-level eligibility / employment, coverage-level benefit dates
+ELIGIBILITY_BEGIN, ELIGIBILITY_END, EMPLOYMENT_BEGIN = '356', '357', '336'
+BENEFIT_BEGIN, BENEFIT_END = '348', '349'
+MEMBER_DATES = (ELIGIBILITY_BEGIN, ELIGIBILITY_END, EMPLOYMENT_BEGIN)
+# Longest element position read from any segment, plus one
+BLANKS = [''] * 10
+
+
+def looks_like_x12(head: bytes) -> bool:
+    """True when the first bytes of an upload are an X12 interchange header"""
+    return head.lstrip(b'\xef\xbb\xbf \t\r\n').startswith(b'ISA')
+
+
+def iter_segments(text) -> Iterator[List[str]]:
+    """Split an X12 stream into segments of elements, reading it a chunk at a time"""
+    buffer = text.read(CHUNK_SIZE).lstrip('﻿ \t\r\n')
+    if not buffer.startswith('ISA'):
+        raise ValueError('Not an X12 file: it does not start with an ISA segment')
+    while len(buffer) < ISA_LENGTH:
+        chunk = text.read(CHUNK_SIZE)
+        if not chunk:
+            raise ValueError('Truncated ISA segment')
+        buffer += chunk
+    separator, terminator = buffer[3], buffer[105]
+    # Line breaks after terminators are common; drop them up front unless they are the terminator
+    drop_breaks = terminator not in '\r\n'
+
+    while True:
+        if drop_breaks:
+            buffer = buffer.replace('\r', '').replace('\n', '')
+        segments = buffer.split(terminator)
+        buffer = segments.pop()  # the last piece may be a partial segment
+        for segment in segments:
+            if segment:
+                yield segment.split(separator)
+        chunk = text.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+    if buffer.strip():
+        yield buffer.strip().split(separator)
+
+
+def _date(value: str) -> str:
+    """CCYYMMDD (or a D8 range's start) as MM/DD/YYYY, the format the CSV uploads use"""
+    value = value.split('-')[0]
+    if len(value) == 8 and value.isdigit():
+        return f"{value[4:6]}/{value[6:8]}/{value[:4]}"
+    return value
+
+
+class MemberRecord:
+    """One INS loop (2000): a subscriber or dependent with their coverages"""
+
+    def __init__(self, ins: List[str]):
+        ins = ins + BLANKS
+        self.subscriber = ins[1] == 'Y'
+        self.relationship = ins[2]
+        self.maintenance_type = ins[3]
+        self.ssn = ''
+        self.subscriber_id = ''
+        self.group_number = ''
+        self.first_name = ''
+        self.last_name = ''
+        self.birth_date = ''
+        self.gender = ''
+        self.dates: Dict[str, str] = {}
+        self.coverages: List[Dict] = []
+        self.premium: Optional[float] = None  # member-level AMT outside any coverage
+        self.dependents: List['MemberRecord'] = []
+
+    def add_segment(self, segment: List[str]):
+        # Trailing empty elements are omitted in X12, so pad rather than bounds-check each one
+        tag, segment = segment[0], segment + BLANKS
+        if tag == 'DTP':
+            qualifier = segment[1]
+            if qualifier in (BENEFIT_BEGIN, BENEFIT_END) and self.coverages:
+                self.coverages[-1][qualifier] = _date(segment[3])
+            elif qualifier in MEMBER_DATES:
+                self.dates[qualifier] = _date(segment[3])
+        elif tag == 'HD':
+            self.coverages.append({'line': segment[3], 'plan': segment[4].strip(), 'level': segment[5]})
+        elif tag == 'AMT':
+            if segment[1] != PREMIUM_QUALIFIER:
+                return
+            try:
+                amount = float(segment[2])
+            except ValueError:
+                return
+            if self.coverages:
+                self.coverages[-1]['premium'] = amount
+            else:
+                self.premium = (self.premium or 0.0) + amount
+        elif tag == 'REF':
+            if segment[1] == '0F':
+                self.subscriber_id = segment[2].strip()
+            elif segment[1] == '1L':
+                self.group_number = segment[2].strip()
+        elif tag == 'NM1':
+            if segment[1] in ('IL', '74'):
+                self.last_name = segment[3].strip()
+                self.first_name = segment[4].strip()
+                if segment[8] == SSN_QUALIFIER:
+                    self.ssn = segment[9].strip()
+        elif tag == 'DMG':
+            self.birth_date = _date(segment[2])
+            self.gender = segment[3]
+
+    def total_premium(self) -> Optional[float]:
+        amounts = [coverage['premium'] for coverage in self.coverages if 'premium' in coverage]
+        if self.premium is not None:
+            amounts.append(self.premium)
+        return sum(amounts) if amounts else None
+
+    def to_row(self) -> Dict[str, str]:
+        """Flatten the subscriber and their dependents into one carrier/benadmin style row"""
+        # Medical coverage decides the plan and tier when there are several lines
+        primary = next((c for c in self.coverages if c['line'] == 'HLT'), self.coverages[0] if self.coverages else {})
+        premiums = [member.total_premium() for member in [self] + self.dependents]
+        known = [amount for amount in premiums if amount is not None]
+        return {
+            'member ssn': self.ssn or self.subscriber_id,
+            'first name': self.first_name,
+            'last name': self.last_name,
+            'date of birth': self.birth_date,
+            'gender': self.gender,
+            'relationship': self.relationship,
+            'plan': primary.get('plan', ''),
+            'coverage tier': COVERAGE_LEVELS.get(primary.get('level', ''), primary.get('level', '')),
+            'coverage lines': ' '.join(c['line'] for c in self.coverages if c['line']),
+            'premium': f"{sum(known):.2f}" if known else '',
+            'effective date': primary.get(BENEFIT_BEGIN) or self.dates.get(ELIGIBILITY_BEGIN, ''),
+            'termination date': primary.get(BENEFIT_END) or self.dates.get(ELIGIBILITY_END, ''),
+            'hire date': self.dates.get(EMPLOYMENT_BEGIN, ''),
+            'dependents': str(len(self.dependents)),
+            'maintenance type': self.maintenance_type,
+            'group policy': self.group_number,
+            **self.line_columns()
+        }
+
+    def line_columns(self) -> Dict[str, str]:
+        """'<line> premium' and '<line> plan' for every line of coverage, so each row has the same columns"""
+        premiums: Dict[str, float] = {}
+        plans: Dict[str, str] = {}
+        for member in [self] + self.dependents:
+            for coverage in member.coverages:
+                line = coverage_line(coverage['line'])
+                if not line:
+                    continue
+                plans.setdefault(line, coverage['plan'])
+                if 'premium' in coverage:
+                    premiums[line] = premiums.get(line, 0.0) + coverage['premium']
+        columns = {}
+        for line in LINE_NAMES[1:]:
+            columns[f"{line} premium"] = f"{premiums[line]:.2f}" if line in premiums else ''
+            columns[f"{line} plan"] = plans.get(line, '')
+        return columns
+
+
+def iter_834_members(segments: Iterable[List[str]]) -> Iterator[MemberRecord]:
+    """Group INS loops into subscribers, attaching the dependents that follow each one"""
+    subscriber: Optional[MemberRecord] = None
+    current: Optional[MemberRecord] = None
+    for segment in segments:
+        tag = segment[0]
+        if tag == 'INS':
+            current = MemberRecord(segment)
+            if current.subscriber or current.relationship == SELF_RELATIONSHIP or subscriber is None:
+                if subscriber is not None:
+                    yield subscriber
+                subscriber = current
+            else:
+                subscriber.dependents.append(current)
+        elif tag in ('SE', 'GE', 'IEA'):
+            # Transaction boundary: nothing after it belongs to the open member
+            if subscriber is not None:
+                yield subscriber
+            subscriber = current = None
+        elif current is not None:
+            current.add_segment(segment)
+    if subscriber is not None:
+        yield subscriber
+
+
+def iter_834_rows(text) -> Iterator[Dict[str, str]]:
+    """One row per subscriber, shaped like a parsed carrier / benadmin CSV row"""
+    for member in iter_834_members(iter_segments(text)):
+        yield member.to_row()
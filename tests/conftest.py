@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+
+# Tests import the app as src.*, the way src/main.py does, from wherever pytest is run
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Folders are read when the modules are imported, so they point into scratch space first
+SCRATCH = tempfile.mkdtemp(prefix='benefitspecs_tests_')
+for variable, folder in (('JOB_UPLOAD_FOLDER', 'uploads'), ('SOURCE_UPLOAD_FOLDER', 'sources'),
+                         ('RESULT_CACHE_DIR', 'result_cache'), ('METRICS_DIR', 'metrics')):
+    os.environ[variable] = os.path.join(SCRATCH, folder)
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(SCRATCH, 'app.db')}"
+os.environ['BCRYPT_ROUNDS'] = '4'
+
+import pytest  # noqa: E402
+
+
+def make_app(tmp_path):
+    """A fresh app on its own SQLite file, with an empty user cache"""
+    from src.main import create_app
+    from src.user_cache import user_cache
+
+    user_cache.clear()
+    return create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}"})
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(tmp_path)
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    """Seeded payroll / carrier / benadmin CSVs for 60 members, by upload field"""
+    from benchmarks.generator import write_dataset
+
+    directory = tmp_path / 'dataset'
+    directory.mkdir()
+    return write_dataset(str(directory), 60)
+
+
+def upload_form(paths, **fields):
+    """Multipart form data posting the files at paths (upload field -> path)"""
+    form = {field: open(path, 'rb') for field, path in paths.items()}
+    form.update(fields)
+    return form
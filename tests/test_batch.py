@@ -0,0 +1,88 @@
+import io
+import json
+import os
+import zipfile
+
+from werkzeug.datastructures import FileStorage
+
+import src.batch
+from src.batch import spool_archive, spool_manifest
+from src.models.reconciliation import ReconciliationJob
+from src.models.user import db
+
+MANIFEST = ("group_name,period,payroll,carrier\n"
+            "Acme,2025-06,acme/payroll.csv,acme/carrier.csv\n"
+            "Globex,,payroll.csv,missing.csv\n")
+
+
+def zip_of(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as bundle:
+        for name, path in files.items():
+            bundle.write(path, name)
+    buffer.seek(0)
+    return buffer
+
+
+def write(path, text):
+    path.write_text(text)
+    return str(path)
+
+
+def test_archive_folders_become_groups(dataset, tmp_path):
+    archive = zip_of({f"{group}/{os.path.basename(path)}": path for group in ('acme', 'globex')
+                      for path in dataset.values()})
+    groups = spool_archive(archive, str(tmp_path), '2025-07', 'Demo Group')
+
+    assert [(group.name, group.period, group.error) for group in groups] == [
+        ('acme', '2025-07', None), ('globex', '2025-07', None)]
+    assert sorted(groups[0].paths) == ['benadmin_file', 'carrier_file', 'payroll_file']
+    with open(groups[1].paths['payroll_file'], 'rb') as spooled, open(dataset['payroll_file'], 'rb') as original:
+        assert spooled.read() == original.read()
+
+
+def test_manifest_names_each_groups_files(dataset, tmp_path):
+    archive = zip_of({'batch/manifest.csv': write(tmp_path / 'manifest.csv', MANIFEST),
+                      'batch/acme/payroll.csv': dataset['payroll_file'],
+                      'batch/acme/carrier.csv': dataset['carrier_file'],
+                      'batch/payroll.csv': dataset['payroll_file']})
+    directory = tmp_path / 'spooled'
+    directory.mkdir()
+    acme, globex = spool_archive(archive, str(directory), '2025-07', 'Demo Group')
+
+    assert (acme.name, acme.period, acme.error) == ('Acme', '2025-06', None)
+    assert sorted(acme.paths) == ['carrier_file', 'payroll_file']
+    assert (globex.period, globex.error) == ('2025-07', 'File not found: missing.csv')
+
+
+def test_uploaded_manifest_uses_the_files_beside_it(dataset, tmp_path):
+    uploads = [FileStorage(open(path, 'rb'), filename=os.path.basename(path)) for path in dataset.values()]
+    groups = spool_manifest(io.BytesIO(MANIFEST.encode('utf-8')), uploads, str(tmp_path), '2025-07')
+
+    assert [group.error for group in groups] == [None, 'File not found: missing.csv']
+
+
+def test_one_group_failing_to_store_fails_only_that_group(client, dataset, monkeypatch):
+    record_completed_run = src.batch.record_completed_run
+
+    def record(group_name, period, result):
+        if group_name == 'globex':
+            # as when storing the errors fails after the job row went in
+            db.session.add(ReconciliationJob(group_name=group_name, period=period))
+            db.session.flush()
+            raise RuntimeError('database is locked')
+        return record_completed_run(group_name, period, result)
+    monkeypatch.setattr(src.batch, 'record_completed_run', record)
+
+    archive = zip_of({f"{group}/{os.path.basename(path)}": path for group in ('acme', 'globex')
+                      for path in dataset.values()})
+    response = client.post('/api/reconciliation/batch', data={'archive': (archive, 'batch.zip')})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    by_group = {line['group_name']: line for line in lines if 'group_name' in line}
+    assert by_group['acme']['status'] == 'completed'
+    assert by_group['globex']['status'] == 'failed'
+    assert 'database is locked' in by_group['globex']['error']
+    assert lines[-1]['batch']['completed'] == 1 and lines[-1]['batch']['failed'] == 1
+    globex = ReconciliationJob.query.filter_by(group_name='globex').all()
+    assert [(job.id, job.status) for job in globex] == [(by_group['globex']['job_id'], 'failed')]
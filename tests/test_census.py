@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+from src.census import DistinctCounter
+
+ESTIMATE = ("from src.census import DistinctCounter; counter = DistinctCounter(); "
+            "counter.add([f'{n:09d}' for n in range(20000)] * 2); print(counter.estimate())")
+
+
+def test_distinct_estimate_is_close_and_the_same_in_every_process():
+    counter = DistinctCounter()
+    counter.add([f'{n:09d}' for n in range(20000)] * 2)
+    estimate = counter.estimate()
+    assert abs(estimate - 20000) < 20000 * 0.03
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for seed in ('1', '2'):
+        output = subprocess.run([sys.executable, '-c', ESTIMATE], cwd=root, check=True, capture_output=True, text=True,
+                                env=dict(os.environ, PYTHONHASHSEED=seed)).stdout
+        assert int(output) == estimate
+
+
+def test_empty_counter_has_no_estimate():
+    counter = DistinctCounter()
+    counter.add([])
+    assert counter.estimate() is None
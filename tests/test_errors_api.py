@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+
+import pytest
+
+from conftest import upload_form
+
+
+@pytest.fixture
+def run(client, dataset):
+    response = client.post('/api/reconciliation', data=upload_form(dataset, group_name='Acme'))
+    return response.get_json()['data']
+
+
+def errors(client, run, **params):
+    response = client.get(f"/api/reconciliation/{run['job_id']}/errors", query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['data']
+
+
+def everything(client, run, **params):
+    return errors(client, run, per_page=500, **params)['errors']
+
+
+def test_pages_cover_every_error_once(client, run):
+    total = run['errors_found']
+    pages = [errors(client, run, page=page, per_page=7) for page in range(1, total // 7 + 2)]
+
+    assert pages[0]['pagination'] == {'page': 1, 'per_page': 7, 'total': total, 'pages': (total + 6) // 7}
+    positions = [error['position'] for page in pages for error in page['errors']]
+    assert positions == list(range(total))
+    assert errors(client, run, page=999)['errors'] == []
+
+
+def test_sorting_and_priority_filter(client, run):
+    by_amount = [error['amount'] for error in everything(client, run, sort='-amount')]
+    assert by_amount == sorted(by_amount, reverse=True)
+    ranks = {'High': 1, 'Medium': 2, 'Low': 3}
+    by_priority = [ranks[error['priority']] for error in everything(client, run, sort='priority')]
+    assert by_priority == sorted(by_priority)
+
+    high = everything(client, run, priority='High')
+    assert high and {error['priority'] for error in high} == {'High'}
+    response = client.get(f"/api/reconciliation/{run['job_id']}/errors", query_string={'priority': 'Critical'})
+    assert response.status_code == 400
+    response = client.get(f"/api/reconciliation/{run['job_id']}/errors", query_string={'sort': 'description'})
+    assert response.status_code == 400
+
+
+def test_employee_filter_matches_an_id_or_the_start_of_a_name(client, run):
+    error = next(error for error in everything(client, run) if error['employee_id'].isdigit())
+    employee_id, name = error['employee_id'], error['employee_name']
+    formatted = f"{employee_id[:3]}-{employee_id[3:5]}-{employee_id[5:]}"
+
+    assert {e['employee_id'] for e in everything(client, run, employee=formatted)} == {employee_id}
+    assert all(e['employee_name'].lower().startswith(name[:4].lower())
+               for e in everything(client, run, employee=name[:4].lower()))
+    assert error in everything(client, run, employee=name[:4].lower())
+    # neither the middle of an ID nor the middle of a name
+    assert everything(client, run, employee=employee_id[2:7]) == []
+    assert everything(client, run, employee=name[2:]) == []
+
+
+def test_export_streams_every_error_as_csv_or_ndjson(client, run):
+    listed = everything(client, run)
+
+    response = client.get(f"/api/reconciliation/{run['job_id']}/errors/export")
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row['Employee ID'] for row in rows] == [error['employee_id'] for error in listed]
+    assert [row['Description'] for row in rows] == [error['description'] for error in listed]
+    assert [row['Amount'] for row in rows] == [f"${error['amount'] or 0:.2f}" for error in listed]
+
+    response = client.get(f"/api/reconciliation/{run['job_id']}/errors/export", query_string={'format': 'ndjson'})
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line['amount'] for line in lines] == [error['amount'] for error in listed]
+
+    response = client.get(f"/api/reconciliation/{run['job_id']}/errors/export", query_string={'format': 'xml'})
+    assert response.status_code == 400
@@ -0,0 +1,40 @@
+import io
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from src.file_processor import FileProcessor
+
+PAYROLL = "Employee SSN,First Name,Last Name,Medical Deduction,Dental Deduction\n123456789,Ann,Lee,200.00,30.00\n"
+CARRIER = ("Member SSN,First Name,Last Name,Plan Code,Premium\n"
+           "123456789,Ann,Lee,MED-PPO,200.00\n"
+           "123456789,Ann,Lee,DEN-BASIC,{dental}\n")
+
+
+def upload(text: str, name: str) -> FileStorage:
+    return FileStorage(io.BytesIO(text.encode('utf-8')), filename=name)
+
+
+def reconcile(dental: str, previous_snapshot=None):
+    files = {'payroll_file': upload(PAYROLL, 'payroll.csv'),
+             'carrier_file': upload(CARRIER.format(dental=dental), 'carrier.csv')}
+    return FileProcessor(seed=1).process_files(files, previous_snapshot=previous_snapshot, snapshot=True)
+
+
+def test_delta_sees_changes_to_a_members_second_row():
+    first = reconcile('30.00')
+    full = reconcile('90.00')
+    delta = reconcile('90.00', previous_snapshot=first['snapshot'])
+
+    assert delta['delta']['changed'] == 1
+    assert delta['delta']['unchanged'] == 0
+    assert [e.description for e in delta['errors']] == [e.description for e in full['errors']]
+    assert any('DEN-BASIC' in e.description for e in delta['errors'])
+
+
+def test_an_unreadable_upload_fails_the_run_with_the_reason():
+    files = {'payroll_file': upload(PAYROLL, 'payroll.csv'),
+             'carrier_file': FileStorage(io.BytesIO(b'Member SSN,Premium\n\xff\xfe123,200\n'), filename='carrier.csv')}
+    for streaming in (False, True):
+        with pytest.raises(ValueError, match='Could not read the carrier file'):
+            FileProcessor(seed=1).process_files(files, streaming=streaming)
@@ -0,0 +1,67 @@
+import os
+import time
+from concurrent.futures import Future
+
+from conftest import upload_form
+from src import jobs
+from src.models.reconciliation import ReconciliationJob
+from src.models.user import db
+
+
+def wait_for(client, job_id, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        data = client.get(f'/api/reconciliation/{job_id}').get_json()['data']
+        if data['status'] != 'queued':
+            return data
+        time.sleep(0.2)
+    raise AssertionError(f'job {job_id} still queued')
+
+
+def test_async_job_is_queued_then_completed(client, dataset):
+    response = client.post('/api/reconciliation', data=upload_form(dataset, **{'async': '1'}))
+
+    assert response.status_code == 202
+    queued = response.get_json()['data']
+    assert queued['status'] == 'queued'
+    done = wait_for(client, queued['job_id'])
+    assert done['status'] == 'completed'
+    assert done['result']['total_employees'] == 60
+    assert done['result']['pagination']['total'] == done['result']['errors_found']
+    assert not os.path.exists(os.path.join(jobs.UPLOAD_ROOT, queued['job_id']))
+
+
+def test_job_fails_cleanly_when_storing_its_result_fails(app, monkeypatch):
+    job = ReconciliationJob(group_name='Acme', period='2025-07')
+    db.session.add(job)
+    db.session.commit()
+    job_id = job.id
+    directory = os.path.join(jobs.UPLOAD_ROOT, job_id)
+    os.makedirs(directory)
+
+    def broken_store(job, result):
+        # A second row with the same key: the flush fails and the session needs a rollback
+        db.session.add(ReconciliationJob(id=job.id))
+        db.session.flush()
+
+    monkeypatch.setattr(jobs, 'store_result', broken_store)
+    future = Future()
+    future.set_result({'errors': [], 'total_employees': 0})
+    jobs._finish_job(app, job_id, future, paths={'payroll_file': os.path.join(directory, 'payroll_file.csv')})
+
+    db.session.expire_all()
+    job = db.session.get(ReconciliationJob, job_id)
+    assert job.status == 'failed'
+    assert job.error.startswith('Error processing files')
+    assert not os.path.exists(directory)
+
+
+def test_an_unreadable_upload_is_reported_with_the_job(client, dataset, tmp_path):
+    broken = tmp_path / 'carrier.csv'
+    broken.write_bytes(b'Member SSN,Premium\n\xff\xfe123,200\n')
+    paths = dict(dataset, carrier_file=str(broken))
+    response = client.post('/api/reconciliation', data=upload_form(paths, **{'async': '1'}))
+
+    done = wait_for(client, response.get_json()['data']['job_id'])
+    assert done['status'] == 'failed'
+    assert 'Could not read the carrier file' in done['error']
@@ -0,0 +1,56 @@
+import os
+
+from werkzeug.datastructures import FileStorage
+
+from src.file_processor import FileProcessor
+from src.mapped_csv import MappedCSV
+
+QUOTED = ('Employee SSN,Name,Notes\n'
+          '123-45-6789,"Lee, Ann","line one\nline two"\n'
+          '\n'
+          '987654321,Bo Park,\n')
+
+
+def test_rows_match_the_streaming_reader(dataset):
+    processor = FileProcessor()
+    with open(dataset['payroll_file'], 'rb') as handle:
+        streamed = processor.stream_csv_file(handle, 'payroll')
+    mapped = MappedCSV.open(dataset['payroll_file'], 'payroll')
+
+    assert len(mapped) == len(streamed)
+    columns = mapped.columns
+    assert [row for row in mapped] == [{key: row[key] for key in columns} for row in streamed]
+    assert mapped[5] == {key: streamed[5][key] for key in columns}
+    last = len(mapped) - 1
+    assert list(mapped.rows_at([0, 7, last])) == [mapped[0], mapped[7], mapped[last]]
+
+
+def test_offsets_point_at_row_starts(tmp_path):
+    path = tmp_path / 'payroll.csv'
+    path.write_bytes(QUOTED.encode('utf-8'))
+    mapped = MappedCSV.open(str(path), 'payroll')
+
+    data = path.read_bytes()
+    assert len(mapped) == 2
+    assert data[mapped.offsets[0]:].startswith(b'123-45-6789')
+    assert data[mapped.offsets[1]:].startswith(b'987654321')
+    assert mapped[0]['name'] == 'Lee, Ann'
+    assert mapped[1]['name'] == 'Bo Park'
+
+
+def test_mapped_and_streamed_runs_agree(dataset):
+    def run(mapped):
+        files = {field: FileStorage(open(path, 'rb'), filename=os.path.basename(path))
+                 for field, path in dataset.items()}
+        result = FileProcessor(seed=1).process_files(files, streaming=True, mapped=mapped)
+        return sorted((e.employee_id, e.error_type, e.description) for e in result['errors'])
+
+    assert run(True) == run(False)
+
+
+def test_rows_at_decodes_dense_blocks_whole(dataset, monkeypatch):
+    monkeypatch.setattr('src.mapped_csv.ITER_BLOCK_ROWS', 16)
+    mapped = MappedCSV.open(dataset['carrier_file'], 'carrier')
+    positions = [row for row in range(len(mapped)) if row % 5]
+
+    assert list(mapped.rows_at(positions)) == [mapped[row] for row in positions]
@@ -0,0 +1,55 @@
+import json
+import os
+
+from src.metrics import RETAINED_SNAPSHOT, Registry, merge_snapshots
+
+
+def write_snapshot(directory, name, requests, age=0):
+    registry = Registry()
+    registry.inc('benefitspecs_requests_total', requests, endpoint='/api/x', method='GET', status=200)
+    registry.observe('benefitspecs_stage_duration_seconds', 0.02, stage='read_csv_file')
+    path = directory / f"{name}.json"
+    path.write_text(json.dumps(registry.snapshot()))
+    if age:
+        os.utime(path, (path.stat().st_mtime - age,) * 2)
+
+
+def requests_total(merged):
+    return sum(value for (name, _), value in merged['counters'].items() if name == 'benefitspecs_requests_total')
+
+
+def test_exited_workers_stay_in_the_totals(tmp_path):
+    write_snapshot(tmp_path, 'live', 3)
+    write_snapshot(tmp_path, 'exited', 5, age=10 ** 7)
+    write_snapshot(tmp_path, 'exited-too', 7, age=10 ** 7)
+
+    first = merge_snapshots(str(tmp_path))
+    assert sorted(name for name in os.listdir(tmp_path) if name.endswith('.json')) == ['live.json', RETAINED_SNAPSHOT]
+    second = merge_snapshots(str(tmp_path))
+
+    assert requests_total(first) == requests_total(second) == 15
+    (histogram,) = second['histograms'].values()
+    assert histogram[-1] == 3 and round(histogram[-2], 6) == 0.06
+
+
+def test_endpoint_is_off_without_a_token(client):
+    assert client.get('/api/metrics').status_code == 404
+
+
+def test_exposition_format(app, client):
+    app.config['METRICS_TOKEN'] = 'scrape-me'
+    client.get('/api/reconciliation/missing')
+
+    assert client.get('/api/metrics').status_code == 401
+    assert client.get('/api/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/api/metrics', headers={'Authorization': 'Bearer scrape-me'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    lines = response.get_data(as_text=True).splitlines()
+    assert '# TYPE benefitspecs_requests_total counter' in lines
+    assert '# TYPE benefitspecs_request_duration_seconds histogram' in lines
+    assert any(line.startswith('benefitspecs_requests_total{endpoint="/api/reconciliation/<job_id>",'
+                               'method="GET",status="404"} ') for line in lines)
+    buckets = [float(line.rsplit(' ', 1)[1]) for line in lines
+               if line.startswith('benefitspecs_request_duration_seconds_bucket{endpoint="/api/reconciliation/<job_id>"')]
+    assert buckets == sorted(buckets) and buckets[-1] >= 1
@@ -0,0 +1,32 @@
+import io
+import json
+
+CENSUS = ("Employee ID,Date of Birth,Annual Salary,Coverage Tier\n"
+          "E1,1980-01-01,500000,EE\n"
+          "E2,1975-06-15,450000,FAM\n"
+          "E3,1990-03-02,520000,ES\n")
+PLANS = [{'name': 'Basic', 'tiers': {'EE': 100, 'ES': 200, 'EC': 180, 'FAM': 300}}]
+
+
+def analyze(client, **fields):
+    form = {'census_file': (io.BytesIO(CENSUS.encode('utf-8')), 'census.csv'), 'period': '2025-07'}
+    form.update(fields)
+    return client.post('/api/benefit-analysis', data=form)
+
+
+def test_a_zero_employer_cost_can_be_recommended(client):
+    response = analyze(client, rate_tables=json.dumps({'plans': PLANS}), designs=json.dumps([{'factor': 1.0}]),
+                       contributions=json.dumps([{'type': 'flat', 'value': 300}, {'type': 'flat', 'value': 0}]))
+    recommended = response.get_json()['data']['recommended']
+
+    assert recommended['contribution'] == {'type': 'flat', 'value': 0}
+    assert recommended['employer_cost_per_enrollee'] == 0
+
+
+def test_options_that_are_not_lists_are_rejected(client):
+    for fields in ({'rate_tables': json.dumps({'name': 'Basic'})}, {'rate_tables': '42'},
+                   {'contributions': json.dumps({'type': 'flat', 'value': 0})}, {'designs': '["x"]'},
+                   {'designs': '{not json'}):
+        response = analyze(client, **fields)
+        assert response.status_code == 400, fields
+        assert response.get_json()['success'] is False
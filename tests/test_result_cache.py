@@ -0,0 +1,50 @@
+import io
+import os
+
+from src.result_cache import ResultCache, content_key
+
+
+def test_memory_hit_then_disk_hit_then_miss(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put('a', {'errors': 3})
+
+    assert cache.get('a') == {'errors': 3}
+    assert ResultCache(str(tmp_path)).get('a') == {'errors': 3}  # another worker reads the file
+    assert cache.get('b') is None
+    cache.invalidate('a')
+    assert cache.get('a') is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    entry = len(b'{"n": "xxxxxxxx"}')
+    cache = ResultCache(str(tmp_path), memory_limit=2 * entry, disk_limit=2 * entry)
+    cache.put('a', {'n': 'xxxxxxxx'})
+    cache.put('b', {'n': 'xxxxxxxx'})
+    cache.get('a')
+    os.utime(tmp_path / 'b.json', (0, 0))  # 'b' was read longest ago on disk too
+    cache.put('c', {'n': 'xxxxxxxx'})
+
+    assert list(cache._entries) == ['a', 'c']
+    assert sorted(os.listdir(tmp_path)) == ['a.json', 'c.json']
+
+
+def test_a_failed_write_is_not_fatal_and_leaves_no_temp_file(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path))
+
+    def fail(*args):
+        raise OSError('disk full')
+    monkeypatch.setattr(os, 'replace', fail)
+    cache.put('a', {'errors': 3})
+
+    assert os.listdir(tmp_path) == []
+    assert cache.get('a') == {'errors': 3}  # still served from memory
+
+
+def test_content_key_covers_bytes_and_options():
+    def key(data, **options):
+        return content_key({'payroll_file': io.BytesIO(data)}, options)
+
+    assert key(b'a,b\n1,2\n') == key(b'a,b\n1,2\n')
+    assert key(b'a,b\n1,2\n') != key(b'a,b\n1,3\n')
+    assert key(b'a,b\n1,2\n', period='2024-01') != key(b'a,b\n1,2\n', period='2024-02')
+    assert key(b'a,b\n1,2\n') == content_key({'payroll_file': io.StringIO('a,b\n1,2\n')}, {})
@@ -0,0 +1,41 @@
+import io
+from datetime import date
+
+from werkzeug.datastructures import FileStorage
+
+from src.census import analyze_census
+from src.plan_modeling import TIERS, CensusArrays
+from src.schema_resolver import resolve_schema
+
+CENSUS = ("Employee Number,First Name,Last Name,Annual Salary,Number of Dependents\n"
+          "1001,Ann,Lee,52000,2\n"
+          "1002,Bob,Ray,61000,0\n")
+
+
+def test_number_of_dependents_is_not_an_id_column():
+    schema = resolve_schema(['employee number', 'first name', 'number of dependents'], 'census')
+
+    assert schema.dependents == 'number of dependents'
+    assert schema.employee_id == 'employee number'
+
+
+def test_dependent_identifiers_are_not_counts():
+    schema = resolve_schema(['ssn', 'dependent ssn', 'dependents'], 'census')
+
+    assert schema.dependents == 'dependents'
+
+
+def test_census_counts_dependents():
+    census = FileStorage(io.BytesIO(CENSUS.encode('utf-8')), filename='census.csv')
+    dependents = analyze_census(census)['dependents']
+
+    assert dependents['total'] == 2
+    assert dependents['average'] == 1.0
+
+
+def test_plan_tiers_come_from_dependents():
+    rows = [{'employee number': '1001', 'number of dependents': '2'},
+            {'employee number': '1002', 'number of dependents': '0'}]
+    census = CensusArrays.from_rows(rows, date(2025, 7, 1))
+
+    assert [TIERS[tier] for tier in census.tiers] == ['FAM', 'EE']
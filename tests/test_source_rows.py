@@ -0,0 +1,46 @@
+import os
+
+from conftest import upload_form
+from src import source_rows
+
+
+def reconcile(client, dataset):
+    response = client.post('/api/reconciliation', data=upload_form(dataset, group_name='Acme'))
+    return response.get_json()['data']
+
+
+def test_drill_down_reads_each_source_row_at_its_offset(client, dataset):
+    run = reconcile(client, dataset)
+    error = next(error for error in run['errors'] if error['sources'])
+    sources = client.get(f"/api/reconciliation/{run['job_id']}/errors/{error['position']}/sources").get_json()['data']
+
+    assert [(row['file'], row['row']) for row in sources['sources']] == \
+        [(source['file'], source['row']) for source in error['sources']]
+    for row in sources['sources']:
+        with open(dataset[f"{row['file']}_file"], newline='') as handle:
+            lines = handle.read().splitlines()
+        # row counts data rows from 0, after the header
+        assert row['raw'] == lines[row['row'] + 1]
+        assert row['values'] == dict(zip(lines[0].split(','), lines[row['row'] + 1].split(',')))
+
+
+def test_deleting_a_run_removes_its_uploads(client, dataset):
+    run = reconcile(client, dataset)
+    directory = os.path.join(source_rows.SOURCE_ROOT, run['job_id'])
+    assert sorted(os.listdir(directory)) == ['benadmin_file.csv', 'carrier_file.csv', 'payroll_file.csv']
+
+    assert client.delete(f"/api/reconciliation/{run['job_id']}").status_code == 204
+    assert not os.path.exists(directory)
+    assert client.get(f"/api/reconciliation/{run['job_id']}").status_code == 404
+    assert client.get(f"/api/reconciliation/{run['job_id']}/errors/0/sources").status_code == 404
+    assert client.delete(f"/api/reconciliation/{run['job_id']}").status_code == 404
+
+
+def test_nothing_is_kept_with_retention_off(client, dataset, monkeypatch):
+    monkeypatch.setattr(source_rows, 'SOURCE_RETENTION_DAYS', 0)
+    run = reconcile(client, dataset)
+    error = next(error for error in run['errors'] if error['sources'])
+
+    assert not os.path.exists(os.path.join(source_rows.SOURCE_ROOT, run['job_id']))
+    response = client.get(f"/api/reconciliation/{run['job_id']}/errors/{error['position']}/sources")
+    assert response.status_code == 410
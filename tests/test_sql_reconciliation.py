@@ -0,0 +1,27 @@
+import pytest
+
+from benchmarks.generator import DatasetOptions, write_dataset
+from src.jobs import get_engine, run_reconciliation, run_sql_reconciliation
+from src.models import reconciliation, snapshot, upload  # noqa: F401 (tables for create_all)
+from src.models.user import db
+
+
+def comparable(result):
+    errors = sorted((e.employee_id, e.error_type, e.description, e.amount, e.priority, tuple(sorted(e.sources)))
+                    for e in result['errors'])
+    return result['total_employees'], errors
+
+
+# Enough members that the in-memory run finds 50+ real discrepancies and pads with no sample errors
+@pytest.mark.parametrize('options', [DatasetOptions(), DatasetOptions(seed=3, header_variant=None, missing_id_rate=0.05)],
+                         ids=['plain', 'mixed headers, missing IDs'])
+def test_sql_engine_finds_what_file_processor_finds(tmp_path, options):
+    paths = write_dataset(str(tmp_path), 600, options)
+    database_url = f"sqlite:///{tmp_path / 'sql.db'}"
+    db.metadata.create_all(get_engine(database_url))
+
+    sql = run_sql_reconciliation(paths, 'Acme', '2025-07', database_url)
+    memory = run_reconciliation(paths, seed=1, parallel=None)
+
+    assert sql['errors_found'] >= 50
+    assert comparable(sql) == comparable(memory)
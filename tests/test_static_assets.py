@@ -0,0 +1,62 @@
+import gzip
+
+from src.static_assets import IMMUTABLE_CACHE, REVALIDATE_CACHE, StaticManifest
+
+GZIP = {'Accept-Encoding': 'gzip'}
+
+
+def test_index_is_gzipped_with_its_own_etag(app, client):
+    with open(app.static_folder + '/index.html', 'rb') as handle:
+        body = handle.read()
+    plain = client.get('/')
+    zipped = client.get('/', headers=GZIP)
+
+    assert plain.get_data() == body and 'Content-Encoding' not in plain.headers
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.get_data()) == body
+    assert zipped.headers['ETag'] != plain.headers['ETag']
+    assert zipped.headers['Vary'] == 'Accept-Encoding'
+    assert zipped.headers['Cache-Control'] == REVALIDATE_CACHE
+    # Unknown paths get the app shell
+    assert client.get('/reports/2025', headers=GZIP).headers['ETag'] == zipped.headers['ETag']
+
+
+def test_revalidation_is_a_bodiless_304(client):
+    etag = client.get('/index_new_functions.js', headers=GZIP).headers['ETag']
+
+    again = client.get('/index_new_functions.js', headers=dict(GZIP, **{'If-None-Match': etag}))
+    assert again.status_code == 304 and again.get_data() == b''
+    assert again.headers['ETag'] == etag
+    weak = client.get('/index_new_functions.js', headers=dict(GZIP, **{'If-None-Match': f'W/{etag}'}))
+    assert weak.status_code == 304
+    # The gzip tag doesn't match the uncompressed variant
+    assert client.get('/index_new_functions.js', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_small_and_precompressed_files_are_sent_as_they_are(client):
+    image = client.get('/transparent_white_glasses.png', headers=GZIP)
+    assert image.status_code == 200 and 'Content-Encoding' not in image.headers
+    assert client.get('/static/missing.css').status_code == 404
+
+
+def test_fingerprinted_files_are_cached_for_a_year(tmp_path):
+    (tmp_path / 'app.3f9c2a1b.js').write_text('console.log(1)\n' * 200)
+    (tmp_path / 'app.js').write_text('console.log(1)\n' * 200)
+    manifest = StaticManifest(str(tmp_path))
+
+    assert manifest.get('app.3f9c2a1b.js').cache_control == IMMUTABLE_CACHE
+    assert manifest.get('app.js').cache_control == REVALIDATE_CACHE
+    assert set(manifest.get('app.js').variants) >= {'identity', 'gzip'}
+
+
+def test_reload_picks_up_changed_and_removed_files(tmp_path):
+    path = tmp_path / 'app.js'
+    path.write_text('one')
+    manifest = StaticManifest(str(tmp_path))
+    before = manifest.get('app.js').variants['identity']
+
+    path.write_text('two, longer')
+    assert manifest.get('app.js').variants['identity'] == before  # served from memory
+    assert manifest.get('app.js', reload=True).variants['identity'][0] == b'two, longer'
+    path.unlink()
+    assert manifest.get('app.js', reload=True) is None
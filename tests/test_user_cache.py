@@ -0,0 +1,39 @@
+import pytest
+
+from conftest import make_app
+from src.user_cache import user_cache
+
+
+@pytest.fixture
+def client(tmp_path):
+    # Each request gets its own app context, as in production; the shared one the
+    # app fixture holds open would keep Flask-Login's user on g between requests
+    return make_app(tmp_path).test_client()
+
+
+@pytest.fixture
+def user_id(client):
+    client.post('/api/register', json={'username': 'ann', 'password': 'correct horse'})
+    response = client.post('/api/login', json={'username': 'ann', 'password': 'correct horse'})
+    user_id = response.get_json()['user']['id']
+    assert client.get('/api/profile').get_json()['username'] == 'ann'
+    return user_id
+
+
+def test_profile_is_served_from_the_cache(client, user_id):
+    assert user_cache.get(user_id) == {'id': user_id, 'username': 'ann'}
+    assert client.get('/api/profile').get_json() == {'id': user_id, 'username': 'ann'}
+
+
+def test_an_update_is_seen_on_the_next_request(client, user_id):
+    response = client.put(f'/api/users/{user_id}', json={'username': 'ann.lee'})
+    assert response.status_code == 200
+
+    assert client.get('/api/profile').get_json()['username'] == 'ann.lee'
+
+
+def test_a_deleted_user_is_signed_out(client, user_id):
+    assert client.delete(f'/api/users/{user_id}').status_code == 204
+
+    assert user_cache.get(user_id) is None
+    assert client.get('/api/profile').status_code == 401
@@ -0,0 +1,66 @@
+import csv
+import io
+import os
+
+from werkzeug.datastructures import FileStorage
+
+from benchmarks.generator import write_834
+from conftest import upload_form
+from src import source_rows, x12
+from src.file_processor import FileProcessor
+from src.x12 import iter_834_rows
+
+
+def as_csv(path_834, path_csv):
+    """The 834's members as the CSV a carrier would otherwise have exported"""
+    with open(path_834, encoding='latin-1', newline='') as source, open(path_csv, 'w', newline='') as target:
+        rows = list(iter_834_rows(source))
+        writer = csv.DictWriter(target, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_subscriber_row_sums_coverages_and_counts_dependents(tmp_path):
+    path = tmp_path / 'carrier.834'
+    write_834(str(path), 3)
+    rows = list(iter_834_rows(io.StringIO(path.read_text())))
+
+    # three subscribers; the first carries three dependents
+    assert [row['dependents'] for row in rows] == ['3', '0', '0']
+    for row in rows:
+        assert row['relationship'] == '18'
+        assert float(row['premium']) == round(float(row['medical premium']) + float(row['dental premium']), 2)
+        assert row['plan'] == row['medical plan']
+
+
+def test_segments_split_across_chunks_parse_the_same(tmp_path, monkeypatch):
+    path = tmp_path / 'carrier.834'
+    write_834(str(path), 20)
+    whole = list(iter_834_rows(io.StringIO(path.read_text())))
+    monkeypatch.setattr(x12, 'CHUNK_SIZE', 7)
+
+    assert list(iter_834_rows(io.StringIO(path.read_text()))) == whole
+
+
+def test_834_upload_reconciles_like_its_csv_equivalent(dataset, tmp_path):
+    path_834, path_csv = str(tmp_path / 'carrier.834'), str(tmp_path / 'carrier.csv')
+    write_834(path_834, 60)
+    as_csv(path_834, path_csv)
+
+    def run(carrier):
+        files = {'payroll_file': FileStorage(open(dataset['payroll_file'], 'rb'), filename='payroll.csv'),
+                 'carrier_file': FileStorage(open(carrier, 'rb'), filename=os.path.basename(carrier))}
+        result = FileProcessor(seed=1).process_files(files, streaming=True)
+        return result['total_employees'], sorted((e.employee_id, e.error_type, e.description) for e in result['errors'])
+
+    assert run(path_834) == run(path_csv)
+
+
+def test_an_834_is_kept_as_an_834(client, dataset, tmp_path):
+    path_834 = str(tmp_path / 'carrier.834')
+    write_834(path_834, 60)
+    response = client.post('/api/reconciliation', data=upload_form(dict(dataset, carrier_file=path_834)))
+    job_id = response.get_json()['data']['job_id']
+
+    assert sorted(os.listdir(os.path.join(source_rows.SOURCE_ROOT, job_id))) == \
+        ['benadmin_file.csv', 'carrier_file.834', 'payroll_file.csv']